@@ -1,5 +1,24 @@
 __all__ = [
     "config",
     "db",
+    "migrations",
+    "fts",
+    "people",
+    "cache",
+    "changes",
+    "colindex",
+    "dedup",
+    "episodes",
+    "facets",
+    "fuzzy",
+    "export",
+    "importer",
+    "links",
+    "maintain",
+    "repair",
     "scraper",
+    "similar",
+    "stats",
+    "suggest",
+    "text",
 ]
\ No newline at end of file
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from . import config
+from .db import get_write_generation, search_movies, search_movies_with_total
+from .facets import get_facets
+
+
+class SearchCache:
+    """进程内 LRU 检索缓存，带条目上限与 TTL。
+
+    失效依赖数据库中的写入代数：每次读取时比较代数，变化即清空，
+    因此其他进程（抓取、repair、purge-invalid）写库后本进程的缓存也会失效。
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def sync_generation(self, generation: int) -> None:
+        with self._lock:
+            if self._generation != generation:
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+                self._generation = generation
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return False, None
+            stored_at, value = item
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+search_cache = SearchCache(
+    getattr(config, "SEARCH_CACHE_SIZE", 256),
+    getattr(config, "SEARCH_CACHE_TTL", 60),
+)
+
+
+def filters_key(filters: Dict[str, Any]) -> str:
+    """规范化过滤条件：去掉空值，OR/NOT 标签集合排序，得到稳定的缓存键。"""
+    norm: Dict[str, Any] = {}
+    for k, v in filters.items():
+        if v is None or v == "" or v == []:
+            continue
+        if isinstance(v, (list, tuple, set)):
+            v = sorted({str(x).strip() for x in v if x is not None and str(x).strip()})
+            if not v:
+                continue
+        norm[k] = v
+    return json.dumps(norm, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def cached_search_with_total(
+    conn: sqlite3.Connection,
+    limit: int = 50,
+    offset: int = 0,
+    order_by: Optional[str] = None,
+    order_dir: str = "desc",
+    cursor: Optional[str] = None,
+    cache: Optional[SearchCache] = None,
+    **filters: Any,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """带缓存的 search_movies_with_total，返回 (结果字典列表, 总数)。
+
+    总数单独按过滤条件缓存，翻页时只有本页查询未命中也无需再次计数。
+    """
+    cache = cache or search_cache
+    cache.sync_generation(get_write_generation(conn))
+    fkey = filters_key(filters)
+    page_key = ("page", fkey, int(limit), int(offset), cursor, (order_by or "").lower(), (order_dir or "").lower())
+    count_key = ("count", fkey)
+    hit, rows = cache.get(page_key)
+    hit_total, total = cache.get(count_key)
+    if hit and hit_total:
+        return rows, total
+    if hit_total:
+        raw = search_movies(conn, limit=limit, offset=offset, order_by=order_by, order_dir=order_dir, cursor=cursor, **filters)
+    else:
+        raw, total = search_movies_with_total(
+            conn, limit=limit, offset=offset, order_by=order_by, order_dir=order_dir, cursor=cursor, **filters
+        )
+        cache.put(count_key, total)
+    rows = [dict(r) for r in raw]
+    cache.put(page_key, rows)
+    return rows, total
+
+
+def cached_facets(conn: sqlite3.Connection, cache: Optional[SearchCache] = None, **filters: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """带缓存的 get_facets，与检索结果共用同一缓存与写入代数。"""
+    cache = cache or search_cache
+    cache.sync_generation(get_write_generation(conn))
+    key = ("facets", filters_key(filters))
+    hit, value = cache.get(key)
+    if hit:
+        return value
+    value = get_facets(conn, **filters)
+    cache.put(key, value)
+    return value
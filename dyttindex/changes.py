@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import List, Tuple
+
+from .db import get_meta, set_meta
+
+# 变更流：movies 的插入/更新/删除由触发器追加到 movie_changes(seq, movie_id, op)，
+# 进程内的派生索引（列式过滤、联想、相似推荐等）记住已消费的 seq，据此增量刷新。
+# 只记录影响检索字段的更新，仅 raw_html/哈希变化不产生变更。
+
+CHANGES_TABLE = "movie_changes"
+OP_INSERT = "i"
+OP_UPDATE = "u"
+OP_DELETE = "d"
+
+_TRACKED_COLUMNS = [
+    "title", "original_title", "alt_titles_text", "year", "kind", "country", "language",
+    "director", "actors", "rating_source", "rating_value", "tags_text", "updated_at",
+]
+_TRIGGERS = ["movie_changes_ai", "movie_changes_au", "movie_changes_ad"]
+# app_meta 中记录已清理到的 seq
+_PRUNED_KEY = "changes_pruned_seq"
+# 消费位置持久化在 app_meta 的消费者（库内派生表），清理变更流时不越过它们的位置
+TITLE_GRAMS_SEQ_KEY = "title_grams_seq"
+SIMILAR_SEQ_KEY = "similar_seq"
+PERSISTED_CONSUMER_KEYS = (TITLE_GRAMS_SEQ_KEY, SIMILAR_SEQ_KEY)
+
+
+def create_change_feed(cur: sqlite3.Cursor) -> None:
+    cols = ", ".join(_TRACKED_COLUMNS)
+    cur.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TRIGGER IF NOT EXISTS movie_changes_ai AFTER INSERT ON movies BEGIN
+            INSERT INTO {CHANGES_TABLE}(movie_id, op) VALUES (new.id, '{OP_INSERT}');
+        END;
+        CREATE TRIGGER IF NOT EXISTS movie_changes_au AFTER UPDATE OF {cols} ON movies BEGIN
+            INSERT INTO {CHANGES_TABLE}(movie_id, op) VALUES (new.id, '{OP_UPDATE}');
+        END;
+        CREATE TRIGGER IF NOT EXISTS movie_changes_ad AFTER DELETE ON movies BEGIN
+            INSERT INTO {CHANGES_TABLE}(movie_id, op) VALUES (old.id, '{OP_DELETE}');
+        END;
+        """
+    )
+
+
+def drop_change_feed_triggers(cur: sqlite3.Cursor) -> None:
+    for name in _TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def latest_change_seq(conn: sqlite3.Connection) -> int:
+    cur = conn.cursor()
+    cur.execute(f"SELECT MAX(seq) FROM {CHANGES_TABLE}")
+    return int(cur.fetchone()[0] or 0)
+
+
+def changes_since(conn: sqlite3.Connection, seq: int, limit: int = 100000) -> List[Tuple[int, int, str]]:
+    """返回 seq 之后的变更 [(seq, movie_id, op)]，按 seq 升序。"""
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT seq, movie_id, op FROM {CHANGES_TABLE} WHERE seq > ? ORDER BY seq LIMIT ?",
+        (int(seq), int(limit)),
+    )
+    return [(int(r[0]), int(r[1]), r[2]) for r in cur.fetchall()]
+
+
+def feed_has_gap(conn: sqlite3.Connection, seq: int) -> bool:
+    """消费者停在 seq，而其后的记录已被清理（需全量重载）时返回 True。"""
+    return int(get_meta(conn, _PRUNED_KEY, "0") or 0) > int(seq)
+
+
+def prune_changes(conn: sqlite3.Connection, upto_seq: int) -> int:
+    """删除 seq <= upto_seq 的变更记录并记下清理位置，返回删除条数（不提交事务）。"""
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {CHANGES_TABLE} WHERE seq <= ?", (int(upto_seq),))
+    n = cur.rowcount
+    if n:
+        set_meta(conn, _PRUNED_KEY, max(int(upto_seq), int(get_meta(conn, _PRUNED_KEY, "0") or 0)))
+    return n
@@ -11,12 +11,26 @@ from .db import (
     create_db,
     get_conn,
     search_movies,
+    next_cursor,
     get_movie,
     get_download_links,
-    upsert_movie,
+    get_meta,
 )
-from .scraper import DyttScraper, init_db, parse_detail_page, decode_response, looks_garbled, is_valid_detail
+from .scraper import DyttScraper, init_db, PARSER_VERSION
 from . import config
+from .migrations import migrate, current_version, explain_queries, LATEST_VERSION, DEFERRED_KEY
+from .fts import rebuild_fts
+from .people import get_filmography, find_people
+from .stats import get_stats, rebuild_stats
+from .export import export_movies, EXPORT_FORMATS
+from .importer import import_jsonl
+from .dedup import find_clusters, merge_cluster, DEFAULT_THRESHOLD
+from .fuzzy import fuzzy_search, refresh_title_grams
+from .similar import rebuild_similar, refresh_similar, get_similar, DEFAULT_K as SIMILAR_K
+from .links import find_by_hash, shared_releases
+from .episodes import get_episodes, rebuild_episodes
+from .repair import Refetcher, repair_movies, purge_invalid, DEFAULT_CHUNK_SIZE
+from .maintain import maintain
 
 app = typer.Typer(add_completion=False, help="DYTT 电影数据库构建与查询 CLI")
 console = Console()
@@ -27,6 +41,49 @@ def init_db_cmd(drop: bool = typer.Option(False, help="是否清空并重建数
     create_db(drop=drop)
     console.print("[green]SQLite 初始化完成[/green]: ", config.SQLITE_PATH)
 
+@app.command("migrate")
+def migrate_cmd(
+    explain: bool = typer.Option(False, "--explain/--no-explain", help="输出标准查询的 EXPLAIN QUERY PLAN"),
+):
+    """执行未应用的版本化迁移，可选输出标准查询的执行计划以确认没有全表扫描。
+
+    同时补建被中断的 import --defer-indexes 删除的索引与触发器（导入进程仍在运行时除外）。
+    """
+    conn = get_conn()
+    before = current_version(conn)
+    applied = migrate(conn)
+    if get_meta(conn, DEFERRED_KEY):
+        console.print("[yellow]延迟索引的导入仍在进行，二级索引与维护触发器将在其结束后重建[/yellow]")
+    if applied:
+        console.print(f"[green]迁移完成[/green]：{before} -> {applied[-1]}（应用 {len(applied)} 步）")
+    else:
+        console.print(f"数据库已是最新版本：{before}（最新 {LATEST_VERSION}）")
+    if explain:
+        for q in explain_queries(conn):
+            mark = "[red]全表扫描[/red]" if q["full_scan"] else "[green]OK[/green]"
+            console.print(f"{mark} {q['name']}: {q['sql']}")
+            for line in q["plan"]:
+                console.print(f"    {line}")
+    conn.close()
+
+@app.command("fts-rebuild")
+def fts_rebuild_cmd():
+    """重建关键字全文索引（旧库补建或批量导入后使用）。"""
+    conn = get_conn()
+    if rebuild_fts(conn):
+        console.print("[green]全文索引已重建[/green]")
+    else:
+        console.print("[yellow]当前 SQLite 不支持 FTS5 trigram 分词，关键字检索将使用 LIKE[/yellow]")
+    conn.close()
+
+def _refresh_title_grams() -> None:
+    # 写入结束后在写入侧追上容错检索的倒排表，检索请求保持只读
+    conn = get_conn()
+    try:
+        refresh_title_grams(conn)
+    finally:
+        conn.close()
+
 @app.command()
 def crawl(
     start_url: Optional[str] = typer.Option(None, help="起始URL，默认使用 BASE_URL"),
@@ -55,31 +112,81 @@ def crawl(
             elif evt.get("event") == "error":
                 console.print(f"[red]错误[/red]: {evt.get('url') or evt.get('detail_url')} -> {evt.get('message')}")
     total = s.crawl_site(start_url or config.BASE_URL, max_pages_total, max_items_total, progress_cb=_progress)
+    _refresh_title_grams()
     console.print(f"[green]抓取完成[/green]，累计条目: {total}")
 
 @app.command()
 def search(title: Optional[str] = typer.Option(None, help="按标题关键词"),
            kind: Optional[str] = typer.Option(None, help="类别: movie/tv/variety/anime"),
-           country: Optional[str] = typer.Option(None, help="产地/国家关键词"),
+           country: Optional[str] = typer.Option(None, help="国家/地区（整词匹配，如 美国、中国香港；多个用 / 分隔表示同时包含）"),
            language: Optional[str] = typer.Option(None, help="语言关键词，如 中文/日语/英语"),
            director: Optional[str] = typer.Option(None, help="导演名包含"),
            actors: Optional[str] = typer.Option(None, help="演员名包含"),
+           director_name: Optional[str] = typer.Option(None, help="导演姓名精确匹配（中文名或外文名）"),
+           actor_name: Optional[str] = typer.Option(None, help="演员姓名精确匹配（中文名或外文名）"),
            rating_source: Optional[str] = typer.Option(None, help="评分来源：Douban/IMDB"),
-           tag: Optional[List[str]] = typer.Option(None, help="包含的分类标签，可多次指定"),
+           tag: Optional[List[str]] = typer.Option(None, help="必须全部包含的标签（AND），可多次指定"),
+           tag_any: Optional[List[str]] = typer.Option(None, help="包含任一即可的标签（OR），可多次指定"),
+           tag_not: Optional[List[str]] = typer.Option(None, help="需排除的标签（NOT），可多次指定"),
            rating_min: Optional[float] = typer.Option(None, help="评分下限"),
            year_from: Optional[int] = typer.Option(None, help="年份起"),
            year_to: Optional[int] = typer.Option(None, help="年份止"),
+           complete_only: bool = typer.Option(False, "--complete-only", help="仅剧集完整（第 1 集到最大集数无缺集）的条目"),
+           min_episode: Optional[int] = typer.Option(None, help="已有集数至少到第 N 集"),
            limit: int = typer.Option(50, help="返回数量上限"),
            show_downloads: bool = typer.Option(True, help="是否展示下载链接"),
-           keyword: Optional[str] = typer.Option(None, help="跨字段关键字（标题/简介/演员等）")):
+           keyword: Optional[str] = typer.Option(None, help="跨字段关键字（标题/简介/演员等）"),
+           order_by: Optional[str] = typer.Option(None, help="排序：updated_at/created_at/year/rating/title/id/relevance"),
+           order_dir: str = typer.Option("desc", help="排序方向：asc/desc"),
+           cursor: Optional[str] = typer.Option(None, help="分页游标（上一次输出的“下一页游标”）"),
+           fuzzy: bool = typer.Option(False, "--fuzzy", help="容错标题检索（按 title 或 keyword，容忍错别字/漏字，结果按相似度排序）")):
     """按标题、类别、地区、语言、导演、演员、标签、评分与年份过滤检索结果。支持 keyword 跨字段搜索。"""
     conn = get_conn()
+    filters = dict(
+        kind=kind,
+        country=country,
+        tags=tag,
+        tags_any=tag_any,
+        tags_not=tag_not,
+        rating_min=rating_min,
+        year_from=year_from,
+        year_to=year_to,
+        language=language,
+        director=director,
+        actors_substr=actors,
+        rating_source=rating_source,
+        director_name=director_name,
+        actor_name=actor_name,
+        complete_only=complete_only,
+        min_episode=min_episode,
+    )
+    if fuzzy:
+        if not (title or keyword):
+            console.print("[red]--fuzzy 需要提供 --title 或 --keyword[/red]")
+            raise typer.Exit(code=1)
+        results, total = fuzzy_search(conn, title or keyword, limit=limit, **filters)
+        table = Table(show_header=True, header_style="bold magenta")
+        table.add_column("ID", justify="right", style="cyan", no_wrap=True)
+        table.add_column("标题")
+        table.add_column("相似度", justify="right")
+        table.add_column("类别")
+        table.add_column("年份", justify="right")
+        table.add_column("评分")
+        for row in results:
+            table.add_row(str(row["id"]), row["title"] or "", f"{row['fuzzy_score']:.2f}", row["kind"] or "",
+                          str(row["year"] or ""), f"{row['rating_source'] or ''}:{row['rating_value'] or ''}")
+        console.print(table)
+        console.print(f"共 {total} 条候选")
+        conn.close()
+        return
     results = search_movies(
         conn,
         title=title,
         kind=kind,
         country=country,
         tags=tag,
+        tags_any=tag_any,
+        tags_not=tag_not,
         rating_min=rating_min,
         year_from=year_from,
         year_to=year_to,
@@ -87,8 +194,15 @@ def search(title: Optional[str] = typer.Option(None, help="按标题关键词"),
         director=director,
         actors_substr=actors,
         rating_source=rating_source,
+        director_name=director_name,
+        actor_name=actor_name,
+        complete_only=complete_only,
+        min_episode=min_episode,
         limit=limit,
         keyword=keyword,
+        order_by=order_by,
+        order_dir=order_dir,
+        cursor=cursor,
     )
     table = Table(show_header=True, header_style="bold magenta")
     table.add_column("ID", justify="right", style="cyan", no_wrap=True)
@@ -102,6 +216,9 @@ def search(title: Optional[str] = typer.Option(None, help="按标题关键词"),
         tags_text = row[9] or ""
         table.add_row(str(row[0]), row[1] or "", row[2] or "", str(row[3] or ""), row[4] or "", f"{row[7] or ''}:{row[8] or ''}", tags_text)
     console.print(table)
+    nxt = next_cursor(results, limit, order_by, order_dir, cursor=cursor)
+    if nxt:
+        console.print(f"下一页游标: {nxt}")
 
     if show_downloads and results:
         conn = get_conn()
@@ -113,6 +230,318 @@ def search(title: Optional[str] = typer.Option(None, help="按标题关键词"),
                 ep = f"  EP{episode}" if episode else ""
                 console.print(f"- [{kind}] {label}{ep}: {url}")
 
+@app.command("person")
+def person(
+    name: str = typer.Argument(..., help="人员姓名（中文名或外文名）；配合 --prefix 为前缀"),
+    role: Optional[str] = typer.Option(None, help="仅列出某角色：director/actor"),
+    prefix: bool = typer.Option(False, "--prefix/--exact", help="按前缀列出匹配的人员"),
+):
+    """列出导演/演员的作品列表，或按前缀查找人员。"""
+    conn = get_conn()
+    if prefix:
+        for r in find_people(conn, name):
+            console.print(f"{r['name']}" + (f" ({r['name_alt']})" if r["name_alt"] else ""))
+        conn.close()
+        return
+    rows = get_filmography(conn, name, role=role)
+    conn.close()
+    if not rows:
+        console.print("[yellow]未找到该人员的作品[/yellow]")
+        raise typer.Exit(0)
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("ID", justify="right", style="cyan", no_wrap=True)
+    table.add_column("标题")
+    table.add_column("年份", justify="right")
+    table.add_column("类别")
+    table.add_column("角色")
+    table.add_column("评分")
+    for r in rows:
+        table.add_row(str(r["id"]), r["title"] or "", str(r["year"] or ""), r["kind"] or "", r["role"], f"{r['rating_source'] or ''}:{r['rating_value'] or ''}")
+    console.print(table)
+
+@app.command("stats")
+def stats_cmd(
+    full: bool = typer.Option(False, "--full/--incremental", help="全表聚合精确重算后再输出"),
+    as_json: bool = typer.Option(False, "--json", help="以 JSON 输出"),
+    top_tags: int = typer.Option(10, "--top-tags", help="热门标签数量"),
+):
+    """目录统计：类别、评分覆盖、链接类型、字段覆盖率与重复条目（读取入库时增量维护的统计表）。"""
+    conn = get_conn()
+    if full:
+        rebuild_stats(conn)
+    st = get_stats(conn, top_tags=top_tags)
+    conn.close()
+    if as_json:
+        import json
+        console.print_json(json.dumps(st, ensure_ascii=False))
+        return
+    total = st["total"]
+    console.print(f"[bold]数据库[/bold]: {config.SQLITE_PATH}")
+    console.print(f"[bold]总条目数[/bold]: {total}")
+    console.print("[bold]按类别计数[/bold]:")
+    for k, n in st["kinds"].items():
+        console.print(f" - {k}: {n}")
+    r = st["rating"]
+    console.print(f"[bold]有评分[/bold]: {r['rated']} ({r['coverage']}%)，平均评分 {r['avg']}")
+    for src, n in r["by_source"].items():
+        console.print(f" - {src}: {n}")
+    lk = st["links"]
+    console.print(
+        f"[bold]下载链接[/bold]: {lk['total']}，含链接条目 {lk['movies_with_links']} ({lk['coverage']}%)，"
+        f"平均每部 {lk['avg_per_movie']}"
+    )
+    for kind, n in lk["by_kind"].items():
+        console.print(f" - {kind}: {n}")
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("字段")
+    table.add_column("非空", justify="right")
+    table.add_column("覆盖率", justify="right")
+    for f, v in st["fields"].items():
+        table.add_row(f, str(v["n"]), f"{v['pct']}%")
+    console.print(table)
+    d = st["duplicates"]
+    console.print(f"[bold]同名同年份重复[/bold]: {d['groups']} 组，多出 {d['extra_rows']} 条")
+    console.print("[bold]热门标签[/bold]: " + "，".join(f"{t['tag']}({t['n']})" for t in st["top_tags"]))
+
+@app.command("export")
+def export_cmd(
+    output: str = typer.Argument(..., help="输出文件路径，'-' 表示标准输出；.gz 后缀自动压缩"),
+    fmt: Optional[str] = typer.Option(None, "--format", help="jsonl/csv，默认按扩展名推断"),
+    compress: bool = typer.Option(False, "--gzip", help="gzip 压缩输出"),
+    fields: Optional[str] = typer.Option(None, "--fields", help="逗号分隔的导出字段，可含 tags/download_links；默认除 raw_html 外全部"),
+    batch_size: int = typer.Option(500, "--batch-size", min=1, help="每批读取条数"),
+    title: Optional[str] = typer.Option(None, help="按标题关键词"),
+    kind: Optional[str] = typer.Option(None, help="类别: movie/tv/variety/anime"),
+    country: Optional[str] = typer.Option(None, help="国家/地区（整词匹配，如 美国、中国香港；多个用 / 分隔表示同时包含）"),
+    language: Optional[str] = typer.Option(None, help="语言关键词"),
+    director_name: Optional[str] = typer.Option(None, help="导演姓名精确匹配"),
+    actor_name: Optional[str] = typer.Option(None, help="演员姓名精确匹配"),
+    rating_source: Optional[str] = typer.Option(None, help="评分来源：Douban/IMDB"),
+    tag: Optional[List[str]] = typer.Option(None, help="必须全部包含的标签（AND），可多次指定"),
+    tag_any: Optional[List[str]] = typer.Option(None, help="包含任一即可的标签（OR），可多次指定"),
+    tag_not: Optional[List[str]] = typer.Option(None, help="需排除的标签（NOT），可多次指定"),
+    rating_min: Optional[float] = typer.Option(None, help="评分下限"),
+    year_from: Optional[int] = typer.Option(None, help="年份起"),
+    year_to: Optional[int] = typer.Option(None, help="年份止"),
+    keyword: Optional[str] = typer.Option(None, help="跨字段关键字"),
+):
+    """流式导出影片（含标签与下载链接）为 JSONL/CSV，过滤条件与 search 相同。"""
+    if fmt and fmt not in EXPORT_FORMATS:
+        console.print(f"[red]不支持的导出格式[/red]: {fmt}")
+        raise typer.Exit(1)
+    conn = get_conn()
+    try:
+        n = export_movies(
+            conn,
+            output,
+            fmt=fmt,
+            compress=compress,
+            fields=fields.split(",") if fields else None,
+            batch_size=batch_size,
+            title=title,
+            kind=kind,
+            country=country,
+            language=language,
+            director_name=director_name,
+            actor_name=actor_name,
+            rating_source=rating_source,
+            tags=tag,
+            tags_any=tag_any,
+            tags_not=tag_not,
+            rating_min=rating_min,
+            year_from=year_from,
+            year_to=year_to,
+            keyword=keyword,
+        )
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+    if output != "-":
+        console.print(f"[green]已导出[/green] {n} 条 -> {output}")
+
+@app.command("import")
+def import_cmd(
+    path: str = typer.Argument(..., help="JSONL 文件（可为 .gz），'-' 表示标准输入；格式与 export 输出一致"),
+    batch_size: int = typer.Option(5000, "--batch-size", min=1, help="每个事务写入的记录数"),
+    defer_indexes: bool = typer.Option(
+        False, "--defer-indexes",
+        help="导入期间删除二级索引与维护触发器，结束后统一重建；进程被强杀时由下次 import、migrate 或 init-db 补建",
+    ),
+    resume: bool = typer.Option(True, "--resume/--restart", help="从上次中断的断点继续"),
+):
+    """批量导入 JSONL：is_valid_detail 校验，大事务分批写入，支持断点续导。"""
+    conn = get_conn()
+
+    def _progress(p):
+        console.print(f"已写入 {p['rows']} 条（第 {p['line']} 行），{p['rows_per_sec']:.0f} 条/秒")
+
+    try:
+        res = import_jsonl(conn, path, batch_size=batch_size, defer_indexes=defer_indexes, resume=resume, progress=_progress)
+        refresh_title_grams(conn)
+    except KeyboardInterrupt:
+        console.print("[yellow]导入已中断，再次运行相同命令将从断点继续[/yellow]")
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+    if res["resumed_from_line"]:
+        console.print(f"从第 {res['resumed_from_line']} 行之后继续")
+    console.print(
+        f"[bold]导入完成[/bold]：{res['rows']} 条，用时 {res['elapsed']}s（{res['rows_per_sec']} 条/秒）；"
+        f"新增 {res['inserted']}，更新 {res['updated']}，仅 HTML {res['html_only']}，未变化 {res['unchanged']}，"
+        f"已合并跳过 {res['merged']}，无效 {res['invalid']}，坏行 {res['malformed']}"
+    )
+
+@app.command("dedup")
+def dedup_cmd(
+    threshold: float = typer.Option(DEFAULT_THRESHOLD, "--threshold", min=0.0, max=1.0, help="标题相似度阈值（MinHash 估计的 Jaccard）"),
+    kind: Optional[str] = typer.Option(None, "--kind", help="仅检查指定 kind"),
+    merge: bool = typer.Option(False, "--merge/--report", help="合并重复簇（默认只报告）"),
+    show: int = typer.Option(50, "--show", help="报告中列出的簇数量，0 表示全部"),
+):
+    """检测近似重复条目（镜像、重发、改名），报告或合并为一条并合并下载链接与标签。"""
+    conn = get_conn()
+    clusters = find_clusters(conn, threshold=threshold, kind=kind)
+    extra = sum(len(c.members) - 1 for c in clusters)
+    console.print(f"[bold]重复簇[/bold]: {len(clusters)}，可合并条目 {extra}")
+    cur = conn.cursor()
+    for c in clusters[: show or None]:
+        cur.execute(
+            f"SELECT id, title, year, detail_url FROM movies WHERE id IN ({','.join('?' * len(c.members))})",
+            c.members,
+        )
+        rows = {r[0]: r for r in cur.fetchall()}
+        console.print(f"- 簇 {c.canonical}（{len(c.members)} 条，相似度 >= {c.similarity}）")
+        for mid in c.members:
+            r = rows.get(mid)
+            if r is None:
+                continue
+            mark = "[green]*[/green]" if mid == c.canonical else " "
+            console.print(f"  {mark} {mid} {r[1]} ({r[2] or ''}) {r[3]}")
+    if merge and clusters:
+        removed = 0
+        for c in clusters:
+            removed += merge_cluster(conn, c)
+        refresh_title_grams(conn)
+        console.print(f"[green]已合并[/green] {len(clusters)} 个簇，删除 {removed} 条重复条目")
+    conn.close()
+
+@app.command("build-similar")
+def build_similar_cmd(
+    full: bool = typer.Option(False, "--full/--incremental", help="全量重建（默认按变更流只重算变更影片及其近邻）"),
+    k: int = typer.Option(SIMILAR_K, "--k", min=1, help="每部影片保留的近邻数"),
+    show: Optional[int] = typer.Option(None, "--show", help="构建后展示该影片的相似推荐"),
+):
+    """构建相似推荐近邻表（标签/导演/主演/国别/年份段的加权余弦相似度）。"""
+    conn = get_conn()
+    progress = lambda n: console.print(f"已计算 {n} 部")
+    res = rebuild_similar(conn, k=k, progress=progress) if full else refresh_similar(conn, k=k, progress=progress)
+    mode = "全量" if res["full"] else "增量"
+    console.print(f"[green]{mode}构建完成[/green]：计算 {res['movies']} 部，用时 {res['elapsed']}s")
+    if show is not None:
+        for row in get_similar(conn, show):
+            console.print(f"- {row['id']} {row['title']} ({row['year'] or ''})  {row['score']:.3f}")
+    conn.close()
+
+@app.command("link-lookup")
+def link_lookup_cmd(
+    query: Optional[str] = typer.Argument(None, help="BT infohash（40 位十六进制或 32 位 base32）、ed2k 哈希，或 magnet/ed2k/thunder 链接"),
+    shared: bool = typer.Option(False, "--shared", help="列出被多部影片共用的资源"),
+    limit: int = typer.Option(50, "--limit", help="返回数量上限"),
+):
+    """按资源哈希查找含该种子/文件的影片（走 btih/ed2k_hash 索引）。"""
+    conn = get_conn()
+    if shared:
+        for r in shared_releases(conn, limit=limit):
+            console.print(f"- {r['key']}  {r['movies']} 部: {r['movie_ids']}")
+        conn.close()
+        return
+    if not query:
+        console.print("[red]请提供哈希或链接，或使用 --shared[/red]")
+        raise typer.Exit(code=1)
+    try:
+        rows = find_by_hash(conn, query, limit=limit)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        conn.close()
+    if not rows:
+        console.print("未找到")
+        return
+    for r in rows:
+        ep = f" EP{r['episode']}" if r["episode"] else ""
+        size = f" {r['size']} 字节" if r["size"] else ""
+        console.print(f"- {r['movie_id']} {r['title']} ({r['year'] or ''}) [{r['link_kind'] or ''}]{ep}{size}: {r['url']}")
+
+@app.command("episodes")
+def episodes_cmd(
+    movie_id: Optional[int] = typer.Argument(None, help="条目 ID"),
+    all_links: bool = typer.Option(False, "--all", help="列出每集的全部链接（默认只列最佳链接）"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="按 download_links 全量重算剧集汇总"),
+):
+    """查看条目的剧集覆盖：集数、最大集数、缺集区间与每集最佳链接。"""
+    conn = get_conn()
+    if rebuild:
+        rebuild_episodes(conn)
+        console.print("[green]剧集汇总已重算[/green]")
+    if movie_id is None:
+        conn.close()
+        return
+    info = get_episodes(conn, movie_id)
+    conn.close()
+    s = info["summary"]
+    if not s:
+        console.print("该条目没有分集链接")
+        return
+    missing = f"，缺 {s['missing_count']} 集: {s['missing_ranges']}" if s["missing_count"] else "，无缺集"
+    console.print(f"共 {s['episode_count']} 集，最大第 {s['max_episode']} 集{missing}")
+    for g in info["episodes"]:
+        links = g["links"] if all_links else [g["best"]]
+        for link in links:
+            console.print(f"- EP{g['episode']} [{link['kind'] or ''}] {link['label'] or ''}: {link['url']}")
+
+@app.command("maintain")
+def maintain_cmd(
+    retention: bool = typer.Option(True, "--retention/--no-retention", help="按保留策略清理抓取记录与变更流"),
+    analyze: bool = typer.Option(True, "--analyze/--no-analyze", help="执行 ANALYZE 更新统计信息"),
+    full_vacuum: bool = typer.Option(False, "--full-vacuum", help="VACUUM 整个文件并切换为增量回收（旧库首次执行）"),
+    session_days: int = typer.Option(config.MAINTAIN_SESSION_DAYS, "--session-days", min=0, help="删除超过 N 天未活动的抓取会话"),
+    event_days: int = typer.Option(config.MAINTAIN_EVENT_DAYS, "--event-days", min=0, help="删除早于 N 天的抓取事件"),
+    events_per_session: int = typer.Option(config.MAINTAIN_EVENTS_PER_SESSION, "--events-per-session", min=0, help="每个会话最多保留的事件数"),
+    queue_days: int = typer.Option(config.MAINTAIN_QUEUE_DAYS, "--queue-days", min=0, help="删除早于 N 天的已完成队列行"),
+    changes_keep: int = typer.Option(config.MAINTAIN_CHANGES_KEEP, "--changes-keep", min=0, help="变更流至少保留最近 N 条"),
+    changes_days: int = typer.Option(config.MAINTAIN_CHANGES_DAYS, "--changes-days", min=0, help="早于 N 天的变更记录总是删除（0 关闭）"),
+    json_out: bool = typer.Option(False, "--json", help="输出 JSON"),
+):
+    """数据库维护：清理抓取记录与变更流，ANALYZE、PRAGMA optimize、FTS optimize、回收空闲页、WAL 检查点。"""
+    conn = get_conn()
+    try:
+        res = maintain(
+            conn, retention=retention, analyze=analyze, full_vacuum=full_vacuum,
+            progress=None if json_out else (lambda step: console.print(f"- {step}")),
+            session_days=session_days, event_days=event_days,
+            events_per_session=events_per_session, queue_days=queue_days,
+            changes_keep=changes_keep, changes_days=changes_days,
+        )
+    finally:
+        conn.close()
+    if json_out:
+        console.print_json(data=res)
+        return
+    for table, n in res["deleted"].items():
+        if n:
+            console.print(f"删除 {table}: {n} 行")
+    for st in res["steps"]:
+        console.print(f"  {st['step']}: {st['elapsed']}s")
+    console.print(
+        f"[bold green]维护完成[/bold green]：用时 {res['elapsed']}s，文件 {res['bytes_before']} -> {res['bytes_after']} 字节"
+        f"（回收 {res['bytes_reclaimed']}），空闲页 {res['freelist_before']} -> {res['freelist_after']}"
+    )
+    if res["auto_vacuum"] != 2 and res["freelist_after"]:
+        console.print("[yellow]该库未启用增量回收，空闲页仅供后续写入复用；可执行一次 --full-vacuum 归还磁盘空间[/yellow]")
+
 @app.command("probe")
 def probe(
     start_url: Optional[str] = typer.Option(None, "--start-url", help="起始URL，默认使用 BASE_URL"),
@@ -133,90 +562,93 @@ def probe(
 @app.command("repair")
 def repair(
     only_kind: Optional[str] = typer.Option(None, "--only-kind", help="仅处理指定 kind 的记录，如 movie"),
-    limit: int = typer.Option(0, "--limit", help="限制处理数量，0 表示不限"),
+    limit: int = typer.Option(0, "--limit", help="仅处理最新的 N 条，0 表示不限"),
+    workers: int = typer.Option(0, "--workers", min=0, help="解析进程数，0 表示使用全部 CPU 核"),
+    chunk_size: int = typer.Option(DEFAULT_CHUNK_SIZE, "--chunk-size", min=1, help="每块读取与写入的条目数"),
+    stale_only: bool = typer.Option(False, "--stale-only", help=f"仅重新解析解析器版本低于当前版本（{PARSER_VERSION}）的条目"),
+    resume: bool = typer.Option(True, "--resume/--restart", help="--stale-only 时从上次中断的断点继续"),
+    fetch_workers: int = typer.Option(config.REFETCH_WORKERS, "--fetch-workers", min=1, help="重抓乱码/缺失页面的并发数"),
+    per_host: int = typer.Option(config.REFETCH_PER_HOST, "--per-host", min=1, help="每个主机的重抓并发上限"),
 ):
-    """重新解析数据库中已抓取条目的 raw_html，回填分类、标签与简介。"""
+    """重新解析数据库中已抓取条目的 raw_html，回填分类、标签与简介（分块流式读取，多进程解析）。"""
     conn = get_conn()
-    cur = conn.cursor()
-    sql = "SELECT id, detail_url, raw_html FROM movies WHERE 1=1"
-    params: List[str] = []
-    if only_kind:
-        sql += " AND kind = ?"
-        params.append(only_kind)
-    if limit and limit > 0:
-        sql += " ORDER BY id DESC LIMIT ?"
-        params.append(str(limit))
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    if not rows:
+
+    def _progress(p):
+        eta = f"，预计剩余 {p['eta']:.0f}s" if p["eta"] is not None else ""
+        console.print(f"已处理 {p['done']}/{p['total']}（{p['rows_per_sec']:.0f} 条/秒{eta}）")
+
+    def _event(evt):
+        if evt["event"] == "invalid":
+            console.print(f"[yellow]跳过无效详情页[/yellow] id={evt['id']} -> {evt['url']}")
+        elif evt["event"] == "fetch_failed":
+            console.print(f"[yellow]获取HTML失败[/yellow] id={evt['id']} {evt['message']} -> {evt['url']}")
+        elif evt["event"] == "still_garbled":
+            console.print(f"[yellow]重抓后仍疑似乱码[/yellow] id={evt['id']} -> {evt['url']}")
+        else:
+            console.print(f"[red]解析失败[/red] id={evt['id']} url={evt['url']}: {evt['message']}")
+
+    try:
+        res = repair_movies(conn, kind=only_kind, limit=limit, workers=workers or None, chunk_size=chunk_size,
+                            progress=_progress, on_event=_event, stale_only=stale_only, resume=resume,
+                            refetcher=Refetcher(workers=fetch_workers, per_host=per_host))
+        refresh_title_grams(conn)
+    except KeyboardInterrupt:
+        if stale_only:
+            console.print("[yellow]修复已中断，再次运行相同命令将从断点继续[/yellow]")
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+    if res["resumed_from_id"]:
+        console.print(f"从 id {res['resumed_from_id']} 之后继续")
+    if not res["rows"]:
         console.print("[yellow]没有可修复的记录[/yellow]")
         raise typer.Exit(0)
-    fixed = 0
-    scraper = DyttScraper()
-    for r in rows:
-        mid = r[0]
-        url = r[1]
-        html = r[2]
-        # 若库中 HTML 为空或疑似乱码，则重抓并使用健壮解码
-        if not html or looks_garbled(html):
-            try:
-                resp = scraper.s.get(url, timeout=config.REQUEST_TIMEOUT)
-                if resp.status_code == 200:
-                    html = decode_response(resp)
-                else:
-                    console.print(f"[yellow]获取HTML失败[/yellow] id={mid} status={resp.status_code} -> {url}")
-            except Exception as e:
-                console.print(f"[yellow]网络错误[/yellow] id={mid} -> {e}")
-        try:
-            if not html:
-                continue
-            data = parse_detail_page(html, url)
-            # 仅当为有效详情页才写回，避免错误页污染库
-            if not is_valid_detail(data):
-                console.print(f"[yellow]跳过无效详情页[/yellow] id={mid} -> {url}")
-                continue
-            upsert_movie(conn, data)
-            fixed += 1
-        except Exception as e:
-            console.print(f"[red]解析失败[/red] id={mid} url={url}: {e}")
-    console.print(f"[bold green]修复完成[/bold green]：更新 {fixed} 条记录")
+    console.print(
+        f"[bold green]修复完成[/bold green]：更新 {res['fixed']} 条记录，未变化 {res['unchanged']} 条；"
+        f"无效 {res['invalid']}，解析失败 {res['errors']}；"
+        f"{res['workers']} 进程，用时 {res['elapsed']}s（{res['rows_per_sec']} 条/秒）"
+    )
+    if res["refetched"] or res["fetch_failed"]:
+        console.print(
+            f"重抓：成功 {res['refetched']}（其中仍疑似乱码 {res['still_garbled']}），失败 {res['fetch_failed']}"
+        )
 
 # 新增：清理数据库中的无效条目（列表/搜索/错误页）
 @app.command("purge-invalid")
-def purge_invalid(
-    limit: int = typer.Option(0, "--limit", help="限制检查数量，0 表示不限"),
+def purge_invalid_cmd(
+    limit: int = typer.Option(0, "--limit", help="仅检查最新的 N 条，0 表示不限"),
     dry_run: bool = typer.Option(True, "--dry-run/--no-dry-run", help="预览模式，不执行删除"),
     verbose: bool = typer.Option(True, "--verbose/--no-verbose", help="显示处理详情"),
+    workers: int = typer.Option(0, "--workers", min=0, help="校验进程数，0 表示使用全部 CPU 核"),
+    chunk_size: int = typer.Option(DEFAULT_CHUNK_SIZE, "--chunk-size", min=1, help="每块读取与删除的条目数"),
+    report: Optional[str] = typer.Option(None, "--report", help="无效条目清单（JSONL）；预览模式默认写到 purge_invalid_report.jsonl"),
 ):
+    """分块校验 raw_html，按块批量删除无效条目及其标签、人员关联与下载链接。"""
     conn = get_conn()
-    cur = conn.cursor()
-    sql = "SELECT id, detail_url, raw_html FROM movies ORDER BY id DESC"
-    if limit and limit > 0:
-        sql += " LIMIT ?"
-        cur.execute(sql, (limit,))
-    else:
-        cur.execute(sql)
-    bad = 0
-    for mid, url, html in cur.fetchall():
-        if not html:
-            data = None
-        else:
-            try:
-                data = parse_detail_page(html, url)
-            except Exception as e:
-                data = None
-                if verbose:
-                    console.print(f"[red]解析失败[/red] id={mid}: {e}")
-        if not is_valid_detail(data):
-            bad += 1
-            if verbose:
-                console.print(f"[yellow]{'标记删除' if not dry_run else '检测到无效'}[/yellow] id={mid} -> {url}")
-            if not dry_run:
-                cur2 = conn.cursor()
-                cur2.execute("DELETE FROM download_links WHERE movie_id=?", (mid,))
-                cur2.execute("DELETE FROM movies WHERE id=?", (mid,))
-                conn.commit()
-    console.print(f"[bold]{'预览' if dry_run else '删除'}无效条目[/bold]: {bad}")
+    report = report or ("purge_invalid_report.jsonl" if dry_run else None)
+
+    def _event(evt):
+        if verbose:
+            console.print(f"[yellow]{'检测到无效' if dry_run else '标记删除'}[/yellow] id={evt['id']} ({evt['reason']}) -> {evt['url']}")
+
+    def _progress(p):
+        if not verbose:
+            console.print(f"已检查 {p['done']}/{p['total']}（{p['rows_per_sec']:.0f} 条/秒）")
+
+    try:
+        res = purge_invalid(conn, limit=limit, dry_run=dry_run, workers=workers or None, chunk_size=chunk_size,
+                            report_path=report, progress=_progress, on_event=_event)
+        if not dry_run:
+            refresh_title_grams(conn)
+    finally:
+        conn.close()
+    console.print(
+        f"[bold]{'预览' if dry_run else '删除'}无效条目[/bold]: {res['invalid']}"
+        + (f"（已删除 {res['deleted']}）" if not dry_run else "")
+        + f"，共检查 {res['checked']} 条，用时 {res['elapsed']}s"
+    )
+    if report:
+        console.print(f"清单已写入 {report}")
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
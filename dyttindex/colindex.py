@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖：未安装时检索走 SQL
+    np = None
+
+from . import config
+from .changes import OP_DELETE, changes_since, feed_has_gap, latest_change_seq
+from .db import get_movies_by_ids
+from .text import country_tokens
+
+# 列式过滤：把结构化检索字段（年份、评分、类别、评分来源、国别、时间戳）载入进程内的 NumPy 数组，
+# 字符串字段字典编码为整数；过滤以向量化掩码完成（字符串条件先在字典上求出命中的编码表，再按编码查表），
+# 排序使用各排序列预先算好的 (列, id) 升序排列，按排列取掩码后顺序即结果顺序，只返回 id，再按 id 回表取本页。
+# 通过 movie_changes 变更流增量刷新（有变化时排列作废，下次用到时重算）；变更流被清理出现断档时全量重载。
+# 网页服务启动时在后台线程载入，载入完成前检索走 SQL（见 start_background_load）。
+
+COLUMNAR_FILTERS = {"kind", "country", "rating_min", "year_from", "year_to", "rating_source"}
+COLUMNAR_ORDERS = {"updated_at", "created_at", "year", "rating", "id"}
+
+_LOAD_SQL = "SELECT id, year, rating_value, kind, rating_source, country, updated_at, created_at FROM movies"
+_NULL_TS = -1
+
+
+def _ts(v: Optional[str]) -> int:
+    """'2025-01-02 03:04:05' -> 20250102030405，与按文本排序的次序一致；NULL 最小。"""
+    if not v:
+        return _NULL_TS
+    try:
+        return int(v.replace("-", "").replace(" ", "").replace(":", "").replace("T", "")[:14])
+    except ValueError:
+        return _NULL_TS
+
+
+class _Dictionary:
+    """字符串字典编码：0 表示 NULL/空串。"""
+
+    def __init__(self) -> None:
+        self.values: List[Optional[str]] = [None]
+        self._codes: Dict[str, int] = {}
+
+    def code(self, v: Optional[str]) -> int:
+        if not v:
+            return 0
+        c = self._codes.get(v)
+        if c is None:
+            c = self._codes[v] = len(self.values)
+            self.values.append(v)
+        return c
+
+    def codes_where(self, pred) -> "np.ndarray":
+        return np.array([i for i, v in enumerate(self.values) if v is not None and pred(v)], dtype=np.int32)
+
+    def lookup(self, pred) -> "np.ndarray":
+        """编码 -> 是否命中的布尔表，用 table[codes] 得到掩码。"""
+        table = np.zeros(len(self.values), dtype=bool)
+        table[self.codes_where(pred)] = True
+        return table
+
+
+class ColumnarIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.seq = -1
+        self.loaded_at: Optional[float] = None
+        self._kind = _Dictionary()
+        self._source = _Dictionary()
+        self._country = _Dictionary()
+        self._pos: Dict[int, int] = {}
+        self._cols: Dict[str, Any] = {}
+        # 排序键 -> 按 (排序列, id) 升序的行号排列；列有变化时清空
+        self._orders: Dict[str, Any] = {}
+        self._loader: Optional[threading.Thread] = None
+
+    @property
+    def available(self) -> bool:
+        return np is not None and getattr(config, "COLUMNAR_INDEX", True)
+
+    @property
+    def loading(self) -> bool:
+        """后台首次载入尚未完成。"""
+        return self.seq < 0 and self._loader is not None and self._loader.is_alive()
+
+    def start_background_load(self, connect: Callable[[], sqlite3.Connection]) -> None:
+        """在后台线程中首次载入（connect 提供该线程自己的连接），期间 columnar_search 返回 None 走 SQL。"""
+        if not self.available or self.seq >= 0 or self.loading:
+            return
+
+        def _run() -> None:
+            conn = connect()
+            try:
+                self.refresh(conn)
+            finally:
+                conn.close()
+
+        self._loader = threading.Thread(target=_run, daemon=True)
+        self._loader.start()
+
+    @staticmethod
+    def supports(filters: Dict[str, Any], order_by: Optional[str] = None, cursor: Optional[str] = None) -> bool:
+        """只含结构化过滤、排序为数值/时间列且不带游标时可由列式索引完成。"""
+        active = {k for k, v in filters.items() if v not in (None, "", [])}
+        return not cursor and active <= COLUMNAR_FILTERS and (order_by or "updated_at").lower() in COLUMNAR_ORDERS
+
+    def _encode(self, row: sqlite3.Row) -> Tuple[Any, ...]:
+        return (
+            int(row[0]),
+            float(row[1]) if row[1] is not None else np.nan,
+            float(row[2]) if row[2] is not None else np.nan,
+            self._kind.code(row[3]),
+            self._source.code(row[4]),
+            self._country.code(row[5]),
+            _ts(row[6]),
+            _ts(row[7]),
+        )
+
+    def _build(self, recs: List[Tuple[Any, ...]]) -> Dict[str, Any]:
+        cols = list(zip(*recs)) if recs else [()] * 8
+        return {
+            "id": np.array(cols[0], dtype=np.int64),
+            "year": np.array(cols[1], dtype=np.float64),
+            "rating": np.array(cols[2], dtype=np.float64),
+            "kind": np.array(cols[3], dtype=np.int32),
+            "source": np.array(cols[4], dtype=np.int32),
+            "country": np.array(cols[5], dtype=np.int32),
+            "updated_at": np.array(cols[6], dtype=np.int64),
+            "created_at": np.array(cols[7], dtype=np.int64),
+            "alive": np.ones(len(recs), dtype=bool),
+        }
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """全量载入；先记下变更流位置，载入期间的写入会在下次刷新时重放（幂等）。"""
+        seq = latest_change_seq(conn)
+        cur = conn.cursor()
+        cur.execute(_LOAD_SQL)
+        recs: List[Tuple[Any, ...]] = []
+        while True:
+            rows = cur.fetchmany(5000)
+            if not rows:
+                break
+            recs.extend(self._encode(r) for r in rows)
+        self._cols = self._build(recs)
+        self._pos = {mid: i for i, mid in enumerate(self._cols["id"].tolist())}
+        self._orders = {}
+        self.seq = seq
+        self.loaded_at = time.time()
+
+    def refresh(self, conn: sqlite3.Connection) -> int:
+        """按变更流增量刷新，返回处理的影片数。"""
+        with self._lock:
+            if self.seq < 0 or feed_has_gap(conn, self.seq):
+                self.load(conn)
+                return len(self._pos)
+            changes = changes_since(conn, self.seq)
+            if not changes:
+                return 0
+            touched: Dict[int, str] = {}
+            for _, mid, op in changes:
+                touched[mid] = op
+            live = [mid for mid, op in touched.items() if op != OP_DELETE]
+            recs: Dict[int, Tuple[Any, ...]] = {}
+            for k in range(0, len(live), 500):
+                chunk = live[k:k + 500]
+                cur = conn.cursor()
+                cur.execute(_LOAD_SQL + f" WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                for r in cur.fetchall():
+                    recs[int(r[0])] = self._encode(r)
+            cols = self._cols
+            appended: List[Tuple[Any, ...]] = []
+            for mid in touched:
+                pos = self._pos.get(mid)
+                rec = recs.get(mid)
+                if rec is None:
+                    # 已删除（或插入后又被删除）
+                    if pos is not None:
+                        cols["alive"][pos] = False
+                    continue
+                if pos is None:
+                    appended.append(rec)
+                    continue
+                for name, v in zip(("id", "year", "rating", "kind", "source", "country", "updated_at", "created_at"), rec):
+                    cols[name][pos] = v
+                cols["alive"][pos] = True
+            if appended:
+                extra = self._build(appended)
+                base = len(cols["id"])
+                self._cols = {k: np.concatenate([cols[k], extra[k]]) for k in cols}
+                for i, rec in enumerate(appended):
+                    self._pos[rec[0]] = base + i
+            self._orders = {}
+            self.seq = changes[-1][0]
+            return len(touched)
+
+    def _mask(self, filters: Dict[str, Any]) -> "np.ndarray":
+        c = self._cols
+        mask = c["alive"].copy()
+        kind = filters.get("kind")
+        if kind:
+            if kind == "movie":
+                # 与 SQL 一致：movie 及其细分 movie_cn/movie_en 等
+                table = self._kind.lookup(lambda v: "movie" <= v < "movif")
+            else:
+                table = self._kind.lookup(lambda v: v == kind)
+            mask &= table[c["kind"]]
+        country = filters.get("country")
+        if country:
+            # 与 SQL 一致：按国家/地区整词匹配，多个国家时需同时包含
+            wanted = country_tokens(country)
+            mask &= self._country.lookup(lambda v: all(w in country_tokens(v) for w in wanted))[c["country"]]
+        source = filters.get("rating_source")
+        if source:
+            mask &= self._source.lookup(lambda v: v == source)[c["source"]]
+        if filters.get("rating_min") is not None:
+            mask &= c["rating"] >= float(filters["rating_min"])
+        if filters.get("year_from") is not None:
+            mask &= c["year"] >= float(filters["year_from"])
+        if filters.get("year_to") is not None:
+            mask &= c["year"] <= float(filters["year_to"])
+        return mask
+
+    def _sort_key(self, order_by: str) -> "np.ndarray":
+        c = self._cols
+        if order_by == "id":
+            return c["id"]
+        if order_by in ("year", "rating"):
+            # SQLite 中 NULL 最小
+            return np.nan_to_num(c[order_by], nan=-np.inf)
+        return c[order_by]
+
+    def _order(self, order_by: str) -> "np.ndarray":
+        """按 (排序列, id) 升序的行号排列，降序时倒序遍历；有变化后首次用到时重算。"""
+        order = self._orders.get(order_by)
+        if order is None:
+            order = self._orders[order_by] = np.lexsort((self._cols["id"], self._sort_key(order_by)))
+        return order
+
+    def query(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        order_by: Optional[str] = None,
+        order_dir: str = "desc",
+        **filters: Any,
+    ) -> Tuple[List[int], int]:
+        """返回 (本页 id 列表, 总数)；排序与 SQL 的 ORDER BY 列, id 一致。"""
+        key = (order_by or "updated_at").lower()
+        desc = (order_dir or "desc").lower() != "asc"
+        with self._lock:
+            order = self._order(key)
+            # 掩码按排序排列取出后，命中位置的先后即结果顺序
+            hits = np.flatnonzero(self._mask(filters)[order])
+            total = int(hits.size)
+            k = int(offset) + int(limit)
+            if int(offset) >= total:
+                return [], total
+            page = hits[::-1][int(offset):k] if desc else hits[int(offset):k]
+            return self._cols["id"][order[page]].tolist(), total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "rows": int(self._cols["alive"].sum()) if self._cols else 0,
+            "seq": self.seq,
+            "loaded_at": self.loaded_at,
+            "loading": self.loading,
+        }
+
+
+columnar_index = ColumnarIndex()
+
+
+def columnar_search(
+    conn: sqlite3.Connection,
+    limit: int = 50,
+    offset: int = 0,
+    order_by: Optional[str] = None,
+    order_dir: str = "desc",
+    cursor: Optional[str] = None,
+    index: Optional[ColumnarIndex] = None,
+    **filters: Any,
+) -> Optional[Tuple[List[sqlite3.Row], int]]:
+    """条件可由列式索引完成时返回 (本页行, 总数)，否则返回 None 由调用方走 SQL。"""
+    index = index or columnar_index
+    if not index.available or not index.supports(filters, order_by, cursor) or index.loading:
+        return None
+    index.refresh(conn)
+    ids, total = index.query(limit=limit, offset=offset, order_by=order_by, order_dir=order_dir, **filters)
+    return get_movies_by_ids(conn, ids), total
@@ -14,6 +14,11 @@ REQUEST_TIMEOUT = 15
 REQUEST_RETRY = 2
 REQUEST_SLEEP = (0.8, 1.8)  # 每次请求之间的随机睡眠区间（秒）
 
+# repair 重抓乱码/缺失页面：并发线程数、每个主机的并发上限、重试退避基数（秒，按 2^n 增长）；重试次数同 REQUEST_RETRY
+REFETCH_WORKERS = 8
+REFETCH_PER_HOST = 2
+REFETCH_BACKOFF = 1.0
+
 DEFAULT_HEADERS = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "zh-CN,zh;q=0.9",
@@ -34,4 +39,26 @@ DEFAULT_MAX_PAGES_TOTAL = 300
 DEFAULT_MAX_ITEMS_TOTAL = 3000
 
 # 是否屏蔽 HTTPS 证书相关警告
-SUPPRESS_TLS_WARNINGS = True
\ No newline at end of file
+SUPPRESS_TLS_WARNINGS = True
+
+# 检索结果缓存（进程内 LRU）：条目上限与过期时间（秒）；写入代数变化时整体失效
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 60
+
+# 列式过滤索引（需安装 numpy）：结构化条件检索在进程内完成；关闭或未安装时走 SQL
+COLUMNAR_INDEX = True
+
+# 网页服务后台按变更流刷新派生索引（容错检索倒排表、列式索引、联想索引）的间隔（秒），0 表示只在启动时载入一次
+INDEX_REFRESH_SECONDS = 30
+
+# 数据库维护（maintain）保留策略，0 表示不按该条件清理：
+# 不活动会话的保留天数、事件保留天数与每会话事件上限、已完成队列行保留天数、
+# 变更流至少保留的最近条数与最长保留天数
+MAINTAIN_SESSION_DAYS = 30
+MAINTAIN_EVENT_DAYS = 14
+MAINTAIN_EVENTS_PER_SESSION = 20000
+MAINTAIN_QUEUE_DAYS = 7
+MAINTAIN_CHANGES_KEEP = 50000
+MAINTAIN_CHANGES_DAYS = 30
+# 网页服务定时执行 maintain 的间隔（小时），0 表示不定时执行
+MAINTAIN_INTERVAL_HOURS = 0
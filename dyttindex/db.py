@@ -1,11 +1,21 @@
 from __future__ import annotations
 
 import os
+import re
+import json
+import base64
+import hashlib
 import sqlite3
 import datetime as dt
-from typing import Iterable, List, Optional, Dict, Any
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Dict, Any, Tuple
 
 from .config import SQLITE_PATH
+from .fts import FTS_TABLE, fts_available, fts_query, bm25_expr, snippet_expr
+from .people import ROLE_DIRECTOR, ROLE_ACTOR, sync_movie_people, people_filter, people_like_filter
+from .links import dedup_links, parse_link
+from .episodes import episode_filter
+from .text import country_tokens, country_tokens_sql
 
 
 def _ensure_dir(path: str) -> None:
@@ -21,109 +31,53 @@ def get_conn() -> sqlite3.Connection:
     return conn
 
 
-# 新增：简单迁移，确保下载链接表有 episode 列
-def _migrate_download_links_episode(cur: sqlite3.Cursor) -> None:
-    cur.execute("PRAGMA table_info(download_links)")
-    cols = [row[1] for row in cur.fetchall()]
-    if "episode" not in cols:
-        cur.execute("ALTER TABLE download_links ADD COLUMN episode INTEGER")
-
-
 def create_db(drop: bool = False) -> None:
+    """创建或升级数据库结构（版本化迁移见 migrations.py）。"""
+    from .migrations import migrate
+
     if drop and os.path.exists(SQLITE_PATH):
         os.remove(SQLITE_PATH)
+        clear_tag_cache()
     conn = get_conn()
+    # 新库启用增量回收空闲页（建表前设置才生效；旧库由 maintain --full-vacuum 切换）
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    migrate(conn)
+    conn.close()
+
+
+# 键值元数据与写入代数：任何改变检索结果的写入都递增代数（与写入同一事务），
+# 其他进程的检索缓存据此失效。
+
+def get_meta(conn: sqlite3.Connection, key: str, default: Optional[str] = None) -> Optional[str]:
     cur = conn.cursor()
-    cur.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS movies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            original_title TEXT,
-            year INTEGER,
-            kind TEXT,
-            country TEXT,
-            language TEXT,
-            director TEXT,
-            actors TEXT,
-            rating_source TEXT,
-            rating_value REAL,
-            rating_votes INTEGER,
-            tags_text TEXT,
-            description TEXT,
-            cover_url TEXT,
-            detail_url TEXT NOT NULL UNIQUE,
-            raw_html TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-        CREATE TABLE IF NOT EXISTS tags (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE
-        );
-        CREATE TABLE IF NOT EXISTS movie_tags (
-            movie_id INTEGER NOT NULL,
-            tag_id INTEGER NOT NULL,
-            PRIMARY KEY (movie_id, tag_id),
-            FOREIGN KEY(movie_id) REFERENCES movies(id) ON DELETE CASCADE,
-            FOREIGN KEY(tag_id) REFERENCES tags(id) ON DELETE CASCADE
-        );
-        CREATE TABLE IF NOT EXISTS download_links (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            movie_id INTEGER NOT NULL,
-            url TEXT NOT NULL,
-            kind TEXT,
-            label TEXT,
-            UNIQUE(movie_id, url),
-            FOREIGN KEY(movie_id) REFERENCES movies(id) ON DELETE CASCADE
-        );
-        -- 断点续爬相关表
-        CREATE TABLE IF NOT EXISTS crawl_sessions (
-            id TEXT PRIMARY KEY,
-            started_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            notes TEXT
-        );
-        CREATE TABLE IF NOT EXISTS crawl_visits (
-            session_id TEXT NOT NULL,
-            url TEXT NOT NULL,
-            kind TEXT NOT NULL,
-            visited_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY(session_id, url, kind),
-            FOREIGN KEY(session_id) REFERENCES crawl_sessions(id) ON DELETE CASCADE
-        );
-        CREATE TABLE IF NOT EXISTS crawl_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            event TEXT,
-            section TEXT,
-            url TEXT,
-            detail_url TEXT,
-            message TEXT,
-            count INTEGER,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(session_id) REFERENCES crawl_sessions(id) ON DELETE CASCADE
-        );
-        CREATE TABLE IF NOT EXISTS crawl_queue (
-            session_id TEXT NOT NULL,
-            url TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'queued',
-            enqueued_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            dequeued_at TEXT,
-            PRIMARY KEY(session_id, url),
-            FOREIGN KEY(session_id) REFERENCES crawl_sessions(id) ON DELETE CASCADE
-        );
-        """
+    cur.execute("SELECT value FROM app_meta WHERE key=?", (key,))
+    row = cur.fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: Any) -> None:
+    """写入键值（不提交事务）。"""
+    conn.execute(
+        "INSERT INTO app_meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+        (key, None if value is None else str(value)),
     )
-    # 迁移：为已存在的 download_links 增加 episode 列
-    _migrate_download_links_episode(cur)
-    # 迁移：确保 movies 表存在 alt_titles_text 列
-    cur.execute("PRAGMA table_info(movies)")
-    cols = [row[1] for row in cur.fetchall()]
-    if "alt_titles_text" not in cols:
-        cur.execute("ALTER TABLE movies ADD COLUMN alt_titles_text TEXT")
-    conn.commit()
-    conn.close()
+
+
+def bump_write_generation(conn: sqlite3.Connection) -> None:
+    """递增写入代数（不提交事务）。"""
+    conn.execute(
+        "INSERT INTO app_meta(key, value) VALUES('write_generation', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+def get_write_generation(conn: sqlite3.Connection) -> int:
+    try:
+        return int(get_meta(conn, "write_generation", "0") or 0)
+    except sqlite3.OperationalError:
+        # 尚未迁移的旧库
+        return 0
+
 
 # 会话与访问记录 API
 
@@ -158,8 +112,6 @@ def mark_visited(conn: sqlite3.Connection, session_id: Optional[str], url: str,
     conn.commit()
 
 # 持久化前沿队列（断点续跑）
-from typing import List
-
 def enqueue_urls(conn: sqlite3.Connection, session_id: Optional[str], urls: List[str]) -> None:
     if not session_id or not urls:
         return
@@ -217,98 +169,385 @@ def append_event(conn: sqlite3.Connection, session_id: Optional[str], event: dic
     conn.commit()
 
 
-def _ensure_tags(conn: sqlite3.Connection, tag_names: Iterable[str]) -> List[int]:
+# 进程级标签缓存：数据库文件 -> {标签名: id}。tags 表只增不删；
+# 事务回滚可能撤销刚插入的标签，回滚处需调用 clear_tag_cache()。
+_TAG_CACHE: Dict[str, Dict[str, int]] = {}
+
+
+def _tag_cache(conn: sqlite3.Connection) -> Dict[str, int]:
+    row = conn.execute("PRAGMA database_list").fetchone()
+    key = (row[2] if row and row[2] else f"memory:{id(conn)}")
+    return _TAG_CACHE.setdefault(key, {})
+
+
+def clear_tag_cache() -> None:
+    _TAG_CACHE.clear()
+
+
+def _ensure_tags(conn: sqlite3.Connection, tag_names: Iterable[str], cache: Optional[Dict[str, int]] = None) -> List[int]:
+    if cache is None:
+        cache = _tag_cache(conn)
     ids: List[int] = []
     cur = conn.cursor()
     for name in {t.strip() for t in tag_names if t and t.strip()}:
-        cur.execute("INSERT OR IGNORE INTO tags(name) VALUES(?)", (name,))
-        cur.execute("SELECT id FROM tags WHERE name=?", (name,))
-        row = cur.fetchone()
-        if row:
-            ids.append(row[0])
+        tid = cache.get(name)
+        if tid is None:
+            cur.execute("INSERT OR IGNORE INTO tags(name) VALUES(?)", (name,))
+            cur.execute("SELECT id FROM tags WHERE name=?", (name,))
+            row = cur.fetchone()
+            if not row:
+                continue
+            tid = cache[name] = int(row[0])
+        ids.append(tid)
     return ids
 
 
+_TAG_SPLIT_RE = re.compile(r"[,，、;；]+")
 
 
-def upsert_movie(conn: sqlite3.Connection, data: Dict[str, Any]) -> int:
-    assert data.get("detail_url"), "detail_url is required"
-    # UPSERT 基本信息
+def split_tags(text: Optional[str]) -> List[str]:
+    """拆分 tags_text（逗号等分隔）为去重后的标签列表，保持顺序。"""
+    out: List[str] = []
+    for t in _TAG_SPLIT_RE.split(text or ""):
+        t = t.strip()
+        if t and t not in out:
+            out.append(t)
+    return out
+
+
+def set_movie_tags(conn: sqlite3.Connection, movie_id: int, tag_names: Iterable[str]) -> None:
+    """将影片的 movie_tags 关联替换为给定标签集合（不提交事务）。"""
+    tag_ids = _ensure_tags(conn, tag_names)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM movie_tags WHERE movie_id=?", (movie_id,))
+    cur.executemany(
+        "INSERT OR IGNORE INTO movie_tags(movie_id, tag_id) VALUES(?,?)",
+        [(movie_id, tid) for tid in tag_ids],
+    )
+
+
+def update_movie(
+    conn: sqlite3.Connection,
+    movie_id: int,
+    tags_text: Optional[str] = None,
+    description: Optional[str] = None,
+) -> bool:
+    """手工编辑标签与简介；标签同时同步到 movie_tags。返回条目是否存在。"""
+    tags = split_tags(tags_text)
     cur = conn.cursor()
-    tags_text = ",".join([t for t in (data.get("tags") or [])]) if data.get("tags") else None
     cur.execute(
-        """
-        INSERT INTO movies(
-            title, original_title, year, kind, country, language, director, actors,
-            rating_source, rating_value, rating_votes, tags_text, description,
-            cover_url, detail_url, raw_html, alt_titles_text, created_at, updated_at
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP,CURRENT_TIMESTAMP)
-        ON CONFLICT(detail_url) DO UPDATE SET
-            title=excluded.title,
-            original_title=excluded.original_title,
-            year=excluded.year,
-            kind=excluded.kind,
-            country=excluded.country,
-            language=excluded.language,
-            director=excluded.director,
-            actors=excluded.actors,
-            rating_source=excluded.rating_source,
-            rating_value=excluded.rating_value,
-            rating_votes=excluded.rating_votes,
-            tags_text=excluded.tags_text,
-            description=excluded.description,
-            cover_url=excluded.cover_url,
-            raw_html=excluded.raw_html,
-            alt_titles_text=excluded.alt_titles_text,
-            updated_at=CURRENT_TIMESTAMP
-        """,
-        (
-            data.get("title") or "",
-            data.get("original_title"),
-            data.get("year"),
-            data.get("kind"),
-            data.get("country"),
-            data.get("language"),
-            data.get("director"),
-            data.get("actors"),
-            data.get("rating_source"),
-            data.get("rating_value"),
-            data.get("rating_votes"),
-            tags_text,
-            data.get("description"),
-            data.get("cover_url"),
-            data.get("detail_url"),
-            data.get("raw_html"),
-            ",".join(data.get("alt_titles") or []) if data.get("alt_titles") else data.get("alt_titles_text"),
-        ),
+        "UPDATE movies SET tags_text=?, description=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+        (",".join(tags) if tags else None, description, movie_id),
     )
-    # 获取 movie_id
-    cur.execute("SELECT id FROM movies WHERE detail_url=?", (data.get("detail_url"),))
+    if not cur.rowcount:
+        conn.rollback()
+        return False
+    set_movie_tags(conn, movie_id, tags)
+    # 编辑改变了参与哈希的字段，按编辑后的内容重算，否则重新导入/抓取时的变更检测会误判
+    cur.execute("UPDATE movies SET content_hash=? WHERE id=?", (stored_content_hash(conn, movie_id), movie_id))
+    bump_write_generation(conn)
+    conn.commit()
+    return True
+
+
+def delete_movies(conn: sqlite3.Connection, movie_ids: Iterable[int]) -> int:
+    """删除影片及其标签、人员关联与下载链接（同一事务），返回删除的影片数。"""
+    ids = [int(i) for i in movie_ids]
+    if not ids:
+        return 0
+    cur = conn.cursor()
+    deleted = 0
+    for k in range(0, len(ids), 500):
+        chunk = ids[k:k + 500]
+        marks = ",".join("?" * len(chunk))
+        for table in ("movie_tags", "movie_people", "download_links", "movie_aliases"):
+            cur.execute(f"DELETE FROM {table} WHERE movie_id IN ({marks})", chunk)
+        cur.execute(f"DELETE FROM movies WHERE id IN ({marks})", chunk)
+        deleted += cur.rowcount
+    if deleted:
+        bump_write_generation(conn)
+    conn.commit()
+    return deleted
+
+
+# 变更检测：content_hash 覆盖规范化后的解析字段（含标签与下载链接），html_hash 覆盖原始 HTML。
+# 两者都未变化时 upsert 不做任何写入；仅 HTML 变化时只更新 raw_html；
+# updated_at 只在解析内容变化时更新。
+UPSERT_INSERTED = "inserted"
+UPSERT_UPDATED = "updated"
+UPSERT_HTML_ONLY = "html_only"
+UPSERT_UNCHANGED = "unchanged"
+# detail_url 已在去重合并时并入其他条目（movie_aliases）：不写入，返回保留条目的 id
+UPSERT_MERGED = "merged"
+
+_CONTENT_FIELDS = [
+    "title", "original_title", "year", "kind", "country", "language", "director", "actors",
+    "rating_source", "rating_value", "rating_votes", "description", "cover_url",
+]
+
+
+def _tag_list(data: Dict[str, Any]) -> List[str]:
+    out: List[str] = []
+    for t in data.get("tags") or []:
+        t = (t or "").strip()
+        if t and t not in out:
+            out.append(t)
+    return out
+
+
+def _link_map(data: Dict[str, Any]) -> Dict[str, Tuple[Any, Any, Any]]:
+    """url -> (kind, label, episode)；同一 url 以首次出现为准（与 UNIQUE(movie_id, url) 一致）。"""
+    out: Dict[str, Tuple[Any, Any, Any]] = {}
+    for dl in data.get("download_links") or []:
+        url = dl.get("url")
+        if url and url not in out:
+            out[url] = (dl.get("kind"), dl.get("label"), dl.get("episode"))
+    return out
+
+
+def _alt_titles_text(data: Dict[str, Any]) -> Optional[str]:
+    return ",".join(data.get("alt_titles") or []) if data.get("alt_titles") else data.get("alt_titles_text")
+
+
+def content_hash(data: Dict[str, Any]) -> str:
+    norm = {k: data.get(k) for k in _CONTENT_FIELDS}
+    norm["title"] = norm["title"] or ""
+    norm["alt_titles_text"] = _alt_titles_text(data)
+    norm["tags"] = sorted(_tag_list(data))
+    # 与入库的链接一致（同一资源标识只保留首个），库中内容重算的 stored_content_hash 才能对上
+    norm["download_links"] = sorted([url, *v] for url, v in dedup_links(_link_map(data)).items())
+    blob = json.dumps(norm, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def stored_content_hash(conn: sqlite3.Connection, movie_id: int) -> Optional[str]:
+    """按库中当前内容（字段、movie_tags 与下载链接）计算 content_hash，与重新导入导出文件时的计算一致。"""
+    cur = conn.cursor()
+    cur.execute(f"SELECT {', '.join(_CONTENT_FIELDS)}, alt_titles_text FROM movies WHERE id=?", (movie_id,))
     row = cur.fetchone()
-    movie_id = int(row[0])
+    if row is None:
+        return None
+    data: Dict[str, Any] = dict(zip(_CONTENT_FIELDS, row))
+    data["alt_titles_text"] = row[len(_CONTENT_FIELDS)]
+    cur.execute(
+        "SELECT t.name FROM movie_tags mt JOIN tags t ON t.id = mt.tag_id WHERE mt.movie_id=?", (movie_id,)
+    )
+    data["tags"] = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT url, kind, label, episode FROM download_links WHERE movie_id=? ORDER BY id", (movie_id,))
+    data["download_links"] = [dict(zip(("url", "kind", "label", "episode"), r)) for r in cur.fetchall()]
+    return content_hash(data)
+
+
+def html_hash(html: Optional[str]) -> Optional[str]:
+    if not html:
+        return None
+    return hashlib.sha1(html.encode("utf-8", "replace")).hexdigest()
+
 
-    # 标签关联
-    tag_ids = _ensure_tags(conn, data.get("tags") or [])
-    for tid in tag_ids:
+def _sync_tags(
+    conn: sqlite3.Connection,
+    movie_id: int,
+    tag_names: List[str],
+    is_new: bool = False,
+    cache: Optional[Dict[str, int]] = None,
+) -> None:
+    """按差异更新 movie_tags：只删除移除的、只插入新增的。"""
+    cur = conn.cursor()
+    new_ids = set(_ensure_tags(conn, tag_names, cache))
+    old_ids = set()
+    if not is_new:
+        cur.execute("SELECT tag_id FROM movie_tags WHERE movie_id=?", (movie_id,))
+        old_ids = {r[0] for r in cur.fetchall()}
+    removed = old_ids - new_ids
+    if removed:
+        cur.executemany("DELETE FROM movie_tags WHERE movie_id=? AND tag_id=?", [(movie_id, t) for t in removed])
+    added = new_ids - old_ids
+    if added:
+        cur.executemany("INSERT OR IGNORE INTO movie_tags(movie_id, tag_id) VALUES(?,?)", [(movie_id, t) for t in added])
+
+
+def _sync_links(cur: sqlite3.Cursor, movie_id: int, links: Dict[str, Tuple[Any, Any, Any]], is_new: bool = False) -> None:
+    """按差异更新 download_links：删除页面上已消失的链接，新增（同时解析资源标识）或修正变化的链接。"""
+    old: Dict[str, Tuple[int, Tuple[Any, Any, Any]]] = {}
+    if not is_new:
+        cur.execute("SELECT id, url, kind, label, episode FROM download_links WHERE movie_id=?", (movie_id,))
+        old = {r[1]: (r[0], (r[2], r[3], r[4])) for r in cur.fetchall()}
+    removed = [(old[u][0],) for u in old if u not in links]
+    if removed:
+        cur.executemany("DELETE FROM download_links WHERE id=?", removed)
+    added = [(movie_id, u, *v, *parse_link(u)) for u, v in links.items() if u not in old]
+    if added:
+        cur.executemany(
+            "INSERT OR IGNORE INTO download_links(movie_id, url, kind, label, episode, btih, ed2k_hash, size)"
+            " VALUES(?,?,?,?,?,?,?,?)",
+            added,
+        )
+    changed = [(*v, old[u][0]) for u, v in links.items() if u in old and old[u][1] != v]
+    if changed:
+        cur.executemany("UPDATE download_links SET kind=?, label=?, episode=? WHERE id=?", changed)
+
+
+def _write_movie(
+    conn: sqlite3.Connection,
+    data: Dict[str, Any],
+    existing: Optional[Tuple[int, Optional[str], Optional[str], int]],
+    tag_cache: Optional[Dict[str, int]] = None,
+) -> Tuple[int, str, str, Optional[str], int]:
+    """按哈希比较写入单条记录（不提交事务）。existing 为 (id, content_hash, html_hash, parser_version) 或 None。
+
+    返回 (movie_id, 状态, content_hash, html_hash, parser_version)，状态为 UPSERT_* 之一。
+    """
+    cur = conn.cursor()
+    ch = content_hash(data)
+    raw_html = data.get("raw_html")
+    hh = html_hash(raw_html)
+    # 记录未携带解析器版本（如从旧导出文件导入）时保留库中已有版本
+    pv = data.get("parser_version")
+    if existing:
+        movie_id, old_ch, old_hh, old_pv = existing
+        # 记录未携带 HTML（如从导出文件导入）时保留库中已有 HTML
+        html_changed = bool(hh) and hh != old_hh
+        pv = old_pv if pv is None else int(pv)
+        if old_ch == ch:
+            if not html_changed:
+                if pv != old_pv:
+                    # 内容未变，只记下由新版本解析器确认过
+                    cur.execute("UPDATE movies SET parser_version=? WHERE id=?", (pv, movie_id))
+                return movie_id, UPSERT_UNCHANGED, ch, old_hh, pv
+            cur.execute("UPDATE movies SET raw_html=?, html_hash=?, parser_version=? WHERE id=?", (raw_html, hh, pv, movie_id))
+            return movie_id, UPSERT_HTML_ONLY, ch, hh, pv
+    pv = int(pv or 0)
+    tags = _tag_list(data)
+    values = [data.get(k) for k in _CONTENT_FIELDS]
+    values[0] = values[0] or ""
+    values += [",".join(tags) if tags else None, _alt_titles_text(data), ch, pv]
+    if existing:
+        sets = ", ".join(f"{k}=?" for k in _CONTENT_FIELDS)
+        sql = (
+            f"UPDATE movies SET {sets}, tags_text=?, alt_titles_text=?, content_hash=?, parser_version=?,"
+            f" updated_at=CURRENT_TIMESTAMP"
+        )
+        if html_changed:
+            sql += ", raw_html=?, html_hash=?"
+            values += [raw_html, hh]
+        cur.execute(sql + " WHERE id=?", values + [movie_id])
+        status = UPSERT_UPDATED
+        if not html_changed:
+            hh = old_hh
+    else:
+        cols = ", ".join(_CONTENT_FIELDS)
         cur.execute(
-            "INSERT OR IGNORE INTO movie_tags(movie_id, tag_id) VALUES(?,?)",
-            (movie_id, tid),
+            f"""
+            INSERT INTO movies({cols}, tags_text, alt_titles_text, content_hash, parser_version, detail_url, raw_html,
+                               html_hash, created_at, updated_at)
+            VALUES ({",".join("?" * (len(_CONTENT_FIELDS) + 7))}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            """,
+            values + [data.get("detail_url"), raw_html, hh],
         )
+        movie_id = int(cur.lastrowid)
+        status = UPSERT_INSERTED
 
-    # 下载链接（增加 episode 字段）
-    for dl in (data.get("download_links") or []):
-        url = dl.get("url")
-        if not url:
-            continue
+    # 标签、下载链接按差异同步；导演/演员关联随内容重建
+    is_new = status == UPSERT_INSERTED
+    _sync_tags(conn, movie_id, tags, is_new=is_new, cache=tag_cache)
+    _sync_links(cur, movie_id, dedup_links(_link_map(data)), is_new=is_new)
+    sync_movie_people(cur, movie_id, data.get("director"), data.get("actors"))
+    return movie_id, status, ch, hh, pv
+
+
+def merged_movie_ids(conn: sqlite3.Connection, urls: Iterable[str]) -> Dict[str, int]:
+    """去重合并时被删除条目的 detail_url -> 保留条目 id。"""
+    urls = list(urls)
+    out: Dict[str, int] = {}
+    cur = conn.cursor()
+    for k in range(0, len(urls), 500):
+        chunk = urls[k:k + 500]
         cur.execute(
-            "INSERT OR IGNORE INTO download_links(movie_id, url, kind, label, episode) VALUES(?,?,?,?,?)",
-            (movie_id, url, dl.get("kind"), dl.get("label"), dl.get("episode")),
+            f"SELECT detail_url, movie_id FROM movie_aliases WHERE detail_url IN ({','.join('?' * len(chunk))})",
+            chunk,
         )
+        out.update((r[0], int(r[1])) for r in cur.fetchall())
+    return out
 
-    conn.commit()
+
+def upsert_movie(conn: sqlite3.Connection, data: Dict[str, Any]) -> int:
+    assert data.get("detail_url"), "detail_url is required"
+    cur = conn.cursor()
+    cur.execute("SELECT id, content_hash, html_hash, parser_version FROM movies WHERE detail_url=?", (data.get("detail_url"),))
+    row = cur.fetchone()
+    existing = (int(row[0]), row[1], row[2], int(row[3] or 0)) if row else None
+    if existing is None:
+        merged = merged_movie_ids(conn, [data["detail_url"]])
+        if merged:
+            return merged[data["detail_url"]]
+    try:
+        movie_id, status, _, _, pv = _write_movie(conn, data, existing)
+    except Exception:
+        conn.rollback()
+        clear_tag_cache()
+        raise
+    if status not in (UPSERT_UNCHANGED, UPSERT_HTML_ONLY):
+        bump_write_generation(conn)
+    # 内容未变时也可能写了解析器版本戳，不提交会一直持有写锁
+    if status != UPSERT_UNCHANGED or pv != existing[3]:
+        conn.commit()
     return movie_id
 
 
+def upsert_movies(conn: sqlite3.Connection, records: Iterable[Dict[str, Any]], batch_size: int = 500) -> Dict[str, int]:
+    """批量 upsert：每批一个事务，批量预取已有记录的哈希，标签 id 走进程级缓存。
+
+    返回各状态（UPSERT_*）的计数。任一记录失败时回滚当前批次并抛出异常。
+    """
+    counts = {UPSERT_INSERTED: 0, UPSERT_UPDATED: 0, UPSERT_HTML_ONLY: 0, UPSERT_UNCHANGED: 0, UPSERT_MERGED: 0}
+    batch: List[Dict[str, Any]] = []
+
+    def _flush() -> None:
+        if not batch:
+            return
+        cur = conn.cursor()
+        urls = list({d["detail_url"] for d in batch})
+        existing: Dict[str, Tuple[int, Optional[str], Optional[str], int]] = {}
+        for k in range(0, len(urls), 500):
+            chunk = urls[k:k + 500]
+            cur.execute(
+                f"SELECT detail_url, id, content_hash, html_hash, parser_version FROM movies"
+                f" WHERE detail_url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for r in cur.fetchall():
+                existing[r[0]] = (int(r[1]), r[2], r[3], int(r[4] or 0))
+        merged = merged_movie_ids(conn, [u for u in urls if u not in existing])
+        cache = _tag_cache(conn)
+        try:
+            changed = False
+            for d in batch:
+                url = d["detail_url"]
+                if url in merged:
+                    counts[UPSERT_MERGED] += 1
+                    continue
+                movie_id, status, ch, hh, pv = _write_movie(conn, d, existing.get(url), cache)
+                existing[url] = (movie_id, ch, hh, pv)
+                counts[status] += 1
+                changed = changed or status in (UPSERT_INSERTED, UPSERT_UPDATED)
+            if changed:
+                bump_write_generation(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            clear_tag_cache()
+            raise
+        batch.clear()
+
+    for data in records:
+        assert data.get("detail_url"), "detail_url is required"
+        batch.append(data)
+        if len(batch) >= batch_size:
+            _flush()
+    _flush()
+    return counts
+
+
 def get_movie(conn: sqlite3.Connection, movie_id: int) -> Optional[sqlite3.Row]:
     cur = conn.cursor()
     cur.execute("SELECT * FROM movies WHERE id=?", (movie_id,))
@@ -321,7 +560,70 @@ def get_download_links(conn: sqlite3.Connection, movie_id: int) -> List[sqlite3.
     return cur.fetchall()
 
 
-def search_movies(
+def _keyword_filter(conn: sqlite3.Connection, keyword: str) -> Tuple[str, List[Any], Optional[str]]:
+    """关键字过滤条件：优先走 FTS5 全文索引；过短（1~2 个字符）时查标题二元组倒排表、演员与国别，
+    不再匹配简介；其余情况（无全文索引等）回退到多字段 LIKE。
+
+    返回 (SQL 片段, 参数, FTS 查询串或 None)。
+    """
+    # 延迟导入：fuzzy 依赖本模块
+    from .fuzzy import keyword_grams_sql
+
+    q = fts_query(keyword)
+    if q and fts_available(conn):
+        return f" AND m.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)", [q], q
+    kw = f"%{keyword}%"
+    grams = None if q else keyword_grams_sql(keyword)
+    if grams:
+        sql, params = grams
+        return (
+            f" AND m.id IN ({sql}"
+            " UNION SELECT mp.movie_id FROM people p JOIN movie_people mp ON mp.person_id = p.id"
+            " WHERE mp.role = ? AND (p.name LIKE ? OR p.name_alt LIKE ?)"
+            " UNION SELECT id FROM movies WHERE country LIKE ?)",
+            params + [ROLE_ACTOR, kw, kw, kw],
+            None,
+        )
+    return (
+        " AND (m.title LIKE ? OR m.original_title LIKE ? OR m.alt_titles_text LIKE ? OR m.description LIKE ? OR m.actors LIKE ? OR m.country LIKE ?)",
+        [kw, kw, kw, kw, kw, kw],
+        None,
+    )
+
+
+def _tag_filters(
+    tags: Optional[Iterable[str]],
+    tags_any: Optional[Iterable[str]],
+    tags_not: Optional[Iterable[str]],
+) -> Tuple[str, List[Any]]:
+    """基于 movie_tags 的标签过滤：tags 全部包含（AND），tags_any 任一（OR），tags_not 排除（NOT）。"""
+    sub = "SELECT mt.movie_id FROM movie_tags mt JOIN tags t ON t.id = mt.tag_id WHERE t.name"
+    sql = ""
+    params: List[Any] = []
+    for t in [x.strip() for x in (tags or []) if x and x.strip()]:
+        sql += f" AND m.id IN ({sub} = ?)"
+        params.append(t)
+    any_list = [x.strip() for x in (tags_any or []) if x and x.strip()]
+    if any_list:
+        sql += f" AND m.id IN ({sub} IN ({','.join('?' * len(any_list))}))"
+        params.extend(any_list)
+    not_list = [x.strip() for x in (tags_not or []) if x and x.strip()]
+    if not_list:
+        sql += f" AND m.id NOT IN ({sub} IN ({','.join('?' * len(not_list))}))"
+        params.extend(not_list)
+    return sql, params
+
+
+@dataclass
+class MovieQuery:
+    """search/count 共用的 FROM + WHERE 片段与参数。"""
+    frm: str
+    where: str
+    params: List[Any]
+    fts_q: Optional[str] = None
+
+
+def build_movie_query(
     conn: sqlite3.Connection,
     title: Optional[str] = None,
     kind: Optional[str] = None,
@@ -334,72 +636,262 @@ def search_movies(
     director: Optional[str] = None,
     actors_substr: Optional[str] = None,
     rating_source: Optional[str] = None,
-    limit: int = 50,
     keyword: Optional[str] = None,
-    offset: int = 0,
-    order_by: Optional[str] = None,
-    order_dir: str = "desc",
-) -> List[sqlite3.Row]:
-    sql = "SELECT id, title, kind, year, country, director, actors, rating_source, rating_value, tags_text, detail_url FROM movies WHERE 1=1"
+    director_name: Optional[str] = None,
+    actor_name: Optional[str] = None,
+    tags_any: Optional[Iterable[str]] = None,
+    tags_not: Optional[Iterable[str]] = None,
+    complete_only: bool = False,
+    min_episode: Optional[int] = None,
+    join_fts: bool = False,
+) -> MovieQuery:
+    """按过滤条件构造查询片段；join_fts 时关键字命中全文索引则连接 FTS 表（用于排序与高亮）。"""
+    frm = "movies m"
+    where = " WHERE 1=1"
     params: List[Any] = []
+    fts_q: Optional[str] = None
+    if keyword:
+        clause, kw_params, q = _keyword_filter(conn, keyword)
+        if q and join_fts:
+            fts_q = q
+            frm += f" JOIN {FTS_TABLE} ON {FTS_TABLE}.rowid = m.id"
+            where += f" AND {FTS_TABLE} MATCH ?"
+            params.append(q)
+        else:
+            where += clause
+            params.extend(kw_params)
     if title:
-        sql += " AND title LIKE ?"
+        where += " AND m.title LIKE ?"
         params.append(f"%{title}%")
-    if keyword:
-        sql += " AND (title LIKE ? OR original_title LIKE ? OR alt_titles_text LIKE ? OR description LIKE ? OR actors LIKE ? OR country LIKE ?)"
-        kw = f"%{keyword}%"
-        params.extend([kw, kw, kw, kw, kw, kw])
     if kind:
         if kind == "movie":
-            sql += " AND kind LIKE ?"
-            params.append("movie%")
+            # movie 及其细分 movie_cn/movie_en 等；用范围代替 LIKE 以便走 kind 索引
+            where += " AND m.kind >= ? AND m.kind < ?"
+            params.extend(["movie", "movif"])
         else:
-            sql += " AND kind = ?"
+            where += " AND m.kind = ?"
             params.append(kind)
     if country:
-        sql += " AND country LIKE ?"
-        params.append(f"%{country}%")
+        # 与国别分面同一拆分规则按整个国家/地区匹配（"美国/英国" 可被 美国 或 英国 命中）；
+        # 多个国家时需同时包含。LIKE 先粗筛，只对候选行拆分
+        for c in country_tokens(country):
+            where += f" AND m.country LIKE ? AND EXISTS (SELECT 1 FROM ({country_tokens_sql('m.country')}) WHERE v = ?)"
+            params.extend([f"%{c}%", c])
     if language:
-        sql += " AND language LIKE ?"
+        where += " AND m.language LIKE ?"
         params.append(f"%{language}%")
+    # 导演/演员的部分名字：在拆分后的人员表上匹配，不扫描 movies 的自由文本
     if director:
-        sql += " AND director LIKE ?"
-        params.append(f"%{director}%")
+        where += people_like_filter(ROLE_DIRECTOR)
+        params.extend([f"%{director.strip()}%"] * 2)
     if actors_substr:
-        sql += " AND actors LIKE ?"
-        params.append(f"%{actors_substr}%")
+        where += people_like_filter(ROLE_ACTOR)
+        params.extend([f"%{actors_substr.strip()}%"] * 2)
+    if director_name:
+        where += people_filter(ROLE_DIRECTOR)
+        params.extend([director_name, director_name])
+    if actor_name:
+        where += people_filter(ROLE_ACTOR)
+        params.extend([actor_name, actor_name])
     if rating_source:
-        sql += " AND rating_source = ?"
+        where += " AND m.rating_source = ?"
         params.append(rating_source)
     if rating_min is not None:
-        sql += " AND rating_value >= ?"
+        where += " AND m.rating_value >= ?"
         params.append(rating_min)
     if year_from is not None:
-        sql += " AND year >= ?"
+        where += " AND m.year >= ?"
         params.append(year_from)
     if year_to is not None:
-        sql += " AND year <= ?"
+        where += " AND m.year <= ?"
         params.append(year_to)
-    if tags:
-        for t in tags:
-            sql += " AND (tags_text LIKE ?)"
-            params.append(f"%{t}%")
-    # 排序与分页
-    allowed_order = {
-        "updated_at": "updated_at",
-        "created_at": "created_at",
-        "year": "year",
-        "rating": "rating_value",
-        "title": "title",
-        "id": "id",
-    }
-    ob = allowed_order.get((order_by or "updated_at").lower(), "updated_at")
-    dir_sql = "ASC" if (order_dir or "").lower() == "asc" else "DESC"
-    sql += f" ORDER BY {ob} {dir_sql} LIMIT ? OFFSET ?"
-    params.extend([int(limit), int(offset)])
+    if tags or tags_any or tags_not:
+        tag_sql, tag_params = _tag_filters(tags, tags_any, tags_not)
+        where += tag_sql
+        params.extend(tag_params)
+    if complete_only or min_episode is not None:
+        ep_sql, ep_params = episode_filter(complete_only, min_episode)
+        where += ep_sql
+        params.extend(ep_params)
+    return MovieQuery(frm, where, params, fts_q)
+
+
+SEARCH_COLUMNS = (
+    "m.id, m.title, m.kind, m.year, m.country, m.director, m.actors, m.rating_source, m.rating_value,"
+    " m.tags_text, m.detail_url, m.updated_at, m.created_at"
+)
+
+# 排序键 -> (SQL 列, 结果行中的列名)
+_ALLOWED_ORDER = {
+    "updated_at": ("m.updated_at", "updated_at"),
+    "created_at": ("m.created_at", "created_at"),
+    "year": ("m.year", "year"),
+    "rating": ("m.rating_value", "rating_value"),
+    "title": ("m.title", "title"),
+    "id": ("m.id", "id"),
+}
+
+
+def _order_key(order_by: Optional[str], q: MovieQuery) -> str:
+    key = (order_by or "updated_at").lower()
+    if key == "relevance":
+        return key if q.fts_q else "updated_at"
+    return key if key in _ALLOWED_ORDER else "updated_at"
+
+
+def _order_dir(order_dir: Optional[str]) -> str:
+    return "ASC" if (order_dir or "").lower() == "asc" else "DESC"
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        if not isinstance(payload, dict) or "o" not in payload:
+            raise ValueError
+        return payload
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def _keyset_segments(col: str, dir_sql: str, value: Any, last_id: int) -> List[Tuple[str, List[Any]]]:
+    """(排序列, id) 的 keyset 条件，按结果顺序拆成若干段，每段都能在排序列索引上直接定位。
+
+    SQLite 中 NULL 最小：DESC 时排在最后，ASC 时排在最前；把“或 IS NULL”拆成单独一段，
+    避免 OR 条件让查询退化为从头扫描索引。
+    """
+    if dir_sql == "DESC":
+        if value is None:
+            return [(f" AND {col} IS NULL AND m.id < ?", [last_id])]
+        return [(f" AND ({col}, m.id) < (?, ?)", [value, last_id]), (f" AND {col} IS NULL", [])]
+    if value is None:
+        return [(f" AND {col} IS NULL AND m.id > ?", [last_id]), (f" AND {col} IS NOT NULL", [])]
+    return [(f" AND ({col}, m.id) > (?, ?)", [value, last_id])]
+
+
+def _page_queries(
+    q: MovieQuery,
+    order_by: Optional[str],
+    order_dir: str,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> List[Tuple[str, List[Any]]]:
+    """拼接一页查询；给出 cursor 时按 keyset 定位（忽略 offset），代价与第一页相同。
+
+    返回按顺序执行的 (SQL, 参数) 列表，末尾两个参数为 LIMIT/OFFSET，由 _fetch_page 依次取满一页。
+    """
+    key = _order_key(order_by, q)
+    dir_sql = _order_dir(order_dir)
+    cols = SEARCH_COLUMNS
+    if q.fts_q:
+        cols += f", {snippet_expr()} AS snippet, {bm25_expr()} AS score"
+    if key == "relevance":
+        # bm25 越小越相关
+        order_sql = " ORDER BY score ASC, m.id DESC"
+    else:
+        order_sql = f" ORDER BY {_ALLOWED_ORDER[key][0]} {dir_sql}, m.id {dir_sql}"
+    segments: List[Tuple[str, List[Any]]] = [("", [])]
+    if cursor:
+        c = decode_cursor(cursor)
+        if c.get("o") != key or (key != "relevance" and c.get("d") != dir_sql):
+            raise ValueError("分页游标与当前排序不一致")
+        if key == "relevance":
+            # bm25 不能出现在 WHERE 中，相关度排序的游标退化为偏移量
+            offset = int(c.get("off") or 0)
+        else:
+            segments = _keyset_segments(_ALLOWED_ORDER[key][0], dir_sql, c.get("v"), int(c["id"]))
+            offset = 0
+    out = []
+    for clause, extra in segments:
+        sql = f"SELECT {cols} FROM {q.frm}{q.where}{clause}{order_sql} LIMIT ? OFFSET ?"
+        out.append((sql, list(q.params) + extra + [int(limit), int(offset)]))
+    return out
+
+
+def _fetch_page(conn: sqlite3.Connection, queries: List[Tuple[str, List[Any]]]) -> List[sqlite3.Row]:
     cur = conn.cursor()
-    cur.execute(sql, params)
-    return cur.fetchall()
+    rows: List[sqlite3.Row] = []
+    for sql, params in queries:
+        limit = int(params[-2])
+        if len(rows) >= limit:
+            break
+        cur.execute(sql, params[:-2] + [limit - len(rows), params[-1]])
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def next_cursor(
+    rows: List[sqlite3.Row],
+    limit: int,
+    order_by: Optional[str] = None,
+    order_dir: str = "desc",
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Optional[str]:
+    """根据本页最后一行生成下一页游标；本页不满 limit 时返回 None。"""
+    if not rows or len(rows) < int(limit):
+        return None
+    last = rows[-1]
+    if "score" in last.keys() and (order_by or "").lower() == "relevance":
+        base = int(decode_cursor(cursor).get("off") or 0) if cursor else int(offset)
+        return encode_cursor({"o": "relevance", "off": base + len(rows)})
+    key = (order_by or "updated_at").lower()
+    if key not in _ALLOWED_ORDER:
+        key = "updated_at"
+    return encode_cursor({"o": key, "d": _order_dir(order_dir), "v": last[_ALLOWED_ORDER[key][1]], "id": last["id"]})
+
+
+def get_movies_by_ids(conn: sqlite3.Connection, ids: List[int]) -> List[sqlite3.Row]:
+    """按给定 id 顺序取检索结果列（供进程内索引先算出 id 再回表）。"""
+    if not ids:
+        return []
+    cur = conn.cursor()
+    cur.execute(f"SELECT {SEARCH_COLUMNS} FROM movies m WHERE m.id IN ({','.join('?' * len(ids))})", list(ids))
+    by_id = {r["id"]: r for r in cur.fetchall()}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def search_movies(
+    conn: sqlite3.Connection,
+    title: Optional[str] = None,
+    kind: Optional[str] = None,
+    country: Optional[str] = None,
+    tags: Optional[Iterable[str]] = None,
+    rating_min: Optional[float] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    language: Optional[str] = None,
+    director: Optional[str] = None,
+    actors_substr: Optional[str] = None,
+    rating_source: Optional[str] = None,
+    director_name: Optional[str] = None,
+    actor_name: Optional[str] = None,
+    tags_any: Optional[Iterable[str]] = None,
+    tags_not: Optional[Iterable[str]] = None,
+    complete_only: bool = False,
+    min_episode: Optional[int] = None,
+    limit: int = 50,
+    keyword: Optional[str] = None,
+    offset: int = 0,
+    order_by: Optional[str] = None,
+    order_dir: str = "desc",
+    cursor: Optional[str] = None,
+) -> List[sqlite3.Row]:
+    q = build_movie_query(
+        conn, title=title, kind=kind, country=country, tags=tags, rating_min=rating_min,
+        year_from=year_from, year_to=year_to, language=language, director=director,
+        actors_substr=actors_substr, rating_source=rating_source, keyword=keyword,
+        director_name=director_name, actor_name=actor_name, tags_any=tags_any, tags_not=tags_not,
+        complete_only=complete_only, min_episode=min_episode, join_fts=True,
+    )
+    return _fetch_page(conn, _page_queries(q, order_by, order_dir, limit, offset, cursor))
+
 
 def count_movies(
     conn: sqlite3.Connection,
@@ -415,52 +907,45 @@ def count_movies(
     actors_substr: Optional[str] = None,
     rating_source: Optional[str] = None,
     keyword: Optional[str] = None,
+    director_name: Optional[str] = None,
+    actor_name: Optional[str] = None,
+    tags_any: Optional[Iterable[str]] = None,
+    tags_not: Optional[Iterable[str]] = None,
+    complete_only: bool = False,
+    min_episode: Optional[int] = None,
 ) -> int:
-    sql = "SELECT COUNT(*) FROM movies WHERE 1=1"
-    params: List[Any] = []
-    if title:
-        sql += " AND title LIKE ?"
-        params.append(f"%{title}%")
-    if keyword:
-        sql += " AND (title LIKE ? OR original_title LIKE ? OR alt_titles_text LIKE ? OR description LIKE ? OR actors LIKE ? OR country LIKE ?)"
-        kw = f"%{keyword}%"
-        params.extend([kw, kw, kw, kw, kw, kw])
-    if kind:
-        if kind == "movie":
-            sql += " AND kind LIKE ?"
-            params.append("movie%")
-        else:
-            sql += " AND kind = ?"
-            params.append(kind)
-    if country:
-        sql += " AND country LIKE ?"
-        params.append(f"%{country}%")
-    if language:
-        sql += " AND language LIKE ?"
-        params.append(f"%{language}%")
-    if director:
-        sql += " AND director LIKE ?"
-        params.append(f"%{director}%")
-    if actors_substr:
-        sql += " AND actors LIKE ?"
-        params.append(f"%{actors_substr}%")
-    if rating_source:
-        sql += " AND rating_source = ?"
-        params.append(rating_source)
-    if rating_min is not None:
-        sql += " AND rating_value >= ?"
-        params.append(rating_min)
-    if year_from is not None:
-        sql += " AND year >= ?"
-        params.append(year_from)
-    if year_to is not None:
-        sql += " AND year <= ?"
-        params.append(year_to)
-    if tags:
-        for t in tags:
-            sql += " AND (tags_text LIKE ?)"
-            params.append(f"%{t}%")
+    q = build_movie_query(
+        conn, title=title, kind=kind, country=country, tags=tags, rating_min=rating_min,
+        year_from=year_from, year_to=year_to, language=language, director=director,
+        actors_substr=actors_substr, rating_source=rating_source, keyword=keyword,
+        director_name=director_name, actor_name=actor_name, tags_any=tags_any, tags_not=tags_not,
+        complete_only=complete_only, min_episode=min_episode,
+    )
     cur = conn.cursor()
-    cur.execute(sql, params)
+    cur.execute(f"SELECT COUNT(*) FROM {q.frm}{q.where}", q.params)
     row = cur.fetchone()
-    return int(row[0] or 0)
\ No newline at end of file
+    return int(row[0] or 0)
+
+
+def search_movies_with_total(
+    conn: sqlite3.Connection,
+    limit: int = 50,
+    offset: int = 0,
+    order_by: Optional[str] = None,
+    order_dir: str = "desc",
+    cursor: Optional[str] = None,
+    **filters: Any,
+) -> Tuple[List[sqlite3.Row], int]:
+    """返回 (本页结果, 总数)；filters 与 search_movies 的过滤参数相同。
+
+    本页走排序列索引上的 LIMIT（可提前结束扫描），总数单独 COUNT；
+    第一页不满一页时总数即本页行数，省去 COUNT。翻页时总数由调用方按过滤条件缓存
+    （cache.cached_search_with_total）。不用 COUNT(*) OVER ()：窗口函数要先遍历全部命中行，
+    LIMIT 无法提前结束，大库上比“分页 + 单独计数”慢得多。
+    """
+    rows = search_movies(
+        conn, limit=limit, offset=offset, order_by=order_by, order_dir=order_dir, cursor=cursor, **filters
+    )
+    if not cursor and int(offset) <= 0 and len(rows) < int(limit):
+        return rows, len(rows)
+    return rows, count_movies(conn, **filters)
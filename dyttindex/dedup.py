@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import random
+import re
+import sqlite3
+import unicodedata
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖：未安装时用纯 Python 计算签名
+    np = None
+
+from .db import _ensure_tags, delete_movies, split_tags
+from .people import split_people, sync_movie_people
+from .text import BOOK_RE, PUNCT_RE
+
+# 近似重复检测：同一影片常以不同 detail_url 多次发布（高清重发、镜像、改名）。
+# 标题/原名/又名规范化后按字符二元组做 MinHash，LSH 分段入桶；桶键包含年份或导演分块，
+# 只在同年份或同导演的记录间比较，整体近线性。候选对以 MinHash 估计的 Jaccard 相似度确认，
+# 并查集聚成簇（按整簇已知的年份/导演检查，冲突的两簇不合并）；合并时保留下载链接最多的条目，合并其余条目的下载链接、标签、别名与缺失字段。
+
+MINHASH_PERM = 32
+LSH_BANDS = 8
+LSH_ROWS = MINHASH_PERM // LSH_BANDS
+DEFAULT_THRESHOLD = 0.8
+# 过大的桶（如极短的通用标题）只与桶内前若干条比较，避免退化为平方
+_MAX_BUCKET = 200
+_MAX_NAMES = 6
+
+_MASK64 = (1 << 64) - 1
+_rng = random.Random(20240601)
+_PERM_A = [_rng.getrandbits(64) | 1 for _ in range(MINHASH_PERM)]
+_PERM_B = [_rng.getrandbits(64) for _ in range(MINHASH_PERM)]
+
+_BRACKETS_RE = re.compile(r"[\[【(（{［].*?[\]】)）}］]")
+# 发布/画质/字幕等修饰词，不影响是否为同一影片
+_NOISE_RE = re.compile(
+    r"(?:19|20)\d{2}年|\b(?:19|20)\d{2}\b|"
+    r"\b(?:hd|bd|dvd|web-?dl|webrip|bluray|blu-ray|hdtv|hdr|hevc|x26[45]|h26[45]|"
+    r"1080p|720p|2160p|4k|uhd|mkv|mp4|rmvb)\b|"
+    r"高清|超清|蓝光|国语|粤语|国粤|中字|中英双字|双字|双语|国英双语|英语|日语|韩语|中文字幕|字幕|"
+    r"完整版|未删减|导演剪辑版|加长版|修复版|重制版|无水印|抢先版|枪版|"
+    r"免费下载|在线观看|下载|更新至?第?\d+集|全\d+集|迅雷|网盘"
+)
+
+
+def normalize_title(text: Optional[str]) -> str:
+    """标题规范化：NFKC（全角转半角）、小写，取书名号内名称，去掉括号注释、年份、画质与字幕等修饰词及标点。"""
+    s = unicodedata.normalize("NFKC", text or "").lower()
+    m = BOOK_RE.search(s)
+    if m:
+        s = m.group(1)
+    s = _BRACKETS_RE.sub(" ", s)
+    s = _NOISE_RE.sub(" ", s)
+    return PUNCT_RE.sub("", s)
+
+
+def title_variants(title: Optional[str], original_title: Optional[str], alt_titles_text: Optional[str]) -> List[str]:
+    """标题、原名与又名规范化后的去重列表（保持顺序，最多 _MAX_NAMES 个）。"""
+    out: List[str] = []
+    for raw in [title, original_title] + split_tags(alt_titles_text):
+        n = normalize_title(raw)
+        if len(n) >= 2 and n not in out:
+            out.append(n)
+    return out[:_MAX_NAMES]
+
+
+def _shingles(name: str) -> List[int]:
+    grams = {name[i:i + 2] for i in range(len(name) - 1)} or {name}
+    return [zlib.crc32(g.encode("utf-8")) for g in grams]
+
+
+def minhash(name: str) -> Tuple[int, ...]:
+    """字符二元组集合的 MinHash 签名（乘移位哈希族，MINHASH_PERM 个分量）。"""
+    xs = _shingles(name)
+    if np is not None:
+        x = np.array(xs, dtype=np.uint64)
+        a = np.array(_PERM_A, dtype=np.uint64)[:, None]
+        b = np.array(_PERM_B, dtype=np.uint64)[:, None]
+        with np.errstate(over="ignore"):
+            h = (a * x + b) >> np.uint64(32)
+        return tuple(int(v) for v in h.min(axis=1))
+    return tuple(min(((a * v + b) & _MASK64) >> 32 for v in xs) for a, b in zip(_PERM_A, _PERM_B))
+
+
+def signature_similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / float(len(a))
+
+
+def _director_key(director: Optional[str]) -> Optional[str]:
+    people = split_people(director)
+    return normalize_title(people[0][0]) or None if people else None
+
+
+def _block_keys(year: Optional[int], director_key: Optional[str]) -> List[str]:
+    keys = []
+    if year:
+        keys.append(f"y{int(year)}")
+    if director_key:
+        keys.append("d" + director_key)
+    return keys
+
+
+ClusterKey = Tuple[Optional[int], Optional[str]]  # 簇内已知的 (年份, 导演)
+
+
+def _compatible(a: ClusterKey, b: ClusterKey) -> bool:
+    """年份或导演两边都有且不同，视为不同影片（同名翻拍、同年同名）。"""
+    if a[0] and b[0] and a[0] != b[0]:
+        return False
+    return not (a[1] and b[1] and a[1] != b[1])
+
+
+@dataclass
+class DedupRecord:
+    id: int
+    title: str
+    year: Optional[int]
+    director_key: Optional[str]
+    links: int
+    filled: int
+    names: List[str]
+    sigs: List[Tuple[int, ...]] = field(default_factory=list)
+
+
+@dataclass
+class DedupCluster:
+    canonical: int
+    members: List[int]
+    similarity: float
+
+
+class _UnionFind:
+    """并查集；每个根记下全簇已知的年份与导演，合并前按整簇检查，
+    避免经由缺年份/导演的记录把互相冲突的两条连到同一簇。"""
+
+    def __init__(self, records: Dict[int, "DedupRecord"]) -> None:
+        self.parent: Dict[int, int] = {}
+        self.keys: Dict[int, ClusterKey] = {}
+        self._records = records
+
+    def find(self, x: int) -> int:
+        p = self.parent.setdefault(x, x)
+        while p != self.parent[p]:
+            self.parent[p] = self.parent[self.parent[p]]
+            p = self.parent[p]
+        self.parent[x] = p
+        return p
+
+    def _key(self, root: int) -> ClusterKey:
+        key = self.keys.get(root)
+        if key is None:
+            rec = self._records[root]
+            key = (int(rec.year) if rec.year else None, rec.director_key)
+        return key
+
+    def compatible(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        return ra == rb or _compatible(self._key(ra), self._key(rb))
+
+    def union(self, a: int, b: int) -> bool:
+        """合并两条所在的簇；两簇年份或导演冲突时不合并并返回 False。"""
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return True
+        ka, kb = self._key(ra), self._key(rb)
+        if not _compatible(ka, kb):
+            return False
+        root = min(ra, rb)
+        self.parent[max(ra, rb)] = root
+        self.keys[root] = (ka[0] or kb[0], ka[1] or kb[1])
+        return True
+
+
+_LOAD_SQL = """
+    SELECT m.id, m.title, m.original_title, m.alt_titles_text, m.year, m.director,
+           (SELECT COUNT(*) FROM download_links d WHERE d.movie_id = m.id) AS links,
+           (m.rating_value IS NOT NULL) + (m.description IS NOT NULL) + (m.actors IS NOT NULL)
+           + (m.country IS NOT NULL) + (m.cover_url IS NOT NULL) AS filled
+    FROM movies m
+"""
+
+
+def load_records(conn: sqlite3.Connection, kind: Optional[str] = None) -> Iterable[DedupRecord]:
+    sql, params = _LOAD_SQL, []
+    if kind:
+        sql += " WHERE m.kind = ?"
+        params.append(kind)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(2000)
+        if not rows:
+            break
+        for r in rows:
+            names = title_variants(r[1], r[2], r[3])
+            if names:
+                yield DedupRecord(int(r[0]), r[1] or "", r[4], _director_key(r[5]), int(r[6] or 0), int(r[7] or 0), names)
+
+
+def find_clusters(
+    conn: sqlite3.Connection,
+    threshold: float = DEFAULT_THRESHOLD,
+    kind: Optional[str] = None,
+) -> List[DedupCluster]:
+    """返回重复簇（成员 >= 2），按簇大小倒序；canonical 为下载链接最多、字段最全、id 最小者。"""
+    records: Dict[int, DedupRecord] = {}
+    buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[int]] = defaultdict(list)
+    exact: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for rec in load_records(conn, kind):
+        records[rec.id] = rec
+        # 既无年份也无导演的记录归入同一公共分块
+        blocks = _block_keys(rec.year, rec.director_key) or ["_"]
+        for name in rec.names:
+            sig = minhash(name)
+            rec.sigs.append(sig)
+            for blk in blocks:
+                exact[(blk, name)].append(rec.id)
+                for band in range(LSH_BANDS):
+                    buckets[(blk, band, sig[band * LSH_ROWS:(band + 1) * LSH_ROWS])].append(rec.id)
+
+    uf = _UnionFind(records)
+    best: Dict[Tuple[int, int], float] = {}
+    # 同一分块内规范化名称完全相同：直接视为重复
+    for ids in exact.values():
+        uniq = sorted(set(ids))[:_MAX_BUCKET]
+        for i, a in enumerate(uniq):
+            for b in uniq[i + 1:]:
+                if (a, b) not in best and uf.union(a, b):
+                    best[(a, b)] = 1.0
+    # LSH 候选对：以签名估计的最大名称相似度确认
+    seen: Set[Tuple[int, int]] = set()
+    for ids in buckets.values():
+        uniq = sorted(set(ids))[:_MAX_BUCKET]
+        for i, a in enumerate(uniq):
+            for b in uniq[i + 1:]:
+                if (a, b) in seen or (a, b) in best:
+                    continue
+                seen.add((a, b))
+                if not uf.compatible(a, b):
+                    continue
+                sim = max(
+                    signature_similarity(sa, sb) for sa in records[a].sigs for sb in records[b].sigs
+                )
+                if sim >= threshold and uf.union(a, b):
+                    best[(a, b)] = sim
+
+    members: Dict[int, Set[int]] = defaultdict(set)
+    sims: Dict[int, List[float]] = defaultdict(list)
+    for (a, b), sim in best.items():
+        root = uf.find(a)
+        members[root].update((a, b))
+        sims[root].append(sim)
+    clusters: List[DedupCluster] = []
+    for root, ids in members.items():
+        ordered = sorted(ids)
+        canonical = max(ordered, key=lambda m: (records[m].links, records[m].filled, -m))
+        clusters.append(DedupCluster(canonical, ordered, round(min(sims[root]), 3)))
+    clusters.sort(key=lambda c: (-len(c.members), c.canonical))
+    return clusters
+
+
+# 合并时从重复条目补全 canonical 的空字段
+_FILL_FIELDS = [
+    "original_title", "year", "country", "language", "director", "actors",
+    "rating_source", "rating_value", "rating_votes", "description", "cover_url",
+]
+
+
+def merge_cluster(conn: sqlite3.Connection, cluster: DedupCluster) -> int:
+    """把簇内其他条目并入 canonical：合并下载链接（按 url 与资源标识去重）、标签、别名并补全空字段，
+    然后删除其他条目，其 detail_url 记入 movie_aliases。返回删除的条目数。
+
+    canonical 的 content_hash 保持不变，原页面未变化时重抓不会覆盖合并结果；
+    页面内容变化时按差异同步，只存在于被合并条目的下载链接会被移除。
+    """
+    target = cluster.canonical
+    others = [m for m in cluster.members if m != target]
+    if not others:
+        return 0
+    cur = conn.cursor()
+    marks = ",".join("?" * len(others))
+    cur.execute("SELECT url, btih, ed2k_hash FROM download_links WHERE movie_id=?", (target,))
+    have = set()
+    for url, btih, ed2k in cur.fetchall():
+        have.add(url)
+        have.update(k for k in (btih and "btih:" + btih, ed2k and "ed2k:" + ed2k) if k)
+    cur.execute(
+        f"SELECT url, kind, label, episode, btih, ed2k_hash, size FROM download_links"
+        f" WHERE movie_id IN ({marks}) ORDER BY id",
+        others,
+    )
+    moved = []
+    for url, kind, label, episode, btih, ed2k, size in cur.fetchall():
+        key = ("btih:" + btih) if btih else ("ed2k:" + ed2k) if ed2k else None
+        if url in have or (key and key in have):
+            continue
+        have.add(url)
+        if key:
+            have.add(key)
+        moved.append((target, url, kind, label, episode, btih, ed2k, size))
+    cur.executemany(
+        "INSERT OR IGNORE INTO download_links(movie_id, url, kind, label, episode, btih, ed2k_hash, size)"
+        " VALUES (?,?,?,?,?,?,?,?)",
+        moved,
+    )
+    names = ["id", "title", "alt_titles_text", "tags_text"] + _FILL_FIELDS
+    cur.execute(
+        f"SELECT {', '.join(names)} FROM movies WHERE id IN ({','.join('?' * len(cluster.members))})",
+        cluster.members,
+    )
+    rows = {r[0]: dict(zip(names, r)) for r in cur.fetchall()}
+    keep = rows[target]
+    tags: List[str] = split_tags(keep["tags_text"])
+    alts: List[str] = split_tags(keep["alt_titles_text"])
+    updates: Dict[str, object] = {}
+    for mid in others:
+        r = rows.get(mid)
+        if r is None:
+            continue
+        for t in split_tags(r["tags_text"]):
+            if t not in tags:
+                tags.append(t)
+        for a in [r["title"]] + split_tags(r["alt_titles_text"]):
+            if a and a != keep["title"] and a not in alts:
+                alts.append(a)
+        for f in _FILL_FIELDS:
+            if keep[f] is None and f not in updates and r[f] is not None:
+                updates[f] = r[f]
+    updates["tags_text"] = ",".join(tags) if tags else None
+    updates["alt_titles_text"] = ",".join(alts) if alts else None
+    cur.execute(
+        f"UPDATE movies SET {', '.join(f'{k}=?' for k in updates)} WHERE id=?",
+        list(updates.values()) + [target],
+    )
+    tag_ids = _ensure_tags(conn, tags)
+    cur.executemany("INSERT OR IGNORE INTO movie_tags(movie_id, tag_id) VALUES(?,?)", [(target, t) for t in tag_ids])
+    if "director" in updates or "actors" in updates:
+        sync_movie_people(
+            cur, target, updates.get("director", keep["director"]), updates.get("actors", keep["actors"])
+        )
+    # 记下被合并条目的 detail_url（连同它们此前并入的），重抓/导入时不再作为新条目写回
+    cur.execute(f"UPDATE movie_aliases SET movie_id=? WHERE movie_id IN ({marks})", [target] + others)
+    cur.execute(
+        f"INSERT OR REPLACE INTO movie_aliases(detail_url, movie_id) SELECT detail_url, ? FROM movies WHERE id IN ({marks})",
+        [target] + others,
+    )
+    # delete_movies 在同一事务内删除其余条目、递增写入代数并提交
+    return delete_movies(conn, others)
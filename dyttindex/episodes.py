@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+# 剧集覆盖：download_links 上的触发器维护两张表，剧集相关查询不再扫描并重组链接。
+#   movie_episodes(movie_id, episode_count, max_episode, missing_count, missing_ranges)
+#       每部影片的已有集数（去重）、最大集数、1..最大集数之间缺失的集数与缺失区间（如 "3-5,9"）
+#   episode_links(movie_id, episode, link_id)
+#       每一集的最佳链接：按链接类型（magnet > ed2k > torrent > thunder > ftp > 其他）、
+#       文件大小（大者优先）、id 排序取第一条
+# 每次链接变化只在该影片（按 movie_id 索引）的链接上重算，长篇剧集的几百条链接也只涉及这一部。
+# missing_count = 0 即从第 1 集到最大集数没有缺口（complete_only 过滤）。
+
+EPISODES_TABLE = "movie_episodes"
+EPISODE_LINKS_TABLE = "episode_links"
+LINK_KIND_RANK = ["magnet", "ed2k", "torrent", "thunder", "ftp"]
+
+_TRIGGERS = ["episodes_links_ai", "episodes_links_ad", "episodes_links_au"]
+
+
+def link_rank_expr(col: str = "kind") -> str:
+    whens = " ".join(f"WHEN '{k}' THEN {i}" for i, k in enumerate(LINK_KIND_RANK))
+    return f"(CASE {col} {whens} ELSE {len(LINK_KIND_RANK)} END)"
+
+
+def _summary_sql(movie: str) -> str:
+    """重算一部影片的剧集汇总；movie 为 SQL 表达式（new.movie_id 等）。"""
+    eps = f"SELECT DISTINCT episode AS ep FROM download_links WHERE movie_id = {movie} AND episode > 0"
+    ranges = (
+        "SELECT group_concat(CASE WHEN lo = hi THEN lo ELSE lo || '-' || hi END, ',') FROM ("
+        f" SELECT prev + 1 AS lo, ep - 1 AS hi FROM ("
+        f"  SELECT ep, LAG(ep, 1, 0) OVER (ORDER BY ep) AS prev FROM ({eps})"
+        " ) WHERE ep - prev > 1 ORDER BY lo)"
+    )
+    return (
+        f"DELETE FROM {EPISODES_TABLE} WHERE movie_id = {movie};\n"
+        f"INSERT INTO {EPISODES_TABLE}(movie_id, episode_count, max_episode, missing_count, missing_ranges)"
+        f" SELECT {movie}, COUNT(*), MAX(ep), MAX(ep) - COUNT(*), ({ranges}) FROM ({eps}) HAVING COUNT(*) > 0;"
+    )
+
+
+def _best_sql(movie: str, episode: str) -> str:
+    """重算一集的最佳链接。"""
+    return (
+        f"DELETE FROM {EPISODE_LINKS_TABLE} WHERE movie_id = {movie} AND episode = {episode};\n"
+        f"INSERT INTO {EPISODE_LINKS_TABLE}(movie_id, episode, link_id)"
+        f" SELECT movie_id, episode, id FROM download_links WHERE movie_id = {movie} AND episode = {episode}"
+        f" AND episode > 0 ORDER BY {link_rank_expr()}, size IS NULL, size DESC, id LIMIT 1;"
+    )
+
+
+def create_episode_triggers(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS episodes_links_ai AFTER INSERT ON download_links
+        WHEN new.episode > 0 BEGIN
+            {_summary_sql("new.movie_id")}
+            {_best_sql("new.movie_id", "new.episode")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS episodes_links_ad AFTER DELETE ON download_links
+        WHEN old.episode > 0 BEGIN
+            {_summary_sql("old.movie_id")}
+            {_best_sql("old.movie_id", "old.episode")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS episodes_links_au AFTER UPDATE OF movie_id, episode, kind, size ON download_links
+        WHEN old.episode > 0 OR new.episode > 0 BEGIN
+            {_summary_sql("old.movie_id")}
+            {_best_sql("old.movie_id", "old.episode")}
+            {_summary_sql("new.movie_id")}
+            {_best_sql("new.movie_id", "new.episode")}
+        END;
+        """
+    )
+
+
+def drop_episode_triggers(cur: sqlite3.Cursor) -> None:
+    for name in _TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_episodes(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS {EPISODES_TABLE} (
+            movie_id INTEGER PRIMARY KEY,
+            episode_count INTEGER NOT NULL,
+            max_episode INTEGER NOT NULL,
+            missing_count INTEGER NOT NULL,
+            missing_ranges TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_movie_episodes_max ON {EPISODES_TABLE}(max_episode);
+        CREATE INDEX IF NOT EXISTS idx_movie_episodes_missing ON {EPISODES_TABLE}(missing_count, max_episode);
+        CREATE TABLE IF NOT EXISTS {EPISODE_LINKS_TABLE} (
+            movie_id INTEGER NOT NULL,
+            episode INTEGER NOT NULL,
+            link_id INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, episode)
+        ) WITHOUT ROWID;
+        """
+    )
+    create_episode_triggers(cur)
+
+
+def rebuild_episodes(conn: sqlite3.Connection, commit: bool = True) -> None:
+    """按 download_links 全量重算两张剧集表。"""
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {EPISODES_TABLE}")
+    cur.execute(f"DELETE FROM {EPISODE_LINKS_TABLE}")
+    cur.execute(
+        f"""
+        INSERT INTO {EPISODES_TABLE}(movie_id, episode_count, max_episode, missing_count, missing_ranges)
+        SELECT movie_id, COUNT(*), MAX(ep), MAX(ep) - COUNT(*),
+               group_concat(CASE WHEN ep - prev <= 1 THEN NULL
+                                 WHEN ep - prev = 2 THEN prev + 1
+                                 ELSE (prev + 1) || '-' || (ep - 1) END, ',')
+        FROM (
+            SELECT movie_id, ep, LAG(ep, 1, 0) OVER (PARTITION BY movie_id ORDER BY ep) AS prev
+            FROM (SELECT DISTINCT movie_id, episode AS ep FROM download_links WHERE episode > 0)
+            ORDER BY movie_id, ep
+        )
+        GROUP BY movie_id
+        """
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {EPISODE_LINKS_TABLE}(movie_id, episode, link_id)
+        SELECT movie_id, episode, id FROM (
+            SELECT movie_id, episode, id, ROW_NUMBER() OVER (
+                PARTITION BY movie_id, episode ORDER BY {link_rank_expr()}, size IS NULL, size DESC, id
+            ) AS rn
+            FROM download_links WHERE episode > 0
+        ) WHERE rn = 1
+        """
+    )
+    if commit:
+        conn.commit()
+
+
+def episode_filter(complete_only: bool = False, min_episode: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """search_movies 的剧集过滤：complete_only 要求 1..最大集数无缺口，min_episode 要求已有集数达到 N。"""
+    conds: List[str] = []
+    params: List[Any] = []
+    if complete_only:
+        conds.append("missing_count = 0")
+    if min_episode is not None:
+        conds.append("max_episode >= ?")
+        params.append(int(min_episode))
+    if not conds:
+        return "", []
+    return f" AND m.id IN (SELECT movie_id FROM {EPISODES_TABLE} WHERE {' AND '.join(conds)})", params
+
+
+def get_episode_summary(conn: sqlite3.Connection, movie_id: int) -> Optional[Dict[str, Any]]:
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT episode_count, max_episode, missing_count, missing_ranges FROM {EPISODES_TABLE} WHERE movie_id=?",
+        (movie_id,),
+    )
+    r = cur.fetchone()
+    if r is None:
+        return None
+    return {
+        "episode_count": r[0],
+        "max_episode": r[1],
+        "missing_count": r[2],
+        "missing_ranges": r[3] or "",
+        "complete": r[2] == 0,
+    }
+
+
+def get_episodes(conn: sqlite3.Connection, movie_id: int) -> Dict[str, Any]:
+    """按集分组的下载链接：{summary, episodes: [{episode, best, links}], others: [无集数的链接]}。"""
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, kind, url, label, episode, size FROM download_links WHERE movie_id=? ORDER BY episode, id",
+        (movie_id,),
+    )
+    rows = cur.fetchall()
+    cur.execute(f"SELECT episode, link_id FROM {EPISODE_LINKS_TABLE} WHERE movie_id=?", (movie_id,))
+    best = dict(cur.fetchall())
+    groups: Dict[int, Dict[str, Any]] = {}
+    others: List[Dict[str, Any]] = []
+    for r in rows:
+        link = {k: r[k] for k in ("kind", "url", "label", "episode", "size")}
+        ep = r["episode"]
+        if not ep or ep <= 0:
+            others.append(link)
+            continue
+        g = groups.setdefault(ep, {"episode": ep, "best": None, "links": []})
+        g["links"].append(link)
+        if best.get(ep) == r["id"]:
+            g["best"] = link
+    return {
+        "summary": get_episode_summary(conn, movie_id),
+        "episodes": [groups[k] for k in sorted(groups)],
+        "others": others,
+    }
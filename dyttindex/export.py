@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+import sqlite3
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO
+
+from .db import build_movie_query
+
+# 流式导出：按 id 顺序 fetchmany 分批读取 movies，每批一次性查询标签与下载链接，
+# 内存占用只与批大小有关，与库大小无关。
+
+EXPORT_FORMATS = ("jsonl", "csv")
+RELATION_FIELDS = ("tags", "download_links")
+# 默认不导出的大字段/内部字段，可通过 fields 显式指定
+_DEFAULT_EXCLUDE = {"raw_html", "content_hash", "html_hash"}
+_LINK_COLUMNS = ("url", "kind", "label", "episode")
+
+
+def movie_columns(conn: sqlite3.Connection) -> List[str]:
+    cur = conn.cursor()
+    cur.execute("PRAGMA table_info(movies)")
+    return [r[1] for r in cur.fetchall()]
+
+
+def resolve_fields(conn: sqlite3.Connection, fields: Optional[Sequence[str]] = None) -> List[str]:
+    """校验并返回导出字段；未指定时为除 raw_html 与哈希外的全部字段，加上标签与下载链接。"""
+    cols = movie_columns(conn)
+    if not fields:
+        return [c for c in cols if c not in _DEFAULT_EXCLUDE] + list(RELATION_FIELDS)
+    out: List[str] = []
+    for f in fields:
+        f = f.strip()
+        if not f:
+            continue
+        if f not in cols and f not in RELATION_FIELDS:
+            raise ValueError(f"未知导出字段: {f}")
+        if f not in out:
+            out.append(f)
+    return out
+
+
+def _load_tags(cur: sqlite3.Cursor, ids: List[int]) -> Dict[int, List[str]]:
+    marks = ",".join("?" * len(ids))
+    cur.execute(
+        f"SELECT mt.movie_id, t.name FROM movie_tags mt JOIN tags t ON t.id = mt.tag_id"
+        f" WHERE mt.movie_id IN ({marks}) ORDER BY mt.movie_id, t.name",
+        ids,
+    )
+    out: Dict[int, List[str]] = {}
+    for mid, name in cur.fetchall():
+        out.setdefault(mid, []).append(name)
+    return out
+
+
+def _load_links(cur: sqlite3.Cursor, ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    marks = ",".join("?" * len(ids))
+    cur.execute(
+        f"SELECT movie_id, {', '.join(_LINK_COLUMNS)} FROM download_links"
+        f" WHERE movie_id IN ({marks}) ORDER BY movie_id, id",
+        ids,
+    )
+    out: Dict[int, List[Dict[str, Any]]] = {}
+    for row in cur.fetchall():
+        out.setdefault(row[0], []).append(dict(zip(_LINK_COLUMNS, row[1:])))
+    return out
+
+
+def iter_movies(
+    conn: sqlite3.Connection,
+    fields: Optional[Sequence[str]] = None,
+    batch_size: int = 500,
+    **filters: Any,
+) -> Iterator[Dict[str, Any]]:
+    """按 id 升序逐条产出影片字典；filters 与 search_movies 的过滤参数相同。"""
+    fields = resolve_fields(conn, fields)
+    cols = [f for f in fields if f not in RELATION_FIELDS]
+    # 关联查询依赖 id，输出时再按字段列表裁剪
+    select_cols = ["id"] + [c for c in cols if c != "id"]
+    q = build_movie_query(conn, **{k: v for k, v in filters.items() if v not in (None, "", [])})
+    reader = conn.cursor()
+    reader.execute(
+        f"SELECT {', '.join('m.' + c for c in select_cols)} FROM {q.frm}{q.where} ORDER BY m.id",
+        q.params,
+    )
+    side = conn.cursor()
+    while True:
+        rows = reader.fetchmany(batch_size)
+        if not rows:
+            break
+        ids = [r[0] for r in rows]
+        tags = _load_tags(side, ids) if "tags" in fields else {}
+        links = _load_links(side, ids) if "download_links" in fields else {}
+        for r in rows:
+            rec = dict(zip(select_cols, tuple(r)))
+            mid = rec["id"]
+            out = {}
+            for f in fields:
+                if f == "tags":
+                    out[f] = tags.get(mid, [])
+                elif f == "download_links":
+                    out[f] = links.get(mid, [])
+                else:
+                    out[f] = rec[f]
+            yield out
+
+
+def open_output(path: str, compress: bool = False) -> TextIO:
+    """打开导出目标；path 为 '-' 时写到标准输出，compress 或 .gz 后缀时按 gzip 压缩。"""
+    compress = compress or path.endswith(".gz")
+    if path == "-":
+        if compress:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"), encoding="utf-8", newline="")
+        return sys.stdout
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def _csv_value(v: Any) -> Any:
+    if isinstance(v, list):
+        if v and isinstance(v[0], dict):
+            return json.dumps(v, ensure_ascii=False)
+        return ",".join(str(x) for x in v)
+    return v
+
+
+def write_movies(out: TextIO, movies: Iterator[Dict[str, Any]], fmt: str, fields: List[str]) -> int:
+    """将影片写为 JSONL 或 CSV（标签以逗号连接，下载链接为 JSON 字符串），返回条数。"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    n = 0
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        for m in movies:
+            writer.writerow([_csv_value(m.get(f)) for f in fields])
+            n += 1
+    else:
+        for m in movies:
+            out.write(json.dumps(m, ensure_ascii=False))
+            out.write("\n")
+            n += 1
+    return n
+
+
+def export_movies(
+    conn: sqlite3.Connection,
+    path: str,
+    fmt: Optional[str] = None,
+    compress: bool = False,
+    fields: Optional[Sequence[str]] = None,
+    batch_size: int = 500,
+    **filters: Any,
+) -> int:
+    """导出到文件（或 '-' 标准输出），格式未指定时按扩展名推断，返回导出条数。"""
+    if not fmt:
+        base = path[:-3] if path.endswith(".gz") else path
+        fmt = "csv" if base.endswith(".csv") else "jsonl"
+    fields = resolve_fields(conn, fields)
+    out = open_output(path, compress)
+    try:
+        return write_movies(out, iter_movies(conn, fields, batch_size=batch_size, **filters), fmt, fields)
+    finally:
+        if out is sys.stdout:
+            out.flush()
+        else:
+            out.close()
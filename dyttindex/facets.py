@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+from .db import build_movie_query
+from .text import country_tokens, country_tokens_sql
+
+# 分面计数：facet_counts(facet, value, n) 由 movies / movie_tags 上的触发器增量维护，
+# 无过滤条件时直接读表；有过滤条件时对命中行做一遍扫描在内存中计数，命中过多时按 id 抽样估算。
+# 国别按 text.country_tokens 拆成多个国家/地区分别计数，与检索的 country 过滤同一规则。
+
+FACET_TABLE = "facet_counts"
+FACET_KIND = "kind"
+FACET_COUNTRY = "country"
+FACET_YEAR = "year"
+FACET_RATING = "rating"
+FACET_TAG = "tag"
+FACETS = [FACET_KIND, FACET_COUNTRY, FACET_YEAR, FACET_RATING, FACET_TAG]
+
+# 带过滤条件时命中超过此数就按 id 等距抽样（m.id % k = 0），计数按 k 放大并标记 approx
+FACET_EXACT_LIMIT = 20000
+
+_TRIGGERS = [
+    "facet_movies_ai", "facet_movies_ad", "facet_movies_au",
+    "facet_tags_ai", "facet_tags_ad",
+]
+
+# 一遍扫描计数所需的列。标签与触发器同源取自 movie_tags（不拆分 tags_text），以 _TAG_SEP 连接
+_TAG_SEP = "\x01"
+_TALLY_COLUMNS = (
+    "m.kind, m.country, m.year, m.rating_value,"
+    f" (SELECT group_concat(t.name, char({ord(_TAG_SEP)})) FROM movie_tags mt JOIN tags t ON t.id = mt.tag_id"
+    " WHERE mt.movie_id = m.id)"
+)
+
+
+def rating_bucket_expr(col: str) -> str:
+    """评分分桶：按整数分下取整，8.6 -> '8'，表示 [8, 9)。"""
+    return f"CAST(CAST({col} AS INTEGER) AS TEXT)"
+
+
+def _movie_facet_values(alias: str) -> Dict[str, str]:
+    """各分面在一行上的取值子查询（列名 v；国别可能有多行）。"""
+    return {
+        FACET_KIND: f"SELECT NULLIF({alias}.kind, '') AS v",
+        FACET_COUNTRY: country_tokens_sql(f"{alias}.country"),
+        FACET_YEAR: f"SELECT CAST({alias}.year AS TEXT) AS v",
+        FACET_RATING: f"SELECT {rating_bucket_expr(f'{alias}.rating_value')} AS v",
+    }
+
+
+def _inc_sql(facet: str, values: str) -> str:
+    return (
+        f"INSERT INTO {FACET_TABLE}(facet, value, n) SELECT '{facet}', v, 1 FROM ({values}) WHERE v IS NOT NULL"
+        f" ON CONFLICT(facet, value) DO UPDATE SET n = n + 1;"
+    )
+
+
+def _dec_sql(facet: str, values: str) -> str:
+    return f"UPDATE {FACET_TABLE} SET n = n - 1 WHERE facet = '{facet}' AND value IN ({values});"
+
+
+def create_facet_triggers(cur: sqlite3.Cursor) -> None:
+    new, old = _movie_facet_values("new"), _movie_facet_values("old")
+    inc = "\n".join(_inc_sql(f, v) for f, v in new.items())
+    dec = "\n".join(_dec_sql(f, v) for f, v in old.items())
+    tag_name = "SELECT name AS v FROM tags WHERE id = {}.tag_id"
+    cur.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS facet_movies_ai AFTER INSERT ON movies BEGIN
+            {inc}
+        END;
+        CREATE TRIGGER IF NOT EXISTS facet_movies_ad AFTER DELETE ON movies BEGIN
+            {dec}
+        END;
+        CREATE TRIGGER IF NOT EXISTS facet_movies_au AFTER UPDATE OF kind, country, year, rating_value ON movies BEGIN
+            {dec}
+            {inc}
+        END;
+        CREATE TRIGGER IF NOT EXISTS facet_tags_ai AFTER INSERT ON movie_tags BEGIN
+            {_inc_sql(FACET_TAG, tag_name.format("new"))}
+        END;
+        CREATE TRIGGER IF NOT EXISTS facet_tags_ad AFTER DELETE ON movie_tags BEGIN
+            {_dec_sql(FACET_TAG, tag_name.format("old"))}
+        END;
+        """
+    )
+
+
+def drop_facet_triggers(cur: sqlite3.Cursor) -> None:
+    for name in _TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def _tally(cur: sqlite3.Cursor, sql: str, params: Iterable[Any]) -> Dict[str, Dict[str, int]]:
+    """对 sql（选出 _TALLY_COLUMNS）的结果逐行计数，取值规则与触发器一致。"""
+    counts: Dict[str, Dict[str, int]] = {f: {} for f in FACETS}
+
+    def add(facet: str, value: Optional[str]) -> None:
+        if value:
+            counts[facet][value] = counts[facet].get(value, 0) + 1
+
+    for kind, country, year, rating, tag_names in cur.execute(sql, list(params)):
+        add(FACET_KIND, kind)
+        for c in country_tokens(country):
+            add(FACET_COUNTRY, c)
+        if year is not None:
+            add(FACET_YEAR, str(year))
+        if rating is not None:
+            add(FACET_RATING, str(int(rating)))
+        for t in (tag_names or "").split(_TAG_SEP):
+            add(FACET_TAG, t)
+    return counts
+
+
+def rebuild_facets(conn: sqlite3.Connection, commit: bool = True) -> None:
+    """按当前数据精确重算 facet_counts。"""
+    cur = conn.cursor()
+    # 标签整表按 movie_tags 分组计数，不必逐行取名
+    counts = _tally(cur, "SELECT m.kind, m.country, m.year, m.rating_value, NULL FROM movies m", [])
+    cur.execute("SELECT t.name, COUNT(*) FROM movie_tags mt JOIN tags t ON t.id = mt.tag_id GROUP BY t.name")
+    counts[FACET_TAG] = {r[0]: r[1] for r in cur.fetchall() if r[0]}
+    cur.execute(f"DELETE FROM {FACET_TABLE}")
+    cur.executemany(
+        f"INSERT INTO {FACET_TABLE}(facet, value, n) VALUES(?, ?, ?)",
+        [(facet, value, n) for facet in FACETS for value, n in counts[facet].items()],
+    )
+    if commit:
+        conn.commit()
+
+
+def create_facets(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {FACET_TABLE} (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+        """
+    )
+    create_facet_triggers(cur)
+
+
+def _sort_items(facet: str, items: List[Dict[str, Any]], top: Optional[int]) -> List[Dict[str, Any]]:
+    if facet in (FACET_YEAR, FACET_RATING):
+        items.sort(key=lambda x: -int(x["value"]) if str(x["value"]).lstrip("-").isdigit() else 0)
+    else:
+        items.sort(key=lambda x: (-x["n"], x["value"]))
+    return items[:top] if top else items
+
+
+def get_facets(conn: sqlite3.Connection, top_tags: int = 30, top_values: int = 50, **filters: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """返回各分面的 [{value, n}]；filters 与 search_movies 的过滤参数相同。
+
+    年份/评分按值倒序，其余按计数倒序；tag 取前 top_tags 个，其余分面取前 top_values 个。
+    命中超过 FACET_EXACT_LIMIT 时为抽样估算，条目带 approx=True。
+    """
+    active = {k: v for k, v in filters.items() if v not in (None, "", [])}
+    cur = conn.cursor()
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    if not active:
+        for facet in FACETS:
+            cur.execute(f"SELECT value, n FROM {FACET_TABLE} WHERE facet = ? AND n > 0", (facet,))
+            out[facet] = [{"value": r[0], "n": r[1]} for r in cur.fetchall()]
+    else:
+        q = build_movie_query(conn, **active)
+        cur.execute(f"SELECT COUNT(*) FROM {q.frm}{q.where}", q.params)
+        total = int(cur.fetchone()[0] or 0)
+        # 命中集合很大时按 id 等距抽样：id 在索引条目里，取样条件在回表之前判断
+        stride = -(-total // FACET_EXACT_LIMIT) if total > FACET_EXACT_LIMIT else 1
+        sql = f"SELECT {_TALLY_COLUMNS} FROM {q.frm}{q.where}"
+        params = list(q.params)
+        if stride > 1:
+            sql += " AND m.id % ? = 0"
+            params.append(stride)
+        counts = _tally(cur, sql, params)
+        for facet in FACETS:
+            out[facet] = [
+                {"value": v, "n": n * stride, "approx": True} if stride > 1 else {"value": v, "n": n}
+                for v, n in counts[facet].items()
+            ]
+    for facet in FACETS:
+        out[facet] = _sort_items(facet, out[facet], top_tags if facet == FACET_TAG else top_values)
+    return out
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import html
+import re
+import sqlite3
+from typing import Optional
+
+# 关键字全文索引：FTS5 外部内容表，内容来自 movies，由触发器保持同步。
+# trigram 分词对中文标题/人名按字符三元组切分，MATCH 一个短语即等价于子串匹配，
+# 但查询串至少需要 3 个字符；更短的关键字由调用方改查标题二元组倒排表等（见 db._keyword_filter）。
+
+FTS_TABLE = "movies_fts"
+FTS_COLUMNS = ["title", "original_title", "alt_titles_text", "description", "actors", "country"]
+# bm25 列权重，与 FTS_COLUMNS 一一对应：标题类字段权重最高
+FTS_WEIGHTS = [10.0, 5.0, 5.0, 1.0, 2.0, 1.0]
+FTS_MIN_QUERY_LEN = 3
+
+_TRIGGERS = ["movies_fts_ai", "movies_fts_ad", "movies_fts_au"]
+# 摘要中命中片段的起止标记（控制字符），由 snippet_html 转义正文后换成 <mark>
+_MARK_OPEN = "\x02"
+_MARK_CLOSE = "\x03"
+_MARK_RE = re.compile(f"([{_MARK_OPEN}{_MARK_CLOSE}])")
+
+
+def fts_supported(conn: sqlite3.Connection) -> bool:
+    """当前 SQLite 是否编译了 FTS5 且支持 trigram 分词（3.34+）。"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp._fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def fts_available(conn: sqlite3.Connection) -> bool:
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,))
+    return cur.fetchone() is not None
+
+
+def create_fts_triggers(cur: sqlite3.Cursor) -> None:
+    cols = ", ".join(FTS_COLUMNS)
+    new_vals = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_vals = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    cur.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS movies_fts_ai AFTER INSERT ON movies BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END;
+        CREATE TRIGGER IF NOT EXISTS movies_fts_ad AFTER DELETE ON movies BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+        END;
+        CREATE TRIGGER IF NOT EXISTS movies_fts_au AFTER UPDATE OF {cols} ON movies BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_vals});
+        END;
+        """
+    )
+
+
+def drop_fts_triggers(cur: sqlite3.Cursor) -> None:
+    for name in _TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_fts(cur: sqlite3.Cursor) -> bool:
+    """创建 FTS 表与同步触发器；不支持 FTS5/trigram 时返回 False 并保持 LIKE 检索。"""
+    if not fts_supported(cur.connection):
+        return False
+    cols = ", ".join(FTS_COLUMNS)
+    cur.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{cols}, content='movies', content_rowid='id', tokenize='trigram')"
+    )
+    create_fts_triggers(cur)
+    return True
+
+
+def rebuild_fts(conn: sqlite3.Connection) -> bool:
+    """按 movies 当前内容重建全文索引（用于旧库或批量导入后）。"""
+    cur = conn.cursor()
+    if not fts_available(conn) and not create_fts(cur):
+        return False
+    cur.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+    conn.commit()
+    return True
+
+
+def optimize_fts(conn: sqlite3.Connection) -> bool:
+    """合并 FTS 索引的 b-tree 段（增量写入会不断产生小段，查询需逐段合并）；无全文索引时返回 False。"""
+    if not fts_available(conn):
+        return False
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('optimize')")
+    conn.commit()
+    return True
+
+
+def fts_query(keyword: Optional[str]) -> Optional[str]:
+    """将关键字转为 FTS5 短语查询；过短（trigram 无法命中）时返回 None。"""
+    kw = (keyword or "").strip()
+    if len(kw) < FTS_MIN_QUERY_LEN:
+        return None
+    return '"' + kw.replace('"', '""') + '"'
+
+
+def bm25_expr() -> str:
+    return f"bm25({FTS_TABLE}, " + ", ".join(str(w) for w in FTS_WEIGHTS) + ")"
+
+
+def snippet_expr(tokens: int = 16) -> str:
+    """命中摘要；高亮以控制字符标记，展示前经 snippet_html 转换。"""
+    return f"snippet({FTS_TABLE}, -1, char({ord(_MARK_OPEN)}), char({ord(_MARK_CLOSE)}), '…', {int(tokens)})"
+
+
+def snippet_html(snippet: Optional[str]) -> str:
+    """把 snippet_expr 的摘要转为 HTML：正文整体转义，只输出成对的 <mark> 标签。"""
+    out = []
+    marked = False
+    for part in _MARK_RE.split(snippet or ""):
+        if part == _MARK_OPEN:
+            if not marked:
+                out.append("<mark>")
+                marked = True
+        elif part == _MARK_CLOSE:
+            if marked:
+                out.append("</mark>")
+                marked = False
+        elif part:
+            out.append(html.escape(part))
+    if marked:
+        out.append("</mark>")
+    return "".join(out)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .changes import OP_DELETE, TITLE_GRAMS_SEQ_KEY, changes_since, feed_has_gap, latest_change_seq
+from .db import SEARCH_COLUMNS, build_movie_query, get_meta, set_meta
+from .dedup import title_variants
+from .text import compact_key
+
+# 容错标题检索：标题、原名与又名规范化后切成字符二元组，倒排表 title_grams(gram, movie_id) 存在库内。
+# 查询同样切分，按命中的二元组数取候选（至少命中一半），再以“查询串对标题任意子串的编辑距离”
+# 精排，能容忍错别字、漏字与多余的画质/字幕修饰。
+# 倒排表不由触发器维护（切分需要 Python），而是消费 movie_changes 变更流增量刷新，
+# 已消费位置记在 app_meta；变更流出现断档或积压过多时全量重建。
+# 刷新在写入侧进行（抓取/导入/修复/清理结束、maintain、网页服务的后台线程），检索本身只读。
+# 倒排表同时承担 1~2 个字符关键字的标题匹配（FTS trigram 需要至少 3 个字符），见 keyword_grams_sql。
+
+GRAMS_TABLE = "title_grams"
+GRAM_SIZE = 2
+# 精排的候选上限（按命中数取前若干）
+FUZZY_CANDIDATES = 1000
+# 候选至少命中查询二元组的比例
+FUZZY_MIN_OVERLAP = 0.5
+# 结果最低得分：1 - 编辑距离 / 查询长度
+FUZZY_MIN_SCORE = 0.6
+# 积压的变更超过该条数时直接重建
+_REBUILD_BACKLOG = 100000
+# 前缀范围查询的上界
+_PREFIX_END = "\U0010ffff"
+
+
+def create_title_grams(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS {GRAMS_TABLE} (
+            gram TEXT NOT NULL,
+            movie_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, movie_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_title_grams_movie ON {GRAMS_TABLE}(movie_id);
+        CREATE INDEX IF NOT EXISTS idx_title_grams_tail ON {GRAMS_TABLE}(substr(gram, 2));
+        """
+    )
+
+
+def query_name(text: Optional[str]) -> str:
+    """查询串规范化；只含修饰词时退回仅去标点的小写形式。"""
+    name = title_variants(text, None, None)
+    if name:
+        return name[0]
+    return compact_key(text)
+
+
+def grams(name: str) -> Set[str]:
+    if len(name) < GRAM_SIZE:
+        return {name} if name else set()
+    return {name[i:i + GRAM_SIZE] for i in range(len(name) - GRAM_SIZE + 1)}
+
+
+def keyword_grams_sql(keyword: Optional[str]) -> Optional[Tuple[str, List[Any]]]:
+    """短关键字的标题匹配：返回 (选出 movie_id 的子查询, 参数)；规范化后不是 1~2 个字符时返回 None。
+
+    两个字符即一个二元组，直接查表；单个字符是某个二元组的首字或尾字（或整个标题只有这一个字）。
+    """
+    name = query_name(keyword)
+    if len(name) == GRAM_SIZE:
+        return f"SELECT movie_id FROM {GRAMS_TABLE} WHERE gram = ?", [name]
+    if len(name) == 1:
+        return (
+            f"SELECT movie_id FROM {GRAMS_TABLE} WHERE gram >= ? AND gram < ?"
+            f" UNION SELECT movie_id FROM {GRAMS_TABLE} WHERE substr(gram, 2) = ?",
+            [name, name + _PREFIX_END, name],
+        )
+    return None
+
+
+def _movie_grams(title: Optional[str], original_title: Optional[str], alt_titles_text: Optional[str]) -> Set[str]:
+    out: Set[str] = set()
+    for v in title_variants(title, original_title, alt_titles_text):
+        out |= grams(v)
+    return out
+
+
+def _index_rows(cur: sqlite3.Cursor, rows: Iterable[sqlite3.Row]) -> None:
+    cur.executemany(
+        f"INSERT OR IGNORE INTO {GRAMS_TABLE}(gram, movie_id) VALUES (?, ?)",
+        [(g, r[0]) for r in rows for g in _movie_grams(r[1], r[2], r[3])],
+    )
+
+
+def rebuild_title_grams(conn: sqlite3.Connection, commit: bool = True) -> int:
+    """按 movies 当前内容重建倒排表，返回影片数。"""
+    seq = latest_change_seq(conn)
+    cur = conn.cursor()
+    create_title_grams(cur)
+    cur.execute(f"DELETE FROM {GRAMS_TABLE}")
+    reader = conn.cursor()
+    reader.execute("SELECT id, title, original_title, alt_titles_text FROM movies")
+    n = 0
+    while True:
+        rows = reader.fetchmany(5000)
+        if not rows:
+            break
+        _index_rows(cur, rows)
+        n += len(rows)
+    set_meta(conn, TITLE_GRAMS_SEQ_KEY, seq)
+    if commit:
+        conn.commit()
+    return n
+
+
+def refresh_title_grams(conn: sqlite3.Connection) -> int:
+    """按变更流增量刷新倒排表，返回处理的影片数。"""
+    seq = int(get_meta(conn, TITLE_GRAMS_SEQ_KEY, "-1") or -1)
+    latest = latest_change_seq(conn)
+    if seq < 0 or feed_has_gap(conn, seq) or latest - seq > _REBUILD_BACKLOG:
+        return rebuild_title_grams(conn)
+    if latest <= seq:
+        return 0
+    touched: Dict[int, str] = {}
+    while True:
+        batch = changes_since(conn, seq)
+        if not batch:
+            break
+        for _, mid, op in batch:
+            touched[mid] = op
+        seq = batch[-1][0]
+    ids = list(touched)
+    cur = conn.cursor()
+    for k in range(0, len(ids), 500):
+        chunk = ids[k:k + 500]
+        marks = ",".join("?" * len(chunk))
+        cur.execute(f"DELETE FROM {GRAMS_TABLE} WHERE movie_id IN ({marks})", chunk)
+        live = [mid for mid in chunk if touched[mid] != OP_DELETE]
+        if live:
+            cur.execute(
+                f"SELECT id, title, original_title, alt_titles_text FROM movies"
+                f" WHERE id IN ({','.join('?' * len(live))})",
+                live,
+            )
+            _index_rows(cur, cur.fetchall())
+    set_meta(conn, TITLE_GRAMS_SEQ_KEY, seq)
+    conn.commit()
+    return len(ids)
+
+
+def substring_distance(query: str, text: str) -> int:
+    """query 与 text 中任一子串的最小编辑距离（起止位置不计代价）。"""
+    if not query:
+        return 0
+    prev = [0] * (len(text) + 1)
+    for i, qc in enumerate(query, 1):
+        cur = [i] + [0] * len(text)
+        for j, tc in enumerate(text, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (qc != tc))
+        prev = cur
+    return min(prev)
+
+
+def _score(query: str, variants: List[str]) -> Tuple[float, int]:
+    """返回 (得分, 与最接近标题的长度差)；得分为 1 - 编辑距离 / 查询长度。"""
+    best = (0.0, 0)
+    for v in variants:
+        s = 1.0 - substring_distance(query, v) / float(len(query))
+        cand = (round(s, 4), -abs(len(v) - len(query)))
+        if cand > best:
+            best = cand
+    return best[0], -best[1]
+
+
+def fuzzy_candidates(
+    conn: sqlite3.Connection, name: str, limit: int = FUZZY_CANDIDATES, **filters: Any
+) -> List[Tuple[int, int]]:
+    """按命中的二元组数返回满足过滤条件的候选 [(movie_id, 命中数)]。
+
+    filters 与 search_movies 的过滤参数相同，在截取前 limit 个候选之前生效；
+    只对达到最低命中数的影片回表判断过滤条件（倒排表里已删除影片的残留也在此排除）。
+    """
+    qg = sorted(grams(name))
+    if not qg:
+        return []
+    need = max(1, int(math.ceil(len(qg) * FUZZY_MIN_OVERLAP)))
+    q = build_movie_query(conn, **filters)
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT c.movie_id, c.hits FROM (SELECT movie_id, COUNT(*) AS hits FROM {GRAMS_TABLE}"
+        f" WHERE gram IN ({','.join('?' * len(qg))}) GROUP BY movie_id HAVING hits >= ?) c"
+        f" JOIN {q.frm} ON m.id = c.movie_id{q.where} ORDER BY c.hits DESC, c.movie_id DESC LIMIT ?",
+        qg + [need] + list(q.params) + [int(limit)],
+    )
+    return [(int(r[0]), int(r[1])) for r in cur.fetchall()]
+
+
+def fuzzy_search(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int = 50,
+    offset: int = 0,
+    min_score: float = FUZZY_MIN_SCORE,
+    **filters: Any,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """容错标题检索，返回 (本页结果, 总数)；结果按得分降序，附 fuzzy_score 字段。
+
+    filters 与 search_movies 的过滤参数相同（title/keyword 除外），在取候选时生效。
+    只读：不刷新倒排表，最近写入的影片在写入侧刷新（refresh_title_grams）之后才能检到。
+    总数只统计按命中数排在前 FUZZY_CANDIDATES 名内的候选，候选被截断时为下限。
+    """
+    name = query_name(query)
+    if not name:
+        return [], 0
+    filters = {k: v for k, v in filters.items() if k not in ("title", "keyword") and v not in (None, "", [])}
+    cands = fuzzy_candidates(conn, name, **filters)
+    if not cands:
+        return [], 0
+    hits = dict(cands)
+    ids = list(hits)
+    cur = conn.cursor()
+    scored = []
+    for k in range(0, len(ids), 500):
+        chunk = ids[k:k + 500]
+        cur.execute(
+            f"SELECT {SEARCH_COLUMNS}, m.original_title, m.alt_titles_text FROM movies m"
+            f" WHERE m.id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for r in cur.fetchall():
+            score, gap = _score(name, title_variants(r["title"], r["original_title"], r["alt_titles_text"]) or [name])
+            if score < min_score:
+                continue
+            row = {k2: r[k2] for k2 in r.keys() if k2 not in ("original_title", "alt_titles_text")}
+            row["fuzzy_score"] = score
+            scored.append(((-score, gap, -hits[r["id"]], -(r["rating_value"] or 0), -r["id"]), row))
+    scored.sort(key=lambda x: x[0])
+    page = [row for _, row in scored[int(offset):int(offset) + int(limit)]]
+    return page, len(scored)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO, Tuple
+
+from .db import (
+    get_meta, set_meta, upsert_movies,
+    UPSERT_INSERTED, UPSERT_UPDATED, UPSERT_HTML_ONLY, UPSERT_UNCHANGED, UPSERT_MERGED,
+)
+from .migrations import begin_deferred, finish_deferred, recover_deferred
+from .scraper import is_valid_detail
+
+# JSONL 批量导入（格式与 export 输出一致）：按批调用 upsert_movies，每批一个大事务。
+# 每批提交后在 app_meta 记录已处理行号作为断点；upsert 按内容哈希幂等，
+# 断点与批次提交之间中断最多重放一批，不会产生重复数据。
+#
+# defer_indexes 时先删除二级索引与 FTS/分面/统计/剧集触发器，导入结束（含异常退出）后重建索引、
+# 触发器并整体重算（migrations.begin_deferred/finish_deferred）；进程被强杀时 app_meta 中留有标记，
+# 下次 migrate/init-db（网页服务启动时也会执行）或导入会补做。
+
+_CHECKPOINT_PREFIX = "import_checkpoint:"
+
+
+def _checkpoint_key(path: str) -> str:
+    return _CHECKPOINT_PREFIX + os.path.abspath(path)
+
+
+def _file_sig(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+
+def load_checkpoint(conn: sqlite3.Connection, path: str) -> int:
+    """返回该文件上次导入已处理的行数；文件已变化或无断点时返回 0。"""
+    if path == "-":
+        return 0
+    raw = get_meta(conn, _checkpoint_key(path))
+    if not raw:
+        return 0
+    try:
+        cp = json.loads(raw)
+    except ValueError:
+        return 0
+    return int(cp.get("line") or 0) if cp.get("sig") == _file_sig(path) else 0
+
+
+def _save_checkpoint(conn: sqlite3.Connection, path: str, line: int) -> None:
+    if path == "-":
+        return
+    set_meta(conn, _checkpoint_key(path), json.dumps({"line": line, "sig": _file_sig(path)}))
+    conn.commit()
+
+
+def clear_checkpoint(conn: sqlite3.Connection, path: str) -> None:
+    conn.execute("DELETE FROM app_meta WHERE key=?", (_checkpoint_key(path),))
+    conn.commit()
+
+
+def _open_input(path: str) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _read_records(f: TextIO, skip: int, counts: Dict[str, int]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """逐行解析，产出 (行号, 记录)；跳过断点之前的行，坏行与无效记录只计数。"""
+    for lineno, line in enumerate(f, 1):
+        if lineno <= skip:
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            counts["malformed"] += 1
+            continue
+        if not isinstance(rec, dict) or not rec.get("detail_url") or not is_valid_detail(rec):
+            counts["invalid"] += 1
+            continue
+        yield lineno, rec
+
+
+def import_jsonl(
+    conn: sqlite3.Connection,
+    path: str,
+    batch_size: int = 5000,
+    defer_indexes: bool = False,
+    resume: bool = True,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """导入 JSONL（可为 .gz 或 '-' 标准输入），返回计数与耗时统计。"""
+    counts: Dict[str, Any] = {
+        UPSERT_INSERTED: 0, UPSERT_UPDATED: 0, UPSERT_HTML_ONLY: 0, UPSERT_UNCHANGED: 0, UPSERT_MERGED: 0,
+        "invalid": 0, "malformed": 0,
+    }
+    skip = load_checkpoint(conn, path) if resume else 0
+    counts["resumed_from_line"] = skip
+    started = time.monotonic()
+    loaded = 0
+    if defer_indexes:
+        begin_deferred(conn)
+    else:
+        # 上次延迟导入被强杀时先补建索引与触发器
+        recover_deferred(conn)
+    try:
+        with _open_input(path) as f:
+            batch = []
+            last_line = skip
+
+            def _flush() -> None:
+                nonlocal loaded
+                if not batch:
+                    return
+                res = upsert_movies(conn, batch, batch_size=len(batch))
+                for k, v in res.items():
+                    counts[k] += v
+                loaded += len(batch)
+                batch.clear()
+                _save_checkpoint(conn, path, last_line)
+                if progress:
+                    elapsed = time.monotonic() - started
+                    progress({"rows": loaded, "line": last_line, "elapsed": elapsed,
+                              "rows_per_sec": loaded / elapsed if elapsed else 0.0})
+
+            for lineno, rec in _read_records(f, skip, counts):
+                batch.append(rec)
+                last_line = lineno
+                if len(batch) >= batch_size:
+                    _flush()
+            _flush()
+        if path != "-":
+            clear_checkpoint(conn, path)
+    finally:
+        if defer_indexes:
+            finish_deferred(conn)
+    elapsed = time.monotonic() - started
+    counts["rows"] = loaded
+    counts["elapsed"] = round(elapsed, 2)
+    counts["rows_per_sec"] = round(loaded / elapsed, 1) if elapsed else 0.0
+    return counts
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import re
+import sqlite3
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# 下载链接的资源标识：magnet 的 BT infohash（xt=urn:btih）、ed2k 的文件哈希与大小、
+# thunder:// 为 base64("AA" + 原始链接 + "ZZ")，解码后按原始链接解析。
+# 解析结果存入 download_links.btih/ed2k_hash/size 并建索引，哈希查询走索引；
+# 同一影片内资源标识相同的链接（如同一种子带不同 tracker 参数）只保留一条。
+
+_BTIH_RE = re.compile(r"urn:btih:([0-9a-zA-Z]+)", re.I)
+_HEX40_RE = re.compile(r"^[0-9a-fA-F]{40}$")
+_BASE32_RE = re.compile(r"^[A-Za-z2-7]{32}$")
+_HEX32_RE = re.compile(r"^[0-9a-fA-F]{32}$")
+
+
+class LinkKey(NamedTuple):
+    btih: Optional[str] = None
+    ed2k_hash: Optional[str] = None
+    size: Optional[int] = None
+
+    @property
+    def key(self) -> Optional[str]:
+        """资源标识：btih:<hex> 或 ed2k:<hash>，无法识别时为 None。"""
+        if self.btih:
+            return "btih:" + self.btih
+        if self.ed2k_hash:
+            return "ed2k:" + self.ed2k_hash
+        return None
+
+
+def normalize_btih(value: Optional[str]) -> Optional[str]:
+    """40 位十六进制或 32 位 base32 infohash -> 40 位小写十六进制。"""
+    v = (value or "").strip()
+    if _HEX40_RE.match(v):
+        return v.lower()
+    if _BASE32_RE.match(v):
+        try:
+            return binascii.hexlify(base64.b32decode(v.upper())).decode("ascii")
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def decode_thunder(url: str) -> Optional[str]:
+    """thunder://base64 -> 原始链接；无法解码时返回 None。"""
+    payload = url[len("thunder://"):].strip().rstrip("/")
+    try:
+        raw = base64.b64decode(payload + "=" * (-len(payload) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    for enc in ("utf-8", "gbk"):
+        try:
+            text = raw.decode(enc)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        return None
+    if text.startswith("AA") and text.endswith("ZZ"):
+        text = text[2:-2]
+    return text.strip() or None
+
+
+def _parse_magnet(url: str) -> LinkKey:
+    qs = parse_qs(urlsplit(url).query)
+    btih = None
+    for xt in qs.get("xt", []):
+        m = _BTIH_RE.search(xt)
+        if m:
+            btih = normalize_btih(m.group(1))
+            if btih:
+                break
+    size = None
+    xl = (qs.get("xl") or [None])[0]
+    if xl and xl.isdigit():
+        size = int(xl)
+    return LinkKey(btih=btih, size=size)
+
+
+def _parse_ed2k(url: str) -> LinkKey:
+    # ed2k://|file|名称|大小|MD4哈希|/
+    parts = unquote(url).split("|")
+    if len(parts) >= 5 and parts[1].lower() == "file":
+        size = int(parts[3]) if parts[3].isdigit() else None
+        h = parts[4].strip()
+        return LinkKey(ed2k_hash=h.lower() if _HEX32_RE.match(h) else None, size=size)
+    return LinkKey()
+
+
+def parse_link(url: Optional[str]) -> LinkKey:
+    """解析下载链接的资源标识；thunder 链接先解码。"""
+    u = (url or "").strip()
+    low = u.lower()
+    if low.startswith("thunder://"):
+        inner = decode_thunder(u)
+        return parse_link(inner) if inner and not inner.lower().startswith("thunder://") else LinkKey()
+    if low.startswith("magnet:"):
+        return _parse_magnet(u)
+    if low.startswith("ed2k://"):
+        return _parse_ed2k(u)
+    return LinkKey()
+
+
+def lookup_key(query: str) -> Optional[Tuple[str, str]]:
+    """将查询（infohash、ed2k 哈希或 magnet/ed2k/thunder 链接）转为 (列名, 值)。"""
+    q = (query or "").strip()
+    if "://" in q or q.lower().startswith("magnet:"):
+        k = parse_link(q)
+        if k.btih:
+            return "btih", k.btih
+        if k.ed2k_hash:
+            return "ed2k_hash", k.ed2k_hash
+        return None
+    if _HEX32_RE.match(q):
+        return "ed2k_hash", q.lower()
+    btih = normalize_btih(q)
+    return ("btih", btih) if btih else None
+
+
+def dedup_links(links: Dict[str, Tuple[Any, Any, Any]]) -> Dict[str, Tuple[Any, Any, Any]]:
+    """同一影片内资源标识相同的链接只保留首个（保持原有顺序）。"""
+    seen = set()
+    out: Dict[str, Tuple[Any, Any, Any]] = {}
+    for url, v in links.items():
+        key = parse_link(url).key
+        if key:
+            if key in seen:
+                continue
+            seen.add(key)
+        out[url] = v
+    return out
+
+
+def create_link_keys(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_download_links_btih ON download_links(btih) WHERE btih IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_download_links_ed2k ON download_links(ed2k_hash) WHERE ed2k_hash IS NOT NULL;
+        """
+    )
+
+
+def backfill_link_keys(conn: sqlite3.Connection, batch_size: int = 5000) -> int:
+    """为已有的 magnet/ed2k/thunder 链接回填 btih/ed2k_hash/size，返回解析出标识的链接数（不提交事务）。"""
+    reader = conn.cursor()
+    reader.execute(
+        "SELECT id, url FROM download_links"
+        " WHERE url LIKE 'magnet:%' OR url LIKE 'ed2k:%' OR url LIKE 'thunder:%'"
+    )
+    cur = conn.cursor()
+    n = 0
+    while True:
+        rows = reader.fetchmany(batch_size)
+        if not rows:
+            break
+        updates = []
+        for lid, url in rows:
+            k = parse_link(url)
+            if k.btih or k.ed2k_hash or k.size:
+                updates.append((k.btih, k.ed2k_hash, k.size, lid))
+                n += 1 if k.key else 0
+        cur.executemany("UPDATE download_links SET btih=?, ed2k_hash=?, size=? WHERE id=?", updates)
+    return n
+
+
+def dedup_movie_links(conn: sqlite3.Connection) -> int:
+    """删除同一影片内资源标识重复的链接（保留最早的一条），返回删除条数（不提交事务）。"""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        DELETE FROM download_links WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY movie_id, COALESCE('btih:' || btih, 'ed2k:' || ed2k_hash) ORDER BY id
+                ) AS rn
+                FROM download_links WHERE btih IS NOT NULL OR ed2k_hash IS NOT NULL
+            ) WHERE rn > 1
+        )
+        """
+    )
+    return cur.rowcount
+
+
+def find_by_hash(conn: sqlite3.Connection, query: str, limit: int = 100) -> List[sqlite3.Row]:
+    """按 infohash / ed2k 哈希（或链接本身）查找含该资源的影片与链接。"""
+    lk = lookup_key(query)
+    if not lk:
+        raise ValueError("无法识别的哈希或链接")
+    col, value = lk
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT dl.movie_id, m.title, m.year, m.kind, dl.kind AS link_kind, dl.url, dl.label, dl.episode,"
+        f" dl.btih, dl.ed2k_hash, dl.size"
+        f" FROM download_links dl JOIN movies m ON m.id = dl.movie_id"
+        f" WHERE dl.{col} = ? ORDER BY dl.movie_id LIMIT ?",
+        (value, int(limit)),
+    )
+    return cur.fetchall()
+
+
+def shared_releases(conn: sqlite3.Connection, limit: int = 50) -> List[sqlite3.Row]:
+    """被多部影片共用的资源（同一种子/文件挂在不同条目下），按影片数降序。"""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT key, COUNT(DISTINCT movie_id) AS movies, GROUP_CONCAT(DISTINCT movie_id) AS movie_ids FROM (
+            SELECT 'btih:' || btih AS key, movie_id FROM download_links WHERE btih IS NOT NULL
+            UNION ALL
+            SELECT 'ed2k:' || ed2k_hash, movie_id FROM download_links WHERE ed2k_hash IS NOT NULL
+        ) GROUP BY key HAVING movies > 1 ORDER BY movies DESC, key LIMIT ?
+        """,
+        (int(limit),),
+    )
+    return cur.fetchall()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from . import config
+from .changes import CHANGES_TABLE, PERSISTED_CONSUMER_KEYS, latest_change_seq, prune_changes
+from .db import get_meta
+from .fts import optimize_fts
+from .fuzzy import refresh_title_grams
+
+# 数据库维护（maintain）：抓取记录保留策略、变更流清理，随后更新统计信息、合并 FTS 段、
+# 回收空闲页并截断 WAL，报告回收的字节数与各步耗时。
+#
+# 保留策略：
+#   - 超过 session_days 天未活动的抓取会话整体删除（访问记录、队列、事件与会话本身）；
+#   - 事件另按时间（event_days）与每会话条数（events_per_session）裁剪；
+#   - 队列中已完成（status='done'）且早于 queue_days 的行删除（去重依据是 crawl_visits，不受影响）。
+# 变更流：先让 title_grams 追上变更流再清理。SQLite 中持久化的消费者（title_grams、movie_similar）
+# 记录在 app_meta 的位置之前的记录可以删除，另保留最近 changes_keep 条供进程内索引（列式过滤、联想）
+# 增量追赶；早于 changes_days 天的记录无论如何删除，
+# 落后太多的消费者下次刷新时因断档而全量重建。
+#
+# 空闲页只有 auto_vacuum=INCREMENTAL 的库能增量回收；旧库需一次 full_vacuum（VACUUM 并切换为增量模式）。
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _setting(name: str, value: Optional[int]) -> int:
+    return int(value if value is not None else getattr(config, name))
+
+
+def _ago(days: int) -> str:
+    return f"-{int(days)} days"
+
+
+def _file_bytes(conn: sqlite3.Connection) -> int:
+    row = conn.execute("PRAGMA database_list").fetchone()
+    path = row[2] if row else ""
+    if not path:
+        return 0
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def _pragma(conn: sqlite3.Connection, name: str) -> int:
+    return int(conn.execute(f"PRAGMA {name}").fetchone()[0] or 0)
+
+
+def prune_crawl_records(
+    conn: sqlite3.Connection,
+    session_days: Optional[int] = None,
+    event_days: Optional[int] = None,
+    events_per_session: Optional[int] = None,
+    queue_days: Optional[int] = None,
+) -> Dict[str, int]:
+    """按保留策略删除抓取记录，返回各表删除行数（不提交事务）。"""
+    session_days = _setting("MAINTAIN_SESSION_DAYS", session_days)
+    event_days = _setting("MAINTAIN_EVENT_DAYS", event_days)
+    events_per_session = _setting("MAINTAIN_EVENTS_PER_SESSION", events_per_session)
+    queue_days = _setting("MAINTAIN_QUEUE_DAYS", queue_days)
+    out = {"crawl_sessions": 0, "crawl_visits": 0, "crawl_queue": 0, "crawl_events": 0}
+    cur = conn.cursor()
+    if session_days > 0:
+        cur.execute("SELECT id FROM crawl_sessions WHERE updated_at < datetime('now', ?)", (_ago(session_days),))
+        ids = [r[0] for r in cur.fetchall()]
+        for k in range(0, len(ids), 500):
+            chunk = ids[k:k + 500]
+            marks = ",".join("?" * len(chunk))
+            for table in ("crawl_visits", "crawl_queue", "crawl_events"):
+                cur.execute(f"DELETE FROM {table} WHERE session_id IN ({marks})", chunk)
+                out[table] += cur.rowcount
+            cur.execute(f"DELETE FROM crawl_sessions WHERE id IN ({marks})", chunk)
+            out["crawl_sessions"] += cur.rowcount
+        # 未开启外键约束，会话删除后可能残留的记录
+        for table in ("crawl_visits", "crawl_queue", "crawl_events"):
+            cur.execute(f"DELETE FROM {table} WHERE session_id NOT IN (SELECT id FROM crawl_sessions)")
+            out[table] += cur.rowcount
+    if event_days > 0:
+        cur.execute("DELETE FROM crawl_events WHERE created_at < datetime('now', ?)", (_ago(event_days),))
+        out["crawl_events"] += cur.rowcount
+    if events_per_session > 0:
+        cur.execute(
+            "SELECT session_id FROM crawl_events GROUP BY session_id HAVING COUNT(*) > ?", (events_per_session,)
+        )
+        for (sid,) in cur.fetchall():
+            # 按 (session_id) 索引中的 id 顺序保留最新的 events_per_session 条
+            cur.execute(
+                "DELETE FROM crawl_events WHERE session_id = ? AND id <= ("
+                " SELECT id FROM crawl_events WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (sid, sid, events_per_session),
+            )
+            out["crawl_events"] += cur.rowcount
+    if queue_days > 0:
+        cur.execute(
+            "DELETE FROM crawl_queue WHERE status = 'done' AND dequeued_at < datetime('now', ?)", (_ago(queue_days),)
+        )
+        out["crawl_queue"] += cur.rowcount
+    return out
+
+
+def change_prune_point(
+    conn: sqlite3.Connection,
+    keep: Optional[int] = None,
+    days: Optional[int] = None,
+) -> int:
+    """变更流可清理到的 seq：不越过持久化消费者的位置，并保留最近 keep 条；早于 days 天的记录总可清理。"""
+    keep = _setting("MAINTAIN_CHANGES_KEEP", keep)
+    days = _setting("MAINTAIN_CHANGES_DAYS", days)
+    upto = latest_change_seq(conn) - max(0, keep)
+    for key in PERSISTED_CONSUMER_KEYS:
+        seq = int(get_meta(conn, key, "-1") or -1)
+        # 从未构建过的消费者首次构建时本就全量，不作约束
+        if seq >= 0:
+            upto = min(upto, seq)
+    if days > 0:
+        cur = conn.cursor()
+        cur.execute(f"SELECT MAX(seq) FROM {CHANGES_TABLE} WHERE changed_at < datetime('now', ?)", (_ago(days),))
+        upto = max(upto, int(cur.fetchone()[0] or 0))
+    return max(0, upto)
+
+
+def maintain(
+    conn: sqlite3.Connection,
+    retention: bool = True,
+    analyze: bool = True,
+    full_vacuum: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+    **policy: Optional[int],
+) -> Dict[str, Any]:
+    """执行全部维护步骤，返回 {deleted, steps: [{step, elapsed}], bytes_before, bytes_after, ...}。
+
+    policy 可覆盖 config.MAINTAIN_* 保留参数：session_days、event_days、events_per_session、queue_days、
+    changes_keep、changes_days。
+    """
+    started = time.monotonic()
+    conn.commit()
+    bytes_before = _file_bytes(conn)
+    free_before = _pragma(conn, "freelist_count")
+    steps: List[Dict[str, Any]] = []
+    deleted: Dict[str, int] = {}
+
+    def _step(name: str, fn: Callable[[], Any]) -> Any:
+        if progress:
+            progress(name)
+        t = time.monotonic()
+        res = fn()
+        steps.append({"step": name, "elapsed": round(time.monotonic() - t, 3)})
+        return res
+
+    if retention:
+        deleted.update(_step("retention", lambda: prune_crawl_records(
+            conn, policy.get("session_days"), policy.get("event_days"),
+            policy.get("events_per_session"), policy.get("queue_days"),
+        )))
+        _step("title_grams", lambda: refresh_title_grams(conn))
+        upto = change_prune_point(conn, policy.get("changes_keep"), policy.get("changes_days"))
+        deleted[CHANGES_TABLE] = _step("prune_changes", lambda: prune_changes(conn, upto))
+        conn.commit()
+    if analyze:
+        _step("analyze", lambda: conn.execute("ANALYZE"))
+        conn.commit()
+    _step("optimize", lambda: conn.execute("PRAGMA optimize").fetchall())
+    _step("fts_optimize", lambda: optimize_fts(conn))
+    auto_vacuum = _pragma(conn, "auto_vacuum")
+    if full_vacuum:
+        # 一次性切换为增量模式：VACUUM 重写整个文件（需与库大小相当的临时空间）
+        conn.execute(f"PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}")
+        _step("vacuum", lambda: conn.execute("VACUUM"))
+        auto_vacuum = _pragma(conn, "auto_vacuum")
+    elif auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+        # 该 PRAGMA 每步只释放一页且不返回行，execute 只步进一次；executescript 会执行到底
+        _step("incremental_vacuum", lambda: conn.executescript("PRAGMA incremental_vacuum;"))
+    checkpoint = _step("wal_checkpoint", lambda: tuple(conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()))
+    bytes_after = _file_bytes(conn)
+    return {
+        "deleted": deleted,
+        "steps": steps,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": bytes_before - bytes_after,
+        "freelist_before": free_before,
+        # auto_vacuum 未开启时空闲页留在文件中供后续写入复用，需 full_vacuum 才能归还
+        "freelist_after": _pragma(conn, "freelist_count"),
+        "auto_vacuum": auto_vacuum,
+        "wal_checkpoint": list(checkpoint),
+        "elapsed": round(time.monotonic() - started, 2),
+    }
@@ -0,0 +1,724 @@
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+from typing import Callable, List, Optional, Tuple, Dict, Any
+
+from .fts import create_fts_triggers, drop_fts_triggers, fts_available, fts_supported, rebuild_fts, FTS_TABLE
+from .people import sync_movie_people
+from .facets import create_facet_triggers, drop_facet_triggers, rebuild_facets
+from .stats import create_stats_triggers, drop_stats_triggers, rebuild_stats
+from .changes import create_change_feed, drop_change_feed_triggers
+from .fuzzy import rebuild_title_grams
+from .links import backfill_link_keys, dedup_movie_links
+from .episodes import create_episode_triggers, drop_episode_triggers, rebuild_episodes
+from .db import get_meta, set_meta, split_tags, set_movie_tags, clear_tag_cache
+
+
+# 版本化迁移：每一步 (版本号, 说明, 执行函数)，按版本号顺序执行且只执行一次。
+# 已发布的步骤不要修改，新的结构变更一律追加新版本。
+# 步骤只做结构变更，表与索引的 DDL 写死在步骤内（不调用各模块的现行 create_* 函数，否则已发布的步骤会随模块演进而改变含义）。
+# 维护触发器与需要按现有数据回填的派生表由步骤登记到 schema_backfills，
+# 全部步骤执行完、结构已是最新版本后再由 BACKFILLS 按各模块的现行函数统一重建。回填可能用到
+# 更晚的步骤才加的列，放在步骤内执行会让已发布的步骤随模块演进而失效。
+
+def _columns(cur: sqlite3.Cursor, table: str) -> List[str]:
+    cur.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cur.fetchall()]
+
+
+def _add_column(cur: sqlite3.Cursor, table: str, column: str, decl: str) -> None:
+    if column not in _columns(cur, table):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _schedule_backfill(cur: sqlite3.Cursor, *names: str) -> None:
+    """登记回填（与步骤的版本记录同一事务）。"""
+    cur.executemany("INSERT OR IGNORE INTO schema_backfills(name) VALUES(?)", [(n,) for n in names])
+
+
+def _m001_base_tables(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            original_title TEXT,
+            year INTEGER,
+            kind TEXT,
+            country TEXT,
+            language TEXT,
+            director TEXT,
+            actors TEXT,
+            rating_source TEXT,
+            rating_value REAL,
+            rating_votes INTEGER,
+            tags_text TEXT,
+            description TEXT,
+            cover_url TEXT,
+            detail_url TEXT NOT NULL UNIQUE,
+            raw_html TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS movie_tags (
+            movie_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, tag_id),
+            FOREIGN KEY(movie_id) REFERENCES movies(id) ON DELETE CASCADE,
+            FOREIGN KEY(tag_id) REFERENCES tags(id) ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS download_links (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            kind TEXT,
+            label TEXT,
+            UNIQUE(movie_id, url),
+            FOREIGN KEY(movie_id) REFERENCES movies(id) ON DELETE CASCADE
+        );
+        -- 断点续爬相关表
+        CREATE TABLE IF NOT EXISTS crawl_sessions (
+            id TEXT PRIMARY KEY,
+            started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT
+        );
+        CREATE TABLE IF NOT EXISTS crawl_visits (
+            session_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            visited_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY(session_id, url, kind),
+            FOREIGN KEY(session_id) REFERENCES crawl_sessions(id) ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS crawl_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            event TEXT,
+            section TEXT,
+            url TEXT,
+            detail_url TEXT,
+            message TEXT,
+            count INTEGER,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(session_id) REFERENCES crawl_sessions(id) ON DELETE CASCADE
+        );
+        CREATE TABLE IF NOT EXISTS crawl_queue (
+            session_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            enqueued_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            dequeued_at TEXT,
+            PRIMARY KEY(session_id, url),
+            FOREIGN KEY(session_id) REFERENCES crawl_sessions(id) ON DELETE CASCADE
+        );
+        """
+    )
+
+
+def _m002_episode_and_alt_titles(cur: sqlite3.Cursor) -> None:
+    # 旧库可能已由早期的 PRAGMA 检查补过这两列
+    _add_column(cur, "download_links", "episode", "INTEGER")
+    _add_column(cur, "movies", "alt_titles_text", "TEXT")
+
+
+# 二级索引：按 search_movies/count_movies 的过滤与排序字段、以及抓取簿记查询选取
+SECONDARY_INDEXES: Dict[str, str] = {
+    "idx_movies_updated_at": "movies(updated_at)",
+    "idx_movies_created_at": "movies(created_at)",
+    "idx_movies_year": "movies(year)",
+    "idx_movies_rating_value": "movies(rating_value)",
+    "idx_movies_rating_source": "movies(rating_source, rating_value)",
+    "idx_movies_kind": "movies(kind, updated_at)",
+    "idx_movies_country": "movies(country)",
+    "idx_movies_title": "movies(title)",
+    "idx_crawl_queue_frontier": "crawl_queue(session_id, status, enqueued_at)",
+    "idx_crawl_events_session": "crawl_events(session_id)",
+}
+
+
+def create_secondary_indexes(cur: sqlite3.Cursor) -> None:
+    for name, target in SECONDARY_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_secondary_indexes(cur: sqlite3.Cursor) -> None:
+    for name in SECONDARY_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+# 延迟维护（批量导入 --defer-indexes）：删除二级索引与维护触发器，写完后重建并整体重算。
+# app_meta 中的标记记下执行者（进程号@主机名）；进程被强杀时标记残留，期间检索退化为全表扫描、
+# FTS/分面/统计/剧集停止更新，migrate 结束时（init-db、网页服务启动都会执行）检测到执行者已不在就补做。
+DEFERRED_KEY = "import_deferred"
+
+
+def _owner_tag() -> str:
+    return f"{os.getpid()}@{socket.gethostname()}"
+
+
+def deferred_owner_alive(owner: Optional[str]) -> bool:
+    """标记的执行者是否仍在运行；旧格式标记或其他主机的标记视为已退出。"""
+    pid, _, host = (owner or "").partition("@")
+    if not pid.isdigit() or host != socket.gethostname():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def begin_deferred(conn: sqlite3.Connection) -> None:
+    """删除二级索引与维护触发器，供大批量写入。"""
+    set_meta(conn, DEFERRED_KEY, _owner_tag())
+    conn.commit()
+    cur = conn.cursor()
+    drop_secondary_indexes(cur)
+    drop_fts_triggers(cur)
+    drop_facet_triggers(cur)
+    drop_stats_triggers(cur)
+    drop_episode_triggers(cur)
+    conn.commit()
+
+
+def finish_deferred(conn: sqlite3.Connection) -> bool:
+    """若存在未完成的延迟维护，重建索引、触发器并重算 FTS、统计与剧集汇总；返回是否执行。"""
+    if not get_meta(conn, DEFERRED_KEY):
+        return False
+    cur = conn.cursor()
+    create_secondary_indexes(cur)
+    if fts_available(conn):
+        create_fts_triggers(cur)
+    create_facet_triggers(cur)
+    create_stats_triggers(cur)
+    create_episode_triggers(cur)
+    conn.commit()
+    rebuild_fts(conn)
+    rebuild_stats(conn, commit=False)
+    rebuild_episodes(conn, commit=False)
+    conn.execute("DELETE FROM app_meta WHERE key=?", (DEFERRED_KEY,))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+    return True
+
+
+def recover_deferred(conn: sqlite3.Connection) -> bool:
+    """补做被中断的延迟维护；执行者仍在运行（导入进行中）时不动，返回是否执行。"""
+    owner = get_meta(conn, DEFERRED_KEY)
+    if not owner or deferred_owner_alive(owner):
+        return False
+    return finish_deferred(conn)
+
+
+def _m003_secondary_indexes(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_movies_updated_at ON movies(updated_at);
+        CREATE INDEX IF NOT EXISTS idx_movies_created_at ON movies(created_at);
+        CREATE INDEX IF NOT EXISTS idx_movies_year ON movies(year);
+        CREATE INDEX IF NOT EXISTS idx_movies_rating_value ON movies(rating_value);
+        CREATE INDEX IF NOT EXISTS idx_movies_rating_source ON movies(rating_source, rating_value);
+        CREATE INDEX IF NOT EXISTS idx_movies_kind ON movies(kind, updated_at);
+        CREATE INDEX IF NOT EXISTS idx_movies_country ON movies(country);
+        CREATE INDEX IF NOT EXISTS idx_movies_title ON movies(title);
+        CREATE INDEX IF NOT EXISTS idx_crawl_queue_frontier ON crawl_queue(session_id, status, enqueued_at);
+        CREATE INDEX IF NOT EXISTS idx_crawl_events_session ON crawl_events(session_id);
+        """
+    )
+
+
+def _m004_keyword_fts(cur: sqlite3.Cursor) -> None:
+    # 不支持 FTS5/trigram 的 SQLite 上跳过，关键字检索保持 LIKE；之后可用 fts-rebuild 补建。
+    # 同步触发器与按现有数据建索引在回填中进行
+    if not fts_supported(cur.connection):
+        return
+    cur.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5("
+        "title, original_title, alt_titles_text, description, actors, country,"
+        " content='movies', content_rowid='id', tokenize='trigram')"
+    )
+    _schedule_backfill(cur, "fts")
+
+
+def _m005_people(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS people (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            name_alt TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_people_name_alt ON people(name_alt);
+        CREATE TABLE IF NOT EXISTS movie_people (
+            movie_id INTEGER NOT NULL,
+            person_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            ordinal INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (movie_id, role, person_id),
+            FOREIGN KEY(movie_id) REFERENCES movies(id) ON DELETE CASCADE,
+            FOREIGN KEY(person_id) REFERENCES people(id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_movie_people_person ON movie_people(person_id, role, movie_id);
+        """
+    )
+    _schedule_backfill(cur, "people")
+
+
+def _m006_movie_tags_index(cur: sqlite3.Cursor) -> None:
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_movie_tags_tag ON movie_tags(tag_id, movie_id)")
+    # 以 tags_text 为准重建关联：早期手工编辑只改了 tags_text，且旧标签从未被移除
+    _schedule_backfill(cur, "movie_tags")
+
+
+def _m007_content_hashes(cur: sqlite3.Cursor) -> None:
+    # 旧记录哈希为空，下一次 upsert 时写入
+    _add_column(cur, "movies", "content_hash", "TEXT")
+    _add_column(cur, "movies", "html_hash", "TEXT")
+
+
+def _m008_app_meta(cur: sqlite3.Cursor) -> None:
+    # 通用键值表：写入代数（检索缓存失效）等跨进程共享的小状态
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """
+    )
+    cur.execute("INSERT OR IGNORE INTO app_meta(key, value) VALUES('write_generation', '0')")
+
+
+def _m009_facet_counts(cur: sqlite3.Cursor) -> None:
+    # 分面计数表；维护触发器与按现有数据计数在回填中进行
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS facet_counts (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+        """
+    )
+    _schedule_backfill(cur, "facets")
+
+
+def _m010_catalog_stats(cur: sqlite3.Cursor) -> None:
+    # 目录统计表；维护触发器与按现有数据统计在回填中进行
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalog_stats (
+            metric TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+    _schedule_backfill(cur, "stats")
+
+
+def _m011_change_feed(cur: sqlite3.Cursor) -> None:
+    # movies 变更流，供进程内派生索引增量刷新；记录变更的触发器在回填中创建
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS movie_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    _schedule_backfill(cur, "change_feed")
+
+
+def _m012_title_grams(cur: sqlite3.Cursor) -> None:
+    # 容错标题检索的二元组倒排表，之后由变更流增量刷新
+    cur.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS title_grams (
+            gram TEXT NOT NULL,
+            movie_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, movie_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_title_grams_movie ON title_grams(movie_id);
+        """
+    )
+    _schedule_backfill(cur, "title_grams")
+
+
+def _m013_movie_similar(cur: sqlite3.Cursor) -> None:
+    # 相似推荐近邻表，由 build-similar 构建
+    cur.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS movie_similar (
+            movie_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            similar_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (movie_id, rank)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_movie_similar_similar ON movie_similar(similar_id);
+        """
+    )
+
+
+def _m014_link_keys(cur: sqlite3.Cursor) -> None:
+    # 下载链接资源标识：加列建索引，回填解析结果并去掉同一影片内资源标识重复的链接
+    _add_column(cur, "download_links", "btih", "TEXT")
+    _add_column(cur, "download_links", "ed2k_hash", "TEXT")
+    _add_column(cur, "download_links", "size", "INTEGER")
+    cur.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_download_links_btih ON download_links(btih) WHERE btih IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_download_links_ed2k ON download_links(ed2k_hash) WHERE ed2k_hash IS NOT NULL;
+        """
+    )
+    _schedule_backfill(cur, "link_keys")
+
+
+def _m015_episodes(cur: sqlite3.Cursor) -> None:
+    # 剧集覆盖汇总与每集最佳链接；维护触发器与按现有链接计算在回填中进行
+    cur.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS movie_episodes (
+            movie_id INTEGER PRIMARY KEY,
+            episode_count INTEGER NOT NULL,
+            max_episode INTEGER NOT NULL,
+            missing_count INTEGER NOT NULL,
+            missing_ranges TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_movie_episodes_max ON movie_episodes(max_episode);
+        CREATE INDEX IF NOT EXISTS idx_movie_episodes_missing ON movie_episodes(missing_count, max_episode);
+        CREATE TABLE IF NOT EXISTS episode_links (
+            movie_id INTEGER NOT NULL,
+            episode INTEGER NOT NULL,
+            link_id INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, episode)
+        ) WITHOUT ROWID;
+        """
+    )
+    _schedule_backfill(cur, "episodes")
+
+
+def _m016_parser_version(cur: sqlite3.Cursor) -> None:
+    # 解析器版本戳：已有条目记为 0（版本未知），repair --stale-only 会重新解析；
+    # parser_version 上的索引（其条目隐含 rowid，按 (parser_version, id) 有序），列出旧版本条目只读索引
+    _add_column(cur, "movies", "parser_version", "INTEGER NOT NULL DEFAULT 0")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_movies_parser_version ON movies(parser_version)")
+
+
+def _m017_rating_sum_units(cur: sqlite3.Cursor) -> None:
+    # 评分总和改为按评分×100 的整数增减（浮点增减会累积误差），重建触发器并重算统计
+    _schedule_backfill(cur, "stats")
+
+
+def _m018_country_facet_tokens(cur: sqlite3.Cursor) -> None:
+    # 国别分面由“首个国家”改为按国家/地区拆分后分别计数（与 country 过滤同一规则），重建触发器并重算
+    _schedule_backfill(cur, "facets")
+
+
+def _m019_title_grams_tail(cur: sqlite3.Cursor) -> None:
+    # 单字关键字按二元组尾字查 title_grams（首字用主键范围）
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_title_grams_tail ON title_grams(substr(gram, 2))")
+
+
+def _m020_stats_link_updates(cur: sqlite3.Cursor) -> None:
+    # 下载链接改类别/改挂影片时维护链接统计；raw_html 不再计入字段覆盖率，重建触发器并重算
+    _schedule_backfill(cur, "stats")
+
+
+def _m021_movie_aliases(cur: sqlite3.Cursor) -> None:
+    # 去重合并时被删除条目的 detail_url -> 保留条目
+    cur.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS movie_aliases (
+            detail_url TEXT PRIMARY KEY,
+            movie_id INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_movie_aliases_movie ON movie_aliases(movie_id);
+        """
+    )
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "基础表结构", _m001_base_tables),
+    (2, "download_links.episode 与 movies.alt_titles_text", _m002_episode_and_alt_titles),
+    (3, "movies/crawl_* 二级索引", _m003_secondary_indexes),
+    (4, "关键字全文索引 movies_fts（trigram）", _m004_keyword_fts),
+    (5, "导演/演员规范化 people/movie_people", _m005_people),
+    (6, "movie_tags(tag_id, movie_id) 索引并按 tags_text 重建关联", _m006_movie_tags_index),
+    (7, "movies.content_hash/html_hash 变更检测", _m007_content_hashes),
+    (8, "app_meta 键值表与写入代数", _m008_app_meta),
+    (9, "facet_counts 分面计数（触发器增量维护）", _m009_facet_counts),
+    (10, "catalog_stats 目录统计（触发器增量维护）", _m010_catalog_stats),
+    (11, "movie_changes 变更流", _m011_change_feed),
+    (12, "title_grams 标题二元组倒排表（容错检索）", _m012_title_grams),
+    (13, "movie_similar 相似推荐近邻表", _m013_movie_similar),
+    (14, "download_links.btih/ed2k_hash/size 资源标识与索引", _m014_link_keys),
+    (15, "movie_episodes/episode_links 剧集覆盖（触发器增量维护）", _m015_episodes),
+    (16, "movies.parser_version 解析器版本戳与索引", _m016_parser_version),
+    (17, "catalog_stats 评分总和改为整数单位", _m017_rating_sum_units),
+    (18, "国别分面按国家/地区拆分计数", _m018_country_facet_tokens),
+    (19, "title_grams 尾字索引（短关键字检索）", _m019_title_grams_tail),
+    (20, "catalog_stats 链接更新触发器，字段覆盖率去掉 raw_html", _m020_stats_link_updates),
+    (21, "movie_aliases 去重合并的 detail_url", _m021_movie_aliases),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _backfill_people(conn: sqlite3.Connection) -> None:
+    # 单独游标分批读取，避免一次性载入
+    cur = conn.cursor()
+    reader = conn.cursor()
+    reader.execute("SELECT id, director, actors FROM movies WHERE director IS NOT NULL OR actors IS NOT NULL")
+    while True:
+        rows = reader.fetchmany(500)
+        if not rows:
+            break
+        for mid, director, actors in rows:
+            sync_movie_people(cur, mid, director, actors)
+
+
+def _backfill_movie_tags(conn: sqlite3.Connection) -> None:
+    reader = conn.cursor()
+    reader.execute("SELECT id, tags_text FROM movies")
+    while True:
+        rows = reader.fetchmany(500)
+        if not rows:
+            break
+        for mid, tags_text in rows:
+            set_movie_tags(conn, mid, split_tags(tags_text))
+
+
+def _backfill_link_keys(conn: sqlite3.Connection) -> None:
+    backfill_link_keys(conn)
+    dedup_movie_links(conn)
+
+
+def _recreate_triggers(
+    conn: sqlite3.Connection,
+    drop: Callable[[sqlite3.Cursor], None],
+    create: Callable[[sqlite3.Cursor], None],
+) -> None:
+    """按现行定义重建一组维护触发器；延迟导入进行中时跳过（由 finish_deferred 重建并整体重算）。"""
+    if get_meta(conn, DEFERRED_KEY):
+        return
+    cur = conn.cursor()
+    drop(cur)
+    create(cur)
+
+
+def _backfill_change_feed(conn: sqlite3.Connection) -> None:
+    # 变更流触发器不受延迟维护影响，总是按现行定义重建
+    cur = conn.cursor()
+    drop_change_feed_triggers(cur)
+    create_change_feed(cur)
+
+
+def _backfill_fts(conn: sqlite3.Connection) -> None:
+    if not fts_available(conn):
+        return
+    _recreate_triggers(conn, drop_fts_triggers, create_fts_triggers)
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')")
+
+
+def _backfill_facets(conn: sqlite3.Connection) -> None:
+    _recreate_triggers(conn, drop_facet_triggers, create_facet_triggers)
+    rebuild_facets(conn, commit=False)
+
+
+def _backfill_stats(conn: sqlite3.Connection) -> None:
+    _recreate_triggers(conn, drop_stats_triggers, create_stats_triggers)
+    rebuild_stats(conn, commit=False)
+
+
+def _backfill_episodes(conn: sqlite3.Connection) -> None:
+    _recreate_triggers(conn, drop_episode_triggers, create_episode_triggers)
+    rebuild_episodes(conn, commit=False)
+
+
+# 回填按依赖顺序执行：分面依赖 movie_tags，统计与剧集依赖去重后的下载链接。
+# 带维护触发器的派生表先按现行定义重建触发器再整体重算（两者之间没有写入）
+BACKFILLS: List[Tuple[str, Callable[[sqlite3.Connection], Any]]] = [
+    ("change_feed", _backfill_change_feed),
+    ("fts", _backfill_fts),
+    ("people", _backfill_people),
+    ("movie_tags", _backfill_movie_tags),
+    ("link_keys", _backfill_link_keys),
+    ("facets", _backfill_facets),
+    ("stats", _backfill_stats),
+    ("title_grams", lambda conn: rebuild_title_grams(conn, commit=False)),
+    ("episodes", _backfill_episodes),
+]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cur.execute("CREATE TABLE IF NOT EXISTS schema_backfills (name TEXT PRIMARY KEY)")
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    row = cur.fetchone()
+    return int(row[0] or 0)
+
+
+def migrate(conn: sqlite3.Connection, analyze: bool = True) -> List[int]:
+    """依次执行尚未应用的迁移步骤，返回本次应用的版本号列表。
+
+    每一步与其版本记录在同一事务中提交；随后执行登记的回填（每项完成后才删除登记，
+    中断后下次启动继续）与被中断的延迟导入的补建，有变更时再执行 ANALYZE 刷新统计信息。
+    """
+    version = current_version(conn)
+    conn.commit()
+    applied: List[int] = []
+    for ver, desc, step in MIGRATIONS:
+        if ver <= version:
+            continue
+        cur = conn.cursor()
+        try:
+            step(cur)
+            cur.execute("INSERT INTO schema_version(version, description) VALUES(?, ?)", (ver, desc))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            clear_tag_cache()
+            raise
+        applied.append(ver)
+    run_backfills(conn)
+    recover_deferred(conn)
+    if applied and analyze:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
+
+
+def run_backfills(conn: sqlite3.Connection) -> List[str]:
+    """执行已登记的回填，返回执行的名称列表；每项与其登记的删除同一事务提交。"""
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM schema_backfills")
+    pending = {r[0] for r in cur.fetchall()}
+    done: List[str] = []
+    for name, fn in BACKFILLS:
+        if name not in pending:
+            continue
+        try:
+            fn(conn)
+            cur.execute("DELETE FROM schema_backfills WHERE name=?", (name,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            clear_tag_cache()
+            raise
+        done.append(name)
+    return done
+
+
+# 标准查询：用于 EXPLAIN QUERY PLAN 检查，确认常用路径没有退化为全表扫描
+STANDARD_QUERIES: List[Tuple[str, str, Tuple[Any, ...]]] = [
+    (
+        "search 默认排序",
+        "SELECT id FROM movies ORDER BY updated_at DESC LIMIT 50",
+        (),
+    ),
+    (
+        "search kind=tv",
+        "SELECT id FROM movies WHERE kind = ? ORDER BY updated_at DESC LIMIT 50",
+        ("tv",),
+    ),
+    (
+        "search kind=movie*",
+        "SELECT id FROM movies WHERE kind >= ? AND kind < ? ORDER BY updated_at DESC LIMIT 50",
+        ("movie", "movif"),
+    ),
+    (
+        "search 年份范围",
+        "SELECT id FROM movies WHERE year >= ? AND year <= ? ORDER BY year DESC LIMIT 50",
+        (2015, 2024),
+    ),
+    (
+        "search 评分排序",
+        "SELECT id FROM movies WHERE rating_value >= ? ORDER BY rating_value DESC LIMIT 50",
+        (7.0,),
+    ),
+    (
+        "search 评分来源",
+        "SELECT id FROM movies WHERE rating_source = ? AND rating_value >= ? LIMIT 50",
+        ("Douban", 7.0),
+    ),
+    (
+        "search keyword（FTS）",
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? ORDER BY rank LIMIT 50",
+        ('"星际穿越"',),
+    ),
+    (
+        "search 导演精确",
+        "SELECT mp.movie_id FROM movie_people mp JOIN people p ON p.id = mp.person_id"
+        " WHERE mp.role = 'director' AND (p.name = ? OR p.name_alt = ?)",
+        ("张艺谋", "张艺谋"),
+    ),
+    (
+        "search 标签",
+        "SELECT mt.movie_id FROM movie_tags mt JOIN tags t ON t.id = mt.tag_id WHERE t.name = ?",
+        ("科幻",),
+    ),
+    (
+        "count kind=tv",
+        "SELECT COUNT(*) FROM movies WHERE kind = ?",
+        ("tv",),
+    ),
+    (
+        "count 年份范围",
+        "SELECT COUNT(*) FROM movies WHERE year >= ? AND year <= ?",
+        (2015, 2024),
+    ),
+    (
+        "frontier 队列",
+        "SELECT url FROM crawl_queue WHERE session_id=? AND status='queued' ORDER BY enqueued_at ASC LIMIT ?",
+        ("s", 1000),
+    ),
+    (
+        "session 事件",
+        "SELECT id FROM crawl_events WHERE session_id=?",
+        ("s",),
+    ),
+    (
+        "session 已访问",
+        "SELECT url FROM crawl_visits WHERE session_id=? AND kind=?",
+        ("s", "page"),
+    ),
+]
+
+
+def explain_queries(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """对 STANDARD_QUERIES 执行 EXPLAIN QUERY PLAN，标记出现无索引全表扫描的查询。"""
+    out: List[Dict[str, Any]] = []
+    cur = conn.cursor()
+    for name, sql, params in STANDARD_QUERIES:
+        try:
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        except sqlite3.OperationalError:
+            # 例如未建 FTS 表的旧环境
+            continue
+        plan = [str(row[3]) for row in cur.fetchall()]
+        full_scan = any(p.startswith("SCAN") and " USING " not in p and "VIRTUAL TABLE INDEX" not in p for p in plan)
+        out.append({"name": name, "sql": sql, "plan": plan, "full_scan": full_scan})
+    return out
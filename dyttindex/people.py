@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+# 导演/演员规范化：movies.director / movies.actors 为自由文本（演员以换行分隔），
+# 入库时拆分为 people + movie_people(role, ordinal)，用于精确/前缀检索与作品列表。
+
+ROLE_DIRECTOR = "director"
+ROLE_ACTOR = "actor"
+
+_SPLIT_RE = re.compile(r"[\n/|、，,;；]+")
+_CJK_LATIN_RE = re.compile(r"^(.*?[^\x00-\x7f])\s+([A-Za-z][A-Za-z0-9 .'\-·]*)$")
+_MAX_NAME_LEN = 60
+# 前缀检索的上界：任何以该前缀开头的名字都小于 prefix + _PREFIX_END
+_PREFIX_END = "\U0010ffff"
+
+
+def split_people(text: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+    """将导演/演员文本拆为 [(中文名或原名, 外文名)]，保持原有顺序并去重。
+
+    如 "周迅 Xun Zhou" -> ("周迅", "Xun Zhou")；纯外文名 "Tom Hanks" -> ("Tom Hanks", None)。
+    """
+    out: List[Tuple[str, Optional[str]]] = []
+    seen = set()
+    for tok in _SPLIT_RE.split(text or ""):
+        entry = " ".join(tok.replace("　", " ").replace("\xa0", " ").split())
+        if not entry or len(entry) > _MAX_NAME_LEN:
+            continue
+        m = _CJK_LATIN_RE.match(entry)
+        if m:
+            name, alt = m.group(1).strip(), m.group(2).strip()
+        else:
+            name, alt = entry, None
+        if name in seen:
+            continue
+        seen.add(name)
+        out.append((name, alt))
+    return out
+
+
+def _ensure_person(cur: sqlite3.Cursor, name: str, alt: Optional[str]) -> int:
+    cur.execute("INSERT OR IGNORE INTO people(name, name_alt) VALUES(?, ?)", (name, alt))
+    if cur.rowcount:
+        return int(cur.lastrowid)
+    cur.execute("SELECT id, name_alt FROM people WHERE name=?", (name,))
+    row = cur.fetchone()
+    if alt and not row[1]:
+        cur.execute("UPDATE people SET name_alt=? WHERE id=?", (alt, row[0]))
+    return int(row[0])
+
+
+def sync_movie_people(cur: sqlite3.Cursor, movie_id: int, director: Optional[str], actors: Optional[str]) -> None:
+    """按当前 director/actors 文本重建该影片的人员关联（不提交事务）。"""
+    rows = []
+    for role, text in ((ROLE_DIRECTOR, director), (ROLE_ACTOR, actors)):
+        for ordinal, (name, alt) in enumerate(split_people(text)):
+            rows.append((movie_id, _ensure_person(cur, name, alt), role, ordinal))
+    cur.execute("DELETE FROM movie_people WHERE movie_id=?", (movie_id,))
+    cur.executemany(
+        "INSERT OR IGNORE INTO movie_people(movie_id, person_id, role, ordinal) VALUES(?,?,?,?)",
+        rows,
+    )
+
+
+def people_filter(role: str) -> str:
+    """search_movies 使用的人员过滤子句（精确匹配中文名或外文名），参数为 (name, name)。"""
+    return (
+        " AND m.id IN (SELECT mp.movie_id FROM movie_people mp JOIN people p ON p.id = mp.person_id"
+        f" WHERE mp.role = '{role}' AND (p.name = ? OR p.name_alt = ?))"
+    )
+
+
+def people_like_filter(role: str) -> str:
+    """人员部分名字过滤子句：在 people 小表上做子串匹配再经 movie_people 索引取影片，参数为 (%片段%, %片段%)。"""
+    return (
+        " AND m.id IN (SELECT mp.movie_id FROM people p JOIN movie_people mp ON mp.person_id = p.id"
+        f" WHERE mp.role = '{role}' AND (p.name LIKE ? OR p.name_alt LIKE ?))"
+    )
+
+
+def find_people(conn: sqlite3.Connection, prefix: str, limit: int = 20) -> List[sqlite3.Row]:
+    """按名字前缀查找人员（中文名或外文名），走 name/name_alt 索引的范围扫描。"""
+    prefix = (prefix or "").strip()
+    if not prefix:
+        return []
+    hi = prefix + _PREFIX_END
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, name, name_alt FROM people WHERE name >= ? AND name < ?
+        UNION
+        SELECT id, name, name_alt FROM people WHERE name_alt >= ? AND name_alt < ?
+        ORDER BY name LIMIT ?
+        """,
+        (prefix, hi, prefix, hi, int(limit)),
+    )
+    return cur.fetchall()
+
+
+def get_filmography(conn: sqlite3.Connection, name: str, role: Optional[str] = None) -> List[sqlite3.Row]:
+    """列出某人（中文名或外文名精确匹配）参与的影片，按年份倒序。"""
+    sql = """
+        SELECT m.id, m.title, m.year, m.kind, m.rating_source, m.rating_value,
+               p.name AS person, mp.role, mp.ordinal
+        FROM people p
+        JOIN movie_people mp ON mp.person_id = p.id
+        JOIN movies m ON m.id = mp.movie_id
+        WHERE (p.name = ? OR p.name_alt = ?)
+    """
+    params: List[object] = [name, name]
+    if role:
+        sql += " AND mp.role = ?"
+        params.append(role)
+    sql += " ORDER BY m.year DESC, m.id DESC"
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    return cur.fetchall()
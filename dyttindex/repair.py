@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+
+from . import config
+from .db import delete_movies, get_meta, set_meta, upsert_movies, UPSERT_MERGED, UPSERT_UNCHANGED
+from .scraper import PARSER_VERSION, _session, decode_response, is_valid_detail, looks_garbled, parse_detail_page
+
+# 按库中 raw_html 重新解析并回填（repair）：按 id 升序分块流式读取，内存中只保留当前块的 HTML；
+# 解析分发到进程池，下一块的解析与本块的批量 upsert 重叠进行。
+# 只有 HTML 为空或疑似乱码的条目需要重抓：交给独立的并发抓取阶段（Refetcher），解析与写入不等待网络，
+# 抓回的页面在后续块写入时一并解析写回；网络会话在第一次重抓时才创建（不探测镜像、不建抓取会话）。
+#
+# stale_only 只处理 parser_version 低于 scraper.PARSER_VERSION 的条目：先从 parser_version 索引取出
+# 旧版本条目的 id（紧凑数组），再按 id 分块读取。每块写入后在 app_meta 记录已处理到的 id，
+# 中断后再次运行从断点之后继续；断点与解析器版本、kind 绑定，版本变化后自动作废。
+#
+# 清理无效条目（purge-invalid）复用同样的分块读取与进程池：每块校验完即按 id 集合批量删除
+# （delete_movies 同时删除标签、人员关联与下载链接），内存中只保留当前块，可选写出 JSONL 清单。
+
+DEFAULT_CHUNK_SIZE = 500
+_CHECKPOINT_KEY = "repair_checkpoint"
+
+PARSE_OK = "ok"
+PARSE_INVALID = "invalid"
+PARSE_REFETCH = "refetch"
+PARSE_ERROR = "error"
+
+Row = Tuple[int, str, Optional[str]]  # (id, detail_url, raw_html)
+Parsed = Tuple[int, str, str, Any]  # (id, detail_url, 状态, 解析结果或错误信息)
+Refetched = Tuple[int, str, Optional[str], Optional[str], Optional[str]]  # (id, detail_url, 库中 HTML, 新 HTML, 错误信息)
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def _scope(kind: Optional[str]) -> Tuple[str, List[Any]]:
+    if kind:
+        return " AND kind = ?", [kind]
+    return "", []
+
+
+def _start_after(conn: sqlite3.Connection, kind: Optional[str], limit: int) -> int:
+    """limit > 0 时只处理最新的 limit 条：返回起始 id（不含）。"""
+    if not limit or limit <= 0:
+        return 0
+    where, params = _scope(kind)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id FROM movies WHERE 1=1{where} ORDER BY id DESC LIMIT 1 OFFSET ?", params + [int(limit) - 1])
+    row = cur.fetchone()
+    return int(row[0]) - 1 if row else 0
+
+
+def iter_movie_chunks(
+    conn: sqlite3.Connection,
+    kind: Optional[str] = None,
+    after_id: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    columns: str = "id, detail_url, raw_html",
+) -> Iterator[List[tuple]]:
+    """按 id 升序分块读取 movies（keyset 翻页，块之间的写入不影响后续读取）。"""
+    where, params = _scope(kind)
+    cur = conn.cursor()
+    while True:
+        cur.execute(
+            f"SELECT {columns} FROM movies WHERE id > ?{where} ORDER BY id LIMIT ?",
+            [int(after_id)] + params + [int(chunk_size)],
+        )
+        rows = [tuple(r) for r in cur.fetchall()]
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def stale_ids(conn: sqlite3.Connection, kind: Optional[str] = None, version: int = PARSER_VERSION) -> "array[int]":
+    """parser_version 低于 version 的条目 id（升序）。"""
+    where, params = _scope(kind)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id FROM movies WHERE parser_version < ?{where} ORDER BY id", [int(version)] + params)
+    ids = array("q")
+    while True:
+        rows = cur.fetchmany(10000)
+        if not rows:
+            return ids
+        ids.extend(r[0] for r in rows)
+
+
+def iter_id_chunks(
+    conn: sqlite3.Connection,
+    ids: Sequence[int],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    columns: str = "id, detail_url, raw_html",
+) -> Iterator[List[tuple]]:
+    """按给定 id（升序）分块读取 movies；已不存在的 id 跳过。"""
+    cur = conn.cursor()
+    for k in range(0, len(ids), chunk_size):
+        chunk = list(ids[k:k + chunk_size])
+        cur.execute(f"SELECT {columns} FROM movies WHERE id IN ({','.join('?' * len(chunk))}) ORDER BY id", chunk)
+        rows = [tuple(r) for r in cur.fetchall()]
+        if rows:
+            yield rows
+
+
+def load_checkpoint(conn: sqlite3.Connection, kind: Optional[str] = None) -> int:
+    """返回 stale_only 修复已处理到的 id；无断点或解析器版本/kind 不一致时返回 0。"""
+    raw = get_meta(conn, _CHECKPOINT_KEY)
+    if not raw:
+        return 0
+    try:
+        cp = json.loads(raw)
+    except ValueError:
+        return 0
+    if cp.get("version") != PARSER_VERSION or cp.get("kind") != kind:
+        return 0
+    return int(cp.get("last_id") or 0)
+
+
+def _save_checkpoint(conn: sqlite3.Connection, kind: Optional[str], last_id: int) -> None:
+    set_meta(conn, _CHECKPOINT_KEY, json.dumps({"version": PARSER_VERSION, "kind": kind, "last_id": last_id}))
+    conn.commit()
+
+
+def clear_checkpoint(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM app_meta WHERE key=?", (_CHECKPOINT_KEY,))
+    conn.commit()
+
+
+def parse_row(row: Row) -> Parsed:
+    """进程池中执行：解析一条 raw_html。结果不带 raw_html（由主进程补回，减少进程间传输）。"""
+    mid, url, html = row
+    if not html or looks_garbled(html):
+        return mid, url, PARSE_REFETCH, None
+    return _parse(mid, url, html)
+
+
+def _parse(mid: int, url: str, html: str) -> Parsed:
+    try:
+        data = parse_detail_page(html, url)
+    except Exception as e:
+        return mid, url, PARSE_ERROR, str(e)
+    # 仅当为有效详情页才写回，避免错误页污染库
+    if not is_valid_detail(data):
+        return mid, url, PARSE_INVALID, None
+    data.pop("raw_html", None)
+    return mid, url, PARSE_OK, data
+
+
+class Refetcher:
+    """并发重抓详情页：有界线程池、每个主机的并发上限、失败按指数退避重试。
+
+    线程池与会话（每线程一个 requests.Session）都在第一次提交时才创建；
+    submit 不阻塞，ready() 取出已完成的结果，drain() 等待全部完成。
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        per_host: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+    ) -> None:
+        self.workers = max(1, int(workers or getattr(config, "REFETCH_WORKERS", 8)))
+        self.per_host = max(1, int(per_host or getattr(config, "REFETCH_PER_HOST", 2)))
+        self.retries = max(0, int(config.REQUEST_RETRY if retries is None else retries))
+        self.backoff = float(getattr(config, "REFETCH_BACKOFF", 1.0) if backoff is None else backoff)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._hosts: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._futures: List[Future] = []
+        # 已提交但结果尚未被取走的条目 id（stale_only 断点不能越过它们）
+        self.pending: Set[int] = set()
+
+    def _host_slot(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            sem = self._hosts.get(host)
+            if sem is None:
+                sem = self._hosts[host] = threading.Semaphore(self.per_host)
+            return sem
+
+    def _get(self, url: str) -> Tuple[Optional[str], Optional[str], bool]:
+        """单次请求，返回 (HTML, 错误信息, 是否值得重试)。"""
+        s = getattr(self._local, "s", None)
+        if s is None:
+            s = self._local.s = _session()
+        with self._host_slot(url):
+            try:
+                resp = s.get(url, timeout=config.REQUEST_TIMEOUT)
+            except Exception as e:
+                return None, f"网络错误: {e}", True
+        if resp.status_code == 200:
+            return decode_response(resp), None, False
+        # 4xx（除 429 限流）重试也不会成功
+        return None, f"status={resp.status_code}", resp.status_code == 429 or resp.status_code >= 500
+
+    def _fetch(self, mid: int, url: str, old_html: Optional[str]) -> Refetched:
+        err = None
+        for attempt in range(self.retries + 1):
+            html, err, retry = self._get(url)
+            if html is not None:
+                return mid, url, old_html, html, None
+            if not retry or attempt == self.retries:
+                break
+            # 退避期间不占用主机并发名额
+            time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+        return mid, url, old_html, None, err
+
+    def submit(self, mid: int, url: str, old_html: Optional[str]) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refetch")
+        self.pending.add(mid)
+        self._futures.append(self._pool.submit(self._fetch, mid, url, old_html))
+
+    def ready(self) -> List[Refetched]:
+        done = [f for f in self._futures if f.done()]
+        self._futures = [f for f in self._futures if not f.done()]
+        return self._take(done)
+
+    def drain(self) -> List[Refetched]:
+        done, self._futures = self._futures, []
+        wait(done)
+        return self._take(done)
+
+    def _take(self, futures: List[Future]) -> List[Refetched]:
+        out = [f.result() for f in futures]
+        for r in out:
+            self.pending.discard(r[0])
+        return out
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _pipeline(
+    chunks: Iterator[List[tuple]],
+    fn: Callable[[tuple], Any],
+    workers: int,
+) -> Iterator[Tuple[List[tuple], Iterable[Any]]]:
+    """逐块产出 (本块行, fn 的结果)。workers > 1 时在进程池中执行 fn，
+    并在调用方处理本块（写库/删除）之前提交下一块，两者重叠进行。"""
+    if workers <= 1:
+        for rows in chunks:
+            yield rows, map(fn, rows)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Executor.map 立即提交整块任务，返回的迭代器按顺序取结果
+        def _submit(rows: Optional[List[tuple]]) -> Optional[Iterable[Any]]:
+            return pool.map(fn, rows, chunksize=max(1, len(rows) // (workers * 4))) if rows else None
+
+        rows = next(chunks, None)
+        pending = _submit(rows)
+        try:
+            while rows:
+                nxt = next(chunks, None)
+                pending_next = _submit(nxt)
+                yield rows, pending
+                rows, pending = nxt, pending_next
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+
+def _progress_info(done: int, total: int, last_id: int, started: float) -> Dict[str, Any]:
+    elapsed = time.monotonic() - started
+    rate = done / elapsed if elapsed else 0.0
+    return {
+        "done": done, "total": total, "last_id": last_id, "elapsed": elapsed,
+        "rows_per_sec": rate, "eta": (total - done) / rate if rate else None,
+    }
+
+
+def _count(conn: sqlite3.Connection, kind: Optional[str], after_id: int) -> int:
+    where, params = _scope(kind)
+    cur = conn.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM movies WHERE id > ?{where}", [after_id] + params)
+    return int(cur.fetchone()[0] or 0)
+
+
+def repair_movies(
+    conn: sqlite3.Connection,
+    kind: Optional[str] = None,
+    limit: int = 0,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    stale_only: bool = False,
+    resume: bool = True,
+    refetcher: Optional[Refetcher] = None,
+) -> Dict[str, Any]:
+    """重新解析 raw_html 并批量写回，返回计数与耗时。
+
+    workers 为解析进程数（默认 CPU 核数，1 表示在当前进程内解析）；
+    progress 每写完一块回调一次（含 done/total/rows_per_sec/eta）；
+    on_event 接收逐条的问题（invalid/error/fetch_failed/still_garbled）。
+    stale_only 只处理旧版本解析器写入的条目，resume 时从上次的断点继续。
+    refetcher 为重抓阶段（默认按 config.REFETCH_* 创建）。
+    """
+    workers = max(1, int(workers or default_workers()))
+    counts: Dict[str, Any] = {
+        "fixed": 0, "unchanged": 0, "invalid": 0, "errors": 0,
+        "refetched": 0, "fetch_failed": 0, "still_garbled": 0,
+    }
+    counts["resumed_from_id"] = 0
+    if stale_only:
+        ids = stale_ids(conn, kind)
+        if limit and limit > 0:
+            ids = ids[-int(limit):]
+        skip = load_checkpoint(conn, kind) if resume else 0
+        if skip:
+            counts["resumed_from_id"] = skip
+            ids = ids[bisect.bisect_right(ids, skip):]
+        total = len(ids)
+        chunks = iter_id_chunks(conn, ids, chunk_size)
+    else:
+        after_id = _start_after(conn, kind, limit)
+        total = _count(conn, kind, after_id)
+        chunks = iter_movie_chunks(conn, kind=kind, after_id=after_id, chunk_size=chunk_size)
+    started = time.monotonic()
+    done = 0
+    refetcher = refetcher or Refetcher()
+
+    def _emit(event: Dict[str, Any]) -> None:
+        if on_event:
+            on_event(event)
+
+    def _collect(results: Iterable[Parsed], html_by_id: Dict[int, Optional[str]], records: List[Dict[str, Any]]) -> None:
+        for mid, url, status, payload in results:
+            if status == PARSE_REFETCH:
+                # 库中 HTML 为空或疑似乱码：交给重抓阶段，结果在后续块中写回
+                refetcher.submit(mid, url, html_by_id[mid])
+            elif status == PARSE_OK:
+                payload["raw_html"] = html_by_id[mid]
+                records.append(payload)
+            elif status == PARSE_INVALID:
+                counts["invalid"] += 1
+                _emit({"event": "invalid", "id": mid, "url": url})
+            else:
+                counts["errors"] += 1
+                _emit({"event": "error", "id": mid, "url": url, "message": payload})
+
+    def _refetched(fetched: List[Refetched], records: List[Dict[str, Any]]) -> None:
+        # 重抓成功用新 HTML（健壮解码），失败时退回库中 HTML
+        parsed, html_by_id = [], {}
+        for mid, url, old_html, html, err in fetched:
+            if html is None:
+                counts["fetch_failed"] += 1
+                _emit({"event": "fetch_failed", "id": mid, "url": url, "message": err})
+                html = old_html
+            else:
+                counts["refetched"] += 1
+                if looks_garbled(html):
+                    counts["still_garbled"] += 1
+                    _emit({"event": "still_garbled", "id": mid, "url": url})
+            if html:
+                html_by_id[mid] = html
+                parsed.append(_parse(mid, url, html))
+        _collect(parsed, html_by_id, records)
+
+    def _write(records: List[Dict[str, Any]]) -> None:
+        if records:
+            res = upsert_movies(conn, records, batch_size=len(records))
+            counts["unchanged"] += res[UPSERT_UNCHANGED]
+            counts["fixed"] += sum(res.values()) - res[UPSERT_UNCHANGED] - res[UPSERT_MERGED]
+
+    try:
+        for rows, results in _pipeline(chunks, parse_row, workers):
+            records: List[Dict[str, Any]] = []
+            _collect(results, {r[0]: r[2] for r in rows}, records)
+            _refetched(refetcher.ready(), records)
+            _write(records)
+            done += len(rows)
+            if stale_only:
+                # 断点不越过仍在重抓的条目，中断后它们会被重新处理
+                _save_checkpoint(conn, kind, min(min(refetcher.pending) - 1, rows[-1][0]) if refetcher.pending else rows[-1][0])
+            if progress:
+                progress(_progress_info(done, total, rows[-1][0], started))
+        records = []
+        _refetched(refetcher.drain(), records)
+        _write(records)
+    finally:
+        refetcher.close()
+    if stale_only:
+        clear_checkpoint(conn)
+    elapsed = time.monotonic() - started
+    counts["rows"] = done
+    counts["workers"] = workers
+    counts["elapsed"] = round(elapsed, 2)
+    counts["rows_per_sec"] = round(done / elapsed, 1) if elapsed else 0.0
+    return counts
+
+
+def check_row(row: Row) -> Tuple[int, str, Optional[str]]:
+    """进程池中执行：返回 (id, detail_url, 无效原因)，有效详情页的原因为 None。"""
+    mid, url, html = row
+    if not html:
+        return mid, url, "empty_html"
+    try:
+        data = parse_detail_page(html, url)
+    except Exception as e:
+        return mid, url, f"parse_error: {e}"
+    return mid, url, None if is_valid_detail(data) else "invalid"
+
+
+def purge_invalid(
+    conn: sqlite3.Connection,
+    limit: int = 0,
+    dry_run: bool = True,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    report_path: Optional[str] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """校验库中条目的 raw_html，删除（dry_run 时只统计）无效详情页，返回计数与耗时。
+
+    limit > 0 时只检查最新的 limit 条；report_path 写出 {id, detail_url, reason} 的 JSONL 清单。
+    """
+    workers = max(1, int(workers or default_workers()))
+    after_id = _start_after(conn, None, limit)
+    total = _count(conn, None, after_id)
+    counts: Dict[str, Any] = {"checked": 0, "invalid": 0, "deleted": 0}
+    started = time.monotonic()
+    report = open(report_path, "w", encoding="utf-8") if report_path else None
+    try:
+        chunks = iter_movie_chunks(conn, after_id=after_id, chunk_size=chunk_size)
+        for rows, results in _pipeline(chunks, check_row, workers):
+            bad: List[int] = []
+            for mid, url, reason in results:
+                if reason is None:
+                    continue
+                bad.append(mid)
+                if report:
+                    report.write(json.dumps({"id": mid, "detail_url": url, "reason": reason}, ensure_ascii=False) + "\n")
+                if on_event:
+                    on_event({"event": "invalid", "id": mid, "url": url, "reason": reason})
+            counts["checked"] += len(rows)
+            counts["invalid"] += len(bad)
+            if bad and not dry_run:
+                counts["deleted"] += delete_movies(conn, bad)
+            if progress:
+                progress(_progress_info(counts["checked"], total, rows[-1][0], started))
+    finally:
+        if report:
+            report.close()
+    elapsed = time.monotonic() - started
+    counts["workers"] = workers
+    counts["elapsed"] = round(elapsed, 2)
+    return counts
@@ -10,7 +10,11 @@ import requests
 from bs4 import BeautifulSoup
 
 from . import config
-from .db import get_conn, upsert_movie, create_db, ensure_session, get_visited, mark_visited, append_event, enqueue_urls, get_frontier_urls, mark_queue_done
+from .db import get_conn, upsert_movie, merged_movie_ids, create_db, ensure_session, get_visited, mark_visited, append_event, enqueue_urls, get_frontier_urls, mark_queue_done
+
+# 解析器版本：parse_detail_page 的字段抽取或 kind 分类规则有变化时递增。
+# 入库时写入 movies.parser_version，repair --stale-only 只重新解析版本较旧的条目。
+PARSER_VERSION = 1
 
 FIELD_PATTERNS = {
     "alias": re.compile(r"^◎\s*(译名|又名)\s*(.*)$"),
@@ -231,6 +235,7 @@ def parse_detail_page(html: str, url: str) -> dict:
         "tags": [],
         "download_links": _collect_download_links(zoom),
         "alt_titles": [],
+        "parser_version": PARSER_VERSION,
     }
 
     # 辅助：拆分名称与判定是否含中文
@@ -660,6 +665,12 @@ class DyttScraper:
                     except Exception:
                         pass
                     continue
+            if merged_movie_ids(self.conn, [cur]):
+                # 去重时已并入其他条目的详情页：不再抓取
+                _emit({"event": "detail_merged", "detail_url": cur})
+                seen.add(cur)
+                mark_visited(self.conn, self.session_id, cur, "detail")
+                continue
             try:
                 resp = self.s.get(cur, timeout=getattr(config, "REQUEST_TIMEOUT", 15))
                 if resp.status_code != 200:
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import heapq
+import math
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .changes import OP_DELETE, SIMILAR_SEQ_KEY, changes_since, feed_has_gap, latest_change_seq
+from .db import SEARCH_COLUMNS, get_meta, set_meta, split_tags
+from .people import split_people
+from .text import country_tokens
+
+# 相似推荐：每部影片表示为稀疏特征向量（标签、导演、主演、国别、五年一档的年份段），
+# 特征权重 = 类别权重 × idf，按余弦相似度取前 k 名写入 movie_similar，请求时按主键一次读取。
+# 候选只从“文档频率不超过上限”的特征倒排表中产生（常见标签、国别、年份段只参与打分；
+# 没有稀有特征的影片退而扫描其最稀有特征倒排表按权重降序的前 _FALLBACK_SCAN 项），
+# 构建代价与稀有特征倒排表长度平方和成正比，而非 O(n²)。
+# 增量构建消费 movie_changes：重算变更影片、其新旧近邻的列表。
+
+SIMILAR_TABLE = "movie_similar"
+DEFAULT_K = 20
+FEATURE_WEIGHTS = {"tag": 1.0, "dir": 2.0, "act": 1.0, "country": 0.5, "year": 0.5}
+# 参与相似度计算的主演数
+_MAX_ACTORS = 5
+# 文档频率超过该比例（且超过下限条数）的特征不用于生成候选
+_CANDIDATE_MAX_DF_RATIO = 0.01
+_CANDIDATE_MAX_DF_FLOOR = 100
+# 每部影片按部分点积取前若干候选再精算余弦
+_CANDIDATES = 200
+# 只有常见特征的影片从最稀有特征倒排表的前若干项（按权重降序）取候选
+_FALLBACK_SCAN = 1000
+_LOAD_SQL = "SELECT id, tags_text, director, actors, country, year FROM movies"
+
+Vector = Dict[str, float]
+
+
+def create_similar(cur: sqlite3.Cursor) -> None:
+    cur.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS {SIMILAR_TABLE} (
+            movie_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            similar_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (movie_id, rank)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_movie_similar_similar ON {SIMILAR_TABLE}(similar_id);
+        """
+    )
+
+
+def _first_country(country: Optional[str]) -> Optional[str]:
+    tokens = country_tokens(country)
+    return tokens[0] if tokens else None
+
+
+def movie_features(
+    tags_text: Optional[str],
+    director: Optional[str],
+    actors: Optional[str],
+    country: Optional[str],
+    year: Optional[int],
+) -> List[str]:
+    feats = ["tag:" + t for t in split_tags(tags_text)]
+    feats += ["dir:" + name for name, _ in split_people(director)]
+    feats += ["act:" + name for name, _ in split_people(actors)[:_MAX_ACTORS]]
+    c = _first_country(country)
+    if c:
+        feats.append("country:" + c)
+    if year:
+        feats.append(f"year:{int(year) // 5 * 5}")
+    return list(dict.fromkeys(feats))
+
+
+class SimilarityModel:
+    """全库特征与倒排表；向量按 idf 加权并归一化。"""
+
+    def __init__(self, raw: Dict[int, List[str]]) -> None:
+        self.df: Dict[str, int] = defaultdict(int)
+        for feats in raw.values():
+            for f in feats:
+                self.df[f] += 1
+        n = max(len(raw), 1)
+        self.max_df = max(_CANDIDATE_MAX_DF_FLOOR, int(n * _CANDIDATE_MAX_DF_RATIO))
+        self.vectors: Dict[int, Vector] = {}
+        # 特征 -> [(影片 id, 权重)]
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        self.max_weight: Dict[str, float] = defaultdict(float)
+        for mid, feats in raw.items():
+            vec = {}
+            for f in feats:
+                vec[f] = FEATURE_WEIGHTS[f.split(":", 1)[0]] * math.log(1.0 + n / self.df[f])
+            norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+            self.vectors[mid] = vec = {f: w / norm for f, w in vec.items()}
+            for f, w in vec.items():
+                self.postings[f].append((mid, w))
+                if w > self.max_weight[f]:
+                    self.max_weight[f] = w
+        # 常见特征的倒排表按权重降序，回退扫描只取前缀
+        for f, plist in self.postings.items():
+            if self.df[f] > self.max_df:
+                plist.sort(key=lambda x: -x[1])
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "SimilarityModel":
+        raw: Dict[int, List[str]] = {}
+        cur = conn.cursor()
+        cur.execute(_LOAD_SQL)
+        while True:
+            rows = cur.fetchmany(5000)
+            if not rows:
+                break
+            for r in rows:
+                raw[int(r[0])] = movie_features(r[1], r[2], r[3], r[4], r[5])
+        return cls(raw)
+
+    def neighbors(self, mid: int, k: int = DEFAULT_K) -> List[Tuple[int, float]]:
+        """返回 [(相似影片 id, 余弦相似度)]，按相似度降序。"""
+        vec = self.vectors.get(mid)
+        if not vec:
+            return []
+        partial: Dict[int, float] = defaultdict(float)
+        scanned = set()
+
+        def _scan(f: str, w: float) -> None:
+            for other, ow in self.postings[f]:
+                partial[other] += w * ow
+            scanned.add(f)
+
+        for f, w in vec.items():
+            if self.df[f] <= self.max_df:
+                _scan(f, w)
+        partial.pop(mid, None)
+        # 只扫了前缀的回退特征：前缀之外的候选另补其贡献，其上界为前缀末项的权重
+        head_f: Optional[str] = None
+        head_ids: Set[int] = set()
+        head_bound = 0.0
+        if len(partial) < k:
+            # 只有常见特征的影片：候选不足时再扫描其中最稀有的一个，只取按权重降序的前缀，
+            # 否则每部这样的影片都要扫一遍与库规模同阶的倒排表，整体退化为 O(n²)
+            rest = sorted((f for f in vec if f not in scanned), key=lambda f: self.df[f])
+            if rest:
+                f = rest[0]
+                plist = self.postings[f]
+                head = plist[:_FALLBACK_SCAN]
+                for other, ow in head:
+                    partial[other] += vec[f] * ow
+                scanned.add(f)
+                if len(plist) > len(head):
+                    head_f, head_ids = f, {other for other, _ in head}
+                    head_bound = vec[f] * head[-1][1]
+                partial.pop(mid, None)
+        if not partial:
+            return []
+        # 部分点积只含已扫描的特征，再补上其余特征的贡献即为完整余弦；
+        # 其余特征的贡献有上界，候选按部分点积降序精算，部分点积加上界已进不了前 k 名时停止
+        common = [(f, w) for f, w in vec.items() if f not in scanned]
+        bound = sum(w * self.max_weight[f] for f, w in common) + head_bound
+        cands = heapq.nlargest(_CANDIDATES, partial.items(), key=lambda x: x[1])
+        top: List[Tuple[float, int]] = []
+        for other, s in cands:
+            if len(top) >= k and s + bound < top[0][0]:
+                break
+            ov = self.vectors[other]
+            if common:
+                s += sum(w * ov.get(f, 0.0) for f, w in common)
+            if head_f is not None and other not in head_ids:
+                s += vec[head_f] * ov.get(head_f, 0.0)
+            item = (round(s, 4), -other)
+            if len(top) < k:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+        return [(-neg, s) for s, neg in sorted(top, reverse=True)]
+
+
+def _write(cur: sqlite3.Cursor, mid: int, nbrs: List[Tuple[int, float]], replace: bool = True) -> None:
+    if replace:
+        cur.execute(f"DELETE FROM {SIMILAR_TABLE} WHERE movie_id=?", (mid,))
+    cur.executemany(
+        f"INSERT INTO {SIMILAR_TABLE}(movie_id, rank, similar_id, score) VALUES (?, ?, ?, ?)",
+        [(mid, i, other, score) for i, (other, score) in enumerate(nbrs, 1)],
+    )
+
+
+def _compute(
+    conn: sqlite3.Connection,
+    model: SimilarityModel,
+    ids: Iterable[int],
+    k: int,
+    progress: Optional[Callable[[int], None]] = None,
+    replace: bool = True,
+) -> int:
+    cur = conn.cursor()
+    n = 0
+    for mid in ids:
+        _write(cur, mid, model.neighbors(mid, k), replace)
+        n += 1
+        if n % 5000 == 0:
+            conn.commit()
+            if progress:
+                progress(n)
+    return n
+
+
+def rebuild_similar(
+    conn: sqlite3.Connection,
+    k: int = DEFAULT_K,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, float]:
+    """全量重建近邻表。"""
+    started = time.monotonic()
+    seq = latest_change_seq(conn)
+    cur = conn.cursor()
+    create_similar(cur)
+    model = SimilarityModel.load(conn)
+    cur.execute(f"DELETE FROM {SIMILAR_TABLE}")
+    n = _compute(conn, model, sorted(model.vectors), k, progress, replace=False)
+    set_meta(conn, SIMILAR_SEQ_KEY, seq)
+    conn.commit()
+    return {"movies": n, "full": True, "elapsed": round(time.monotonic() - started, 2)}
+
+
+def refresh_similar(
+    conn: sqlite3.Connection,
+    k: int = DEFAULT_K,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, float]:
+    """按变更流增量构建；未构建过或变更流断档时全量重建。
+
+    重算范围：变更影片本身、此前把它列为近邻的影片，以及它新的近邻（它可能进入对方的前 k 名）。
+    idf 权重依赖全库，每次运行都要重新载入整个特征模型（全表读取并建倒排，约每 10 万部 2 秒，
+    内存与特征总数同阶），这部分与变更条数无关：宜在爬取/导入之后批量运行一次，不要每次写入后调用；
+    没有待处理的变更时直接返回，不载入模型。
+    """
+    seq = int(get_meta(conn, SIMILAR_SEQ_KEY, "-1") or -1)
+    if seq < 0 or feed_has_gap(conn, seq):
+        return rebuild_similar(conn, k, progress)
+    started = time.monotonic()
+    touched: Dict[int, str] = {}
+    while True:
+        batch = changes_since(conn, seq)
+        if not batch:
+            break
+        for _, mid, op in batch:
+            touched[mid] = op
+        seq = batch[-1][0]
+    if not touched:
+        return {"movies": 0, "full": False, "elapsed": round(time.monotonic() - started, 2)}
+    cur = conn.cursor()
+    ids = list(touched)
+    affected: Set[int] = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(
+            f"SELECT DISTINCT movie_id FROM {SIMILAR_TABLE} WHERE similar_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        affected.update(int(r[0]) for r in cur.fetchall())
+    dead = [mid for mid, op in touched.items() if op == OP_DELETE]
+    for mid in dead:
+        cur.execute(f"DELETE FROM {SIMILAR_TABLE} WHERE movie_id=?", (mid,))
+    model = SimilarityModel.load(conn)
+    live = [mid for mid in ids if mid in model.vectors]
+    for mid in live:
+        nbrs = model.neighbors(mid, k)
+        _write(cur, mid, nbrs)
+        affected.update(other for other, _ in nbrs)
+    affected = {mid for mid in affected if mid in model.vectors} - set(live)
+    n = len(live) + _compute(conn, model, sorted(affected), k, progress)
+    set_meta(conn, SIMILAR_SEQ_KEY, seq)
+    conn.commit()
+    return {"movies": n, "full": False, "elapsed": round(time.monotonic() - started, 2)}
+
+
+def get_similar(conn: sqlite3.Connection, movie_id: int, limit: int = 10) -> List[sqlite3.Row]:
+    """读取预计算的相似影片（检索结果列 + score），按相似度降序。"""
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT {SEARCH_COLUMNS}, s.score FROM {SIMILAR_TABLE} s JOIN movies m ON m.id = s.similar_id"
+        f" WHERE s.movie_id = ? ORDER BY s.rank LIMIT ?",
+        (int(movie_id), int(limit)),
+    )
+    return cur.fetchall()
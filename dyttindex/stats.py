@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+from .facets import FACET_KIND, FACET_TAG, FACET_TABLE, rebuild_facets
+
+# 目录统计：catalog_stats(metric, value) 由 movies / download_links 上的触发器增量维护，
+# stats 命令与 /api/stats 只读这张小表（类别与标签分布复用 facet_counts），--full 时精确重算。
+#
+# 指标命名：
+#   movies                 影片总数
+#   has:<字段>             字段非空的影片数
+#   rated:<来源>           有评分的影片数（按评分来源）
+#   rating_sum_x100        评分×100 取整后的总和（求平均）；整数增减不会像浮点那样累积误差
+#   links / links:<类型>   下载链接数
+#   movies_with_links      含下载链接的影片数
+#   dup_groups/dup_extra   同名同年份的重复组数 / 多出的条目数
+
+STATS_TABLE = "catalog_stats"
+COVERAGE_FIELDS = [
+    "original_title", "year", "country", "language", "director", "actors",
+    "rating_value", "description", "cover_url",
+]
+
+RATING_SUM = "rating_sum_x100"
+RATING_SCALE = 100
+
+_TRIGGERS = [
+    "stats_movies_ai", "stats_movies_ad", "stats_movies_au",
+    "stats_links_ai", "stats_links_ad", "stats_links_au",
+]
+
+
+def rating_units_expr(col: str) -> str:
+    return f"CAST(round({col} * {RATING_SCALE}) AS INTEGER)"
+
+
+def _add_sql(metric: str, delta: str, cond: str = "1") -> str:
+    return (
+        f"INSERT INTO {STATS_TABLE}(metric, value) SELECT k, {delta} FROM (SELECT {metric} AS k) WHERE k IS NOT NULL AND ({cond})"
+        f" ON CONFLICT(metric) DO UPDATE SET value = value + excluded.value;"
+    )
+
+
+def _movie_metric_sql(row: str, sign: str) -> List[str]:
+    """row 为 new/old；sign 为 '+'/'-'。"""
+    one = f"{sign}1"
+    out = [_add_sql("'movies'", one)]
+    for f in COVERAGE_FIELDS:
+        out.append(_add_sql(f"'has:{f}'", one, f"{row}.{f} IS NOT NULL AND {row}.{f} != ''"))
+    out.append(_add_sql(f"'rated:' || COALESCE({row}.rating_source, '')", one, f"{row}.rating_value IS NOT NULL"))
+    out.append(_add_sql(f"'{RATING_SUM}'", f"{sign}{rating_units_expr(row + '.rating_value')}", f"{row}.rating_value IS NOT NULL"))
+    return out
+
+
+def _dup_sql(row: str, inserted: bool, cond: str = "1") -> List[str]:
+    """同名同年份重复计数；在行已插入之后 / 已删除之后执行。"""
+    # +year 排除年份索引，确保按标题索引定位
+    same = f"(SELECT COUNT(*) FROM movies WHERE title = {row}.title AND +year IS {row}.year)"
+    if inserted:
+        return [
+            _add_sql("'dup_groups'", "1", f"{cond} AND {same} = 2"),
+            _add_sql("'dup_extra'", "1", f"{cond} AND {same} >= 2"),
+        ]
+    return [
+        _add_sql("'dup_groups'", "-1", f"{cond} AND {same} = 1"),
+        _add_sql("'dup_extra'", "-1", f"{cond} AND {same} >= 1"),
+    ]
+
+
+def create_stats_triggers(cur: sqlite3.Cursor) -> None:
+    ins = "\n".join(_movie_metric_sql("new", "+") + _dup_sql("new", True))
+    dele = "\n".join(_movie_metric_sql("old", "-") + _dup_sql("old", False))
+    # 更新时旧行已不存在：标题/年份未变则重复计数不受影响
+    moved = "(old.title IS NOT new.title OR old.year IS NOT new.year)"
+    upd = "\n".join(
+        _movie_metric_sql("old", "-") + _dup_sql("old", False, moved)
+        + _movie_metric_sql("new", "+") + _dup_sql("new", True, moved)
+    )
+    cols = ", ".join(["title", "rating_source"] + COVERAGE_FIELDS)
+    link_ins = "\n".join([
+        _add_sql("'links'", "1"),
+        _add_sql("'links:' || COALESCE(new.kind, '')", "1"),
+        _add_sql("'movies_with_links'", "1",
+                 "NOT EXISTS (SELECT 1 FROM download_links WHERE movie_id = new.movie_id AND id != new.id)"),
+    ])
+    link_del = "\n".join([
+        _add_sql("'links'", "-1"),
+        _add_sql("'links:' || COALESCE(old.kind, '')", "-1"),
+        _add_sql("'movies_with_links'", "-1",
+                 "NOT EXISTS (SELECT 1 FROM download_links WHERE movie_id = old.movie_id)"),
+    ])
+    # 链接重新分类（_sync_links 更新 kind）或改挂到其他影片：先按旧值减、再按新值加
+    link_moved = "old.movie_id IS NOT new.movie_id"
+    link_upd = "\n".join([
+        _add_sql("'links:' || COALESCE(old.kind, '')", "-1"),
+        _add_sql("'links:' || COALESCE(new.kind, '')", "1"),
+        _add_sql("'movies_with_links'", "-1",
+                 f"{link_moved} AND NOT EXISTS (SELECT 1 FROM download_links WHERE movie_id = old.movie_id)"),
+        _add_sql("'movies_with_links'", "1",
+                 f"{link_moved} AND NOT EXISTS"
+                 " (SELECT 1 FROM download_links WHERE movie_id = new.movie_id AND id != new.id)"),
+    ])
+    cur.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS stats_movies_ai AFTER INSERT ON movies BEGIN
+            {ins}
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_movies_ad AFTER DELETE ON movies BEGIN
+            {dele}
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_movies_au AFTER UPDATE OF {cols} ON movies BEGIN
+            {upd}
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_links_ai AFTER INSERT ON download_links BEGIN
+            {link_ins}
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_links_ad AFTER DELETE ON download_links BEGIN
+            {link_del}
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_links_au AFTER UPDATE OF kind, movie_id ON download_links BEGIN
+            {link_upd}
+        END;
+        """
+    )
+
+
+def drop_stats_triggers(cur: sqlite3.Cursor) -> None:
+    for name in _TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_stats(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            metric TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+    create_stats_triggers(cur)
+
+
+def rebuild_stats(conn: sqlite3.Connection, commit: bool = True) -> None:
+    """全表聚合精确重算 catalog_stats（连同 facet_counts）。"""
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM {STATS_TABLE}")
+    has = ", ".join(
+        f"SUM(CASE WHEN {f} IS NOT NULL AND {f} != '' THEN 1 ELSE 0 END)" for f in COVERAGE_FIELDS
+    )
+    cur.execute(f"SELECT COUNT(*), {has}, SUM({rating_units_expr('rating_value')}) FROM movies")
+    row = cur.fetchone()
+    rows: List[Tuple[str, Any]] = [("movies", row[0] or 0), (RATING_SUM, row[-1] or 0)]
+    rows += [(f"has:{f}", row[i + 1] or 0) for i, f in enumerate(COVERAGE_FIELDS)]
+    cur.execute(
+        "SELECT 'rated:' || COALESCE(rating_source, ''), COUNT(*) FROM movies"
+        " WHERE rating_value IS NOT NULL GROUP BY rating_source"
+    )
+    rows += cur.fetchall()
+    cur.execute("SELECT 'links:' || COALESCE(kind, ''), COUNT(*) FROM download_links GROUP BY kind")
+    links = cur.fetchall()
+    rows += links
+    rows.append(("links", sum(r[1] for r in links)))
+    cur.execute("SELECT COUNT(DISTINCT movie_id) FROM download_links")
+    rows.append(("movies_with_links", cur.fetchone()[0] or 0))
+    cur.execute(
+        "SELECT COUNT(*), COALESCE(SUM(c - 1), 0) FROM"
+        " (SELECT COUNT(*) AS c FROM movies GROUP BY title, year HAVING c > 1)"
+    )
+    groups, extra = cur.fetchone()
+    rows += [("dup_groups", groups or 0), ("dup_extra", extra or 0)]
+    cur.executemany(f"INSERT INTO {STATS_TABLE}(metric, value) VALUES(?, ?)", rows)
+    rebuild_facets(conn, commit=False)
+    if commit:
+        conn.commit()
+
+
+def _pct(n: float, total: float) -> float:
+    return round(100.0 * n / total, 1) if total else 0.0
+
+
+def get_stats(conn: sqlite3.Connection, top_tags: int = 10) -> Dict[str, Any]:
+    """读取增量维护的统计；与 rebuild_stats 后的结果一致。"""
+    cur = conn.cursor()
+    cur.execute(f"SELECT metric, value FROM {STATS_TABLE}")
+    m = {r[0]: r[1] for r in cur.fetchall()}
+    total = int(m.get("movies", 0))
+
+    def by_prefix(prefix: str) -> Dict[str, int]:
+        items = [(k[len(prefix):] or "未知", int(v)) for k, v in m.items() if k.startswith(prefix) and v]
+        return dict(sorted(items, key=lambda x: -x[1]))
+
+    rated = by_prefix("rated:")
+    rated_total = sum(rated.values())
+    links_total = int(m.get("links", 0))
+    with_links = int(m.get("movies_with_links", 0))
+    cur.execute(f"SELECT value, n FROM {FACET_TABLE} WHERE facet = ? AND n > 0 ORDER BY n DESC", (FACET_KIND,))
+    kinds = {r[0]: r[1] for r in cur.fetchall()}
+    cur.execute(
+        f"SELECT value, n FROM {FACET_TABLE} WHERE facet = ? AND n > 0 ORDER BY n DESC LIMIT ?",
+        (FACET_TAG, int(top_tags)),
+    )
+    tags = [{"tag": r[0], "n": r[1]} for r in cur.fetchall()]
+    return {
+        "total": total,
+        "kinds": kinds,
+        "rating": {
+            "rated": rated_total,
+            "coverage": _pct(rated_total, total),
+            "avg": round(m.get(RATING_SUM, 0) / RATING_SCALE / rated_total, 2) if rated_total else 0.0,
+            "by_source": rated,
+        },
+        "links": {
+            "total": links_total,
+            "by_kind": by_prefix("links:"),
+            "movies_with_links": with_links,
+            "coverage": _pct(with_links, total),
+            "avg_per_movie": round(links_total / with_links, 2) if with_links else 0.0,
+        },
+        "fields": {
+            f: {"n": int(m.get(f"has:{f}", 0)), "pct": _pct(m.get(f"has:{f}", 0), total)} for f in COVERAGE_FIELDS
+        },
+        "duplicates": {"groups": int(m.get("dup_groups", 0)), "extra_rows": int(m.get("dup_extra", 0))},
+        "top_tags": tags,
+    }
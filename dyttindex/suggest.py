@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .changes import changes_since, feed_has_gap, latest_change_seq
+from .db import split_tags
+from .people import split_people
+from .text import BOOK_RE, compact_key
+
+# 搜索框联想：把标题、又名、导演、演员与标签的规范化前缀键放进一个有序列表，前缀查询即二分定位区间，
+# 区间内按得分取前 k 名。影片条目按评分与年份（新片优先）计分，人名/标签按出现的影片数计分。
+# 区间很大的前缀（单字、"th"、"the" 等）另存“前 _TOP_K 名”表，查询直接切片：1–2 个字符的前缀载入时
+# 预先计算，更长的在首次查询时计算；增量刷新时就地更新，表内条目得分下降或被移除时丢弃该表，下次查询重算。
+# 通过 movie_changes 变更流增量刷新：记录每部影片贡献的条目，变更时先撤回再重新加入；
+# 变更较多或变更流出现断档时全量重载。载入与刷新由网页服务的后台线程进行，suggest() 只读。
+
+SUGGEST_TYPES = ("title", "director", "actor", "tag")
+# 每部影片参与联想的演员数（主演在前）
+_MAX_ACTORS = 8
+# 增量刷新涉及的影片超过该数量时全量重载
+_RELOAD_THRESHOLD = 20000
+_CACHE_SIZE = 2048
+# 前 k 名表：保存的名次数（接口 k 的上限）、区间条目数下限、载入时预先计算的前缀长度与表数上限
+_TOP_K = 50
+_TOP_MIN_RANGE = 2000
+_TOP_PRELOAD_LEN = 2
+_TOP_MAX_LISTS = 20000
+_LOAD_SQL = (
+    "SELECT id, title, original_title, alt_titles_text, director, actors, tags_text, rating_value, year FROM movies"
+)
+
+Entry = Tuple[str, str, Any]  # (前缀键, 类型, 影片 id 或名称)
+Ranked = Tuple[float, Entry]  # (得分, 代表条目)
+
+
+def _rank(item: Ranked) -> Tuple[float, str]:
+    return item[0], str(item[1][2])
+
+
+def suggest_key(text: Optional[str]) -> str:
+    return compact_key(text)
+
+
+def _keys(text: Optional[str]) -> List[str]:
+    """整体的键，外文名另加从每个单词起始的键（输入 "earth" 可联想到 "The Wandering Earth"）。"""
+    words = unicodedata.normalize("NFKC", text or "").split()
+    out = []
+    for i in range(len(words)):
+        k = suggest_key(" ".join(words[i:]))
+        if k and k not in out:
+            out.append(k)
+    return out
+
+
+def display_title(title: Optional[str]) -> str:
+    """发布标题中的片名：有书名号时取书名号内名称。"""
+    t = (title or "").strip()
+    m = BOOK_RE.search(t)
+    return m.group(1).strip() if m else t
+
+
+def movie_score(rating: Optional[float], year: Optional[int], now_year: Optional[int] = None) -> float:
+    """评分占 0.7、新近程度占 0.3（30 年线性衰减）。"""
+    now_year = now_year or time.localtime().tm_year
+    r = max(0.0, min(float(rating or 0.0), 10.0)) / 10.0
+    recency = max(0.0, 1.0 - (now_year - int(year)) / 30.0) if year else 0.0
+    return round(0.7 * r + 0.3 * min(recency, 1.0), 4)
+
+
+def _count_score(n: int) -> float:
+    """出现于 1000 部影片即满分。"""
+    return round(min(1.0, math.log10(1 + n) / 3.0), 4)
+
+
+class SuggestIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.seq = -1
+        self.loaded_at: Optional[float] = None
+        self._entries: List[Entry] = []
+        # 影片 id -> (显示名, 得分)
+        self._movies: Dict[int, Tuple[str, float]] = {}
+        # 影片 id -> 该影片贡献的条目（撤回用）
+        self._contrib: Dict[int, List[Entry]] = {}
+        # (类型, 名称) -> 影片数（计分用）；人名/标签条目 -> 引用它的影片数（为 0 时移出有序列表）
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._refs: Dict[Entry, int] = {}
+        # (类型, 名称) -> 人名/标签当前的前缀键
+        self._name_keys: Dict[Tuple[str, str], Set[str]] = {}
+        # 前缀 -> {类型过滤（None 为不限）: 按得分降序、每个对象一条的前 _TOP_K 名}
+        self._top: Dict[str, Dict[Optional[str], List[Ranked]]] = {}
+        # (类型, 影片 id 或名称) -> 其所在前 k 名表的前缀
+        self._top_members: Dict[Tuple[str, Any], Set[str]] = {}
+        self._cache: "OrderedDict[Tuple[str, int, Optional[str]], List[Dict[str, Any]]]" = OrderedDict()
+
+    def _movie_entries(self, row: sqlite3.Row) -> List[Entry]:
+        mid = int(row[0])
+        out: List[Entry] = []
+        names = [display_title(row[1]), row[2]] + split_tags(row[3])
+        for name in names:
+            for k in _keys(name):
+                out.append((k, "title", mid))
+        for role, text, cap in (("director", row[4], None), ("actor", row[5], _MAX_ACTORS)):
+            for name, alt in split_people(text)[:cap]:
+                for k in _keys(name) + _keys(alt):
+                    out.append((k, role, name))
+        for tag in split_tags(row[6]):
+            for k in _keys(tag):
+                out.append((k, "tag", tag))
+        return list(dict.fromkeys(out))
+
+    def _add(self, row: sqlite3.Row, entries: List[Entry]) -> List[Entry]:
+        """登记影片条目，返回需新增到有序列表的条目。"""
+        mid = int(row[0])
+        self._movies[mid] = (display_title(row[1]), movie_score(row[7], row[8]))
+        self._contrib[mid] = entries
+        new: List[Entry] = []
+        for ck in {(e[1], e[2]) for e in entries if e[1] != "title"}:
+            self._counts[ck] = self._counts.get(ck, 0) + 1
+        for e in entries:
+            if e[1] == "title":
+                new.append(e)
+                continue
+            n = self._refs.get(e, 0)
+            self._refs[e] = n + 1
+            if n == 0:
+                new.append(e)
+                self._name_keys.setdefault((e[1], e[2]), set()).add(e[0])
+        return new
+
+    def _remove(self, mid: int) -> None:
+        entries = self._contrib.pop(mid, [])
+        self._movies.pop(mid, None)
+        for ck in {(e[1], e[2]) for e in entries if e[1] != "title"}:
+            n = self._counts.get(ck, 0) - 1
+            if n > 0:
+                self._counts[ck] = n
+            else:
+                self._counts.pop(ck, None)
+        for e in entries:
+            if e[1] != "title":
+                n = self._refs.get(e, 0) - 1
+                if n > 0:
+                    self._refs[e] = n
+                    continue
+                self._refs.pop(e, None)
+                keys = self._name_keys.get((e[1], e[2]))
+                if keys is not None:
+                    keys.discard(e[0])
+                    if not keys:
+                        del self._name_keys[(e[1], e[2])]
+            i = bisect.bisect_left(self._entries, e)
+            if i < len(self._entries) and self._entries[i] == e:
+                del self._entries[i]
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """全量载入；先记下变更流位置，载入期间的写入会在下次刷新时重放（幂等）。"""
+        seq = latest_change_seq(conn)
+        self._movies, self._contrib, self._counts, self._refs = {}, {}, {}, {}
+        self._name_keys, self._top, self._top_members = {}, {}, {}
+        entries: List[Entry] = []
+        cur = conn.cursor()
+        cur.execute(_LOAD_SQL)
+        while True:
+            rows = cur.fetchmany(5000)
+            if not rows:
+                break
+            for r in rows:
+                entries.extend(self._add(r, self._movie_entries(r)))
+        self._entries = sorted(entries)
+        self._preload_top()
+        self._cache.clear()
+        self.seq = seq
+        self.loaded_at = time.time()
+
+    def refresh(self, conn: sqlite3.Connection) -> int:
+        """按变更流增量刷新，返回处理的影片数。"""
+        with self._lock:
+            if self.seq < 0 or feed_has_gap(conn, self.seq):
+                self.load(conn)
+                return len(self._movies)
+            touched = set()
+            seq = self.seq
+            while True:
+                batch = changes_since(conn, seq)
+                if not batch:
+                    break
+                touched.update(mid for _, mid, _ in batch)
+                seq = batch[-1][0]
+                if len(touched) > _RELOAD_THRESHOLD:
+                    self.load(conn)
+                    return len(self._movies)
+            if not touched:
+                return 0
+            ids = sorted(touched)
+            # 变更影片及其人名/标签（影片数变化即得分变化），撤回前后都要记下
+            idents: Set[Tuple[str, Any]] = set()
+            for mid in ids:
+                idents.add(("title", mid))
+                idents.update((e[1], e[2]) for e in self._contrib.get(mid, []) if e[1] != "title")
+                self._remove(mid)
+            cur = conn.cursor()
+            for k in range(0, len(ids), 500):
+                chunk = ids[k:k + 500]
+                cur.execute(_LOAD_SQL + f" WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                for r in cur.fetchall():
+                    for e in self._add(r, self._movie_entries(r)):
+                        bisect.insort(self._entries, e)
+                    idents.update((e[1], e[2]) for e in self._contrib[int(r[0])] if e[1] != "title")
+            for ident in idents:
+                self._update_top(ident)
+            self._cache.clear()
+            self.seq = seq
+            return len(ids)
+
+    def _score(self, e: Entry) -> float:
+        if e[1] == "title":
+            return self._movies[e[2]][1]
+        return _count_score(self._counts.get((e[1], e[2]), 0))
+
+    def _range(self, p: str) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self._entries, (p,))
+        return lo, bisect.bisect_left(self._entries, (p + "\U0010ffff",), lo)
+
+    def _scan(self, lo: int, hi: int, p: str, kinds: Iterable[Optional[str]], k: int) -> Dict[Optional[str], List[Ranked]]:
+        """逐条扫描区间，按类型过滤各取前 k 名（每个对象取其得分最高的条目，完全匹配加 1）。"""
+        best: Dict[Optional[str], Dict[Tuple[str, Any], Ranked]] = {kd: {} for kd in kinds}
+        for e in self._entries[lo:hi]:
+            s = None
+            for kd, d in best.items():
+                if kd and e[1] != kd:
+                    continue
+                if s is None:
+                    s = self._score(e) + (1.0 if e[0] == p else 0.0)
+                ident = (e[1], e[2])
+                old = d.get(ident)
+                if old is None or s > old[0]:
+                    d[ident] = (s, e)
+        return {kd: heapq.nlargest(int(k), d.values(), key=_rank) for kd, d in best.items()}
+
+    def _build_top(self, p: str, lo: int, hi: int) -> Dict[Optional[str], List[Ranked]]:
+        lists = self._scan(lo, hi, p, (None,) + SUGGEST_TYPES, _TOP_K)
+        self._top[p] = lists
+        for items in lists.values():
+            for _, e in items:
+                self._top_members.setdefault((e[1], e[2]), set()).add(p)
+        return lists
+
+    def _drop_top(self, p: str) -> None:
+        for items in self._top.pop(p, {}).values():
+            for _, e in items:
+                ps = self._top_members.get((e[1], e[2]))
+                if ps is not None:
+                    ps.discard(p)
+                    if not ps:
+                        del self._top_members[(e[1], e[2])]
+
+    def _preload_top(self) -> None:
+        """载入后为区间足够大的 1–2 个字符前缀计算前 k 名表。"""
+        n = len(self._entries)
+        for length in range(1, _TOP_PRELOAD_LEN + 1):
+            i = 0
+            while i < n:
+                key = self._entries[i][0]
+                if len(key) < length:
+                    i += 1
+                    continue
+                lo, hi = self._range(key[:length])
+                if hi - lo >= _TOP_MIN_RANGE:
+                    self._build_top(key[:length], lo, hi)
+                i = hi
+
+    def _update_top(self, ident: Tuple[str, Any]) -> None:
+        """对象的得分或前缀键变化后更新相关的前 k 名表；得分下降或移出的表直接丢弃。"""
+        if ident[0] == "title":
+            movie = self._movies.get(ident[1])
+            base = movie[1] if movie else None
+            keys = {e[0] for e in self._contrib.get(ident[1], []) if e[1] == "title"}
+        else:
+            n = self._counts.get(ident, 0)
+            base = _count_score(n) if n else None
+            keys = self._name_keys.get(ident, set())
+        prefixes = set(self._top_members.get(ident, ()))
+        for key in keys:
+            prefixes.update(key[:i] for i in range(1, len(key) + 1) if key[:i] in self._top)
+        for p in prefixes:
+            lists = self._top.get(p)
+            if lists is None:
+                continue
+            covered = [key for key in keys if key.startswith(p)]
+            for kd in (None, ident[0]):
+                items = lists[kd]
+                pos = next((i for i, (_, e) in enumerate(items) if (e[1], e[2]) == ident), None)
+                if base is None or not covered:
+                    if pos is not None:
+                        self._drop_top(p)
+                        break
+                    continue
+                item = (base + (1.0 if p in keys else 0.0), (p if p in keys else covered[0], ident[0], ident[1]))
+                if pos is not None:
+                    if item[0] < items[pos][0]:
+                        self._drop_top(p)
+                        break
+                    items[pos] = item
+                    items.sort(key=_rank, reverse=True)
+                elif len(items) < _TOP_K or _rank(item) > _rank(items[-1]):
+                    items.append(item)
+                    items.sort(key=_rank, reverse=True)
+                    self._top_members.setdefault(ident, set()).add(p)
+                    if len(items) > _TOP_K:
+                        _, out = items.pop()
+                        gone = (out[1], out[2])
+                        if not any((e[1], e[2]) == gone for ls in lists.values() for _, e in ls):
+                            self._drop_member(gone, p)
+
+    def _drop_member(self, ident: Tuple[str, Any], p: str) -> None:
+        ps = self._top_members.get(ident)
+        if ps is not None:
+            ps.discard(p)
+            if not ps:
+                del self._top_members[ident]
+
+    def query(self, prefix: str, k: int = 10, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """前缀联想，返回前 k 条 {text, type, id?, score}；完全匹配优先。"""
+        p = suggest_key(prefix)
+        if not p:
+            return []
+        ck = (p, int(k), kind)
+        with self._lock:
+            lists = self._top.get(p) if int(k) <= _TOP_K else None
+            if lists is None and int(k) <= _TOP_K and len(self._top) < _TOP_MAX_LISTS:
+                lo, hi = self._range(p)
+                if hi - lo >= _TOP_MIN_RANGE:
+                    lists = self._build_top(p, lo, hi)
+            if lists is not None:
+                return self._format(lists.get(kind, [])[:int(k)])
+            hit = self._cache.get(ck)
+            if hit is not None:
+                self._cache.move_to_end(ck)
+                return hit
+            lo, hi = self._range(p)
+            out = self._format(self._scan(lo, hi, p, (kind,), k)[kind])
+            self._cache[ck] = out
+            if len(self._cache) > _CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return out
+
+    def _format(self, top: List[Ranked]) -> List[Dict[str, Any]]:
+        out = []
+        for s, e in top:
+            if e[1] == "title":
+                out.append({"text": self._movies[e[2]][0], "type": "title", "id": e[2], "score": round(s, 4)})
+            else:
+                out.append({"text": e[2], "type": e[1], "score": round(s, 4)})
+        return out
+
+    @property
+    def loaded(self) -> bool:
+        return self.seq >= 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "movies": len(self._movies),
+            "top_lists": len(self._top),
+            "seq": self.seq,
+            "loaded_at": self.loaded_at,
+        }
+
+
+suggest_index = SuggestIndex()
+
+
+def suggest(
+    q: str,
+    k: int = 10,
+    kind: Optional[str] = None,
+    index: Optional[SuggestIndex] = None,
+) -> List[Dict[str, Any]]:
+    """返回 q 的前缀联想；只读索引，索引尚未载入（后台线程载入中）时返回空列表。"""
+    index = index or suggest_index
+    if not index.loaded:
+        return []
+    return index.query(q, k=k, kind=kind)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import List, Optional
+
+# 文本规范化：去重、容错检索、联想、相似推荐与分面等模块共用的正则与规则。
+
+# 空白、标点与下划线
+PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+# 发布标题中书名号内的片名
+BOOK_RE = re.compile(r"《(.+?)》")
+# 国别字段中除 "/" 外的分隔符（"美国，英国"），统一替换为 "/" 后再拆分
+COUNTRY_SEPS = ["，", ",", "、", "|"]
+# 国家/地区两端去掉的空白（含全角空格）
+COUNTRY_STRIP = " \t\r\n\u3000"
+
+
+def compact_key(text: Optional[str]) -> str:
+    """NFKC（全角转半角）、小写并去掉空白与标点，用作比较与前缀键。"""
+    return PUNCT_RE.sub("", unicodedata.normalize("NFKC", text or "").lower())
+
+
+def country_tokens(text: Optional[str]) -> List[str]:
+    """拆分国别字段为国家/地区列表（去重并保持顺序）："美国/英国" -> ["美国", "英国"]。"""
+    s = text or ""
+    for sep in COUNTRY_SEPS:
+        s = s.replace(sep, "/")
+    out: List[str] = []
+    for t in s.split("/"):
+        t = t.strip(COUNTRY_STRIP)
+        if t and t not in out:
+            out.append(t)
+    return out
+
+
+def country_tokens_sql(col: str) -> str:
+    """与 country_tokens 同一拆分规则的 SQL 子查询（每个国家/地区一行，列名 v）。
+
+    触发器里不能用 CTE，这里把分隔符统一为 "/" 后经 json_quote 转成 JSON 数组再用 json_each 展开；
+    "/" 不会出现在 JSON 转义序列中，直接替换为 '","' 是安全的。
+    """
+    s = col
+    for sep in COUNTRY_SEPS:
+        s = f"replace({s}, '{sep}', '/')"
+    strip = "char(" + ", ".join(str(ord(c)) for c in COUNTRY_STRIP) + ")"
+    return (
+        f"SELECT DISTINCT trim(j.value, {strip}) AS v"
+        f" FROM json_each('[' || replace(json_quote({s}), '/', '\",\"') || ']') AS j"
+        f" WHERE trim(j.value, {strip}) <> ''"
+    )
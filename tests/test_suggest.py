@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from dyttindex import db, suggest as suggest_mod
+from dyttindex.suggest import SUGGEST_TYPES, SuggestIndex
+
+# 小字母表让前缀区间足够大，前 k 名表在小库上也会生成
+_CHARS = "星际穿越流浪地球"
+_PEOPLE = ["张艺谋", "张一白", "周迅", "周润发", "Tom Hanks", "Tom Cruise", "Tim Robbins"]
+_TAGS = ["剧情", "剧集", "科幻", "科学", "动作"]
+
+
+def _record(rng: random.Random, i: int) -> dict:
+    return {
+        "detail_url": f"http://example.com/{i}.html",
+        "title": "".join(rng.choice(_CHARS) for _ in range(rng.randint(2, 4))),
+        "kind": "movie",
+        "year": rng.randint(1990, 2024),
+        "rating_value": round(rng.uniform(3, 9.5), 1),
+        "director": rng.choice(_PEOPLE),
+        "actors": "\n".join(rng.sample(_PEOPLE, 2)),
+        "tags": rng.sample(_TAGS, 2),
+        "download_links": [],
+    }
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "SQLITE_PATH", str(tmp_path / "movies.db"))
+    monkeypatch.setattr(suggest_mod, "_TOP_MIN_RANGE", 20)
+    db.create_db()
+    c = db.get_conn()
+    yield c
+    c.close()
+
+
+def _assert_top_lists_exact(index: SuggestIndex) -> None:
+    """增量维护的每张前 k 名表都与按当前条目重新扫描的结果一致。"""
+    for p, lists in index._top.items():
+        lo, hi = index._range(p)
+        fresh = index._scan(lo, hi, p, (None,) + SUGGEST_TYPES, suggest_mod._TOP_K)
+        for kind in (None,) + SUGGEST_TYPES:
+            assert index._format(lists[kind]) == index._format(fresh[kind]), (p, kind)
+
+
+def test_top_lists_follow_inserts_updates_and_deletes(conn):
+    rng = random.Random(7)
+    db.upsert_movies(conn, [_record(rng, i) for i in range(400)])
+    index = SuggestIndex()
+    index.refresh(conn)
+    preloaded = set(index._top)
+    assert preloaded
+
+    # 新增只会让得分上升：表应就地更新而非丢弃
+    db.upsert_movies(conn, [_record(rng, i) for i in range(400, 420)])
+    assert index.refresh(conn) == 20
+    assert set(index._top) == preloaded
+    _assert_top_lists_exact(index)
+
+    # 修改（标题/评分/人员/标签）与删除：保留下来的表仍须精确
+    db.upsert_movies(conn, [_record(rng, i) for i in rng.sample(range(420), 20)])
+    assert index.refresh(conn) > 0
+    _assert_top_lists_exact(index)
+    ids = [r[0] for r in conn.execute("SELECT id FROM movies ORDER BY id")]
+    db.delete_movies(conn, rng.sample(ids, 15))
+    assert index.refresh(conn) == 15
+    _assert_top_lists_exact(index)
+
+    # 与全量载入的结果一致（被丢弃的表在查询时重算）
+    full = SuggestIndex()
+    full.refresh(conn)
+    for p in preloaded | set(full._top):
+        for kind in (None,) + SUGGEST_TYPES:
+            assert index.query(p, k=suggest_mod._TOP_K, kind=kind) == full.query(p, k=suggest_mod._TOP_K, kind=kind)
+
+
+def test_suggest_is_read_only_until_loaded(conn):
+    rng = random.Random(1)
+    db.upsert_movies(conn, [_record(rng, i) for i in range(20)])
+    index = SuggestIndex()
+    assert suggest_mod.suggest("星", index=index) == []
+    index.refresh(conn)
+    assert suggest_mod.suggest("星", index=index)
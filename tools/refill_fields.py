@@ -3,7 +3,7 @@ import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from dyttindex.scraper import parse_detail_page
-from dyttindex.db import get_conn, upsert_movie
+from dyttindex.db import get_conn, upsert_movies
 import sqlite3
 
 conn = get_conn()
@@ -14,17 +14,16 @@ cur.execute("select id, detail_url, raw_html from movies where (year is null or
 rows = cur.fetchall()
 print(f"待回填条目: {len(rows)}")
 
-fixed = 0
-for r in rows:
-    html = r['raw_html'] or ''
-    url = r['detail_url']
-    try:
-        data = parse_detail_page(html, url)
-        upsert_movie(conn, data)
-        fixed += 1
-    except Exception as e:
-        print(f"回填失败 id={r['id']} url={url}: {e}")
+def _parsed():
+    for r in rows:
+        html = r['raw_html'] or ''
+        url = r['detail_url']
+        try:
+            yield parse_detail_page(html, url)
+        except Exception as e:
+            print(f"回填失败 id={r['id']} url={url}: {e}")
 
-print(f"已回填: {fixed}")
+counts = upsert_movies(conn, _parsed())
+print(f"已回填: {sum(counts.values())}（{counts}）")
 conn.close()
 
@@ -11,8 +11,20 @@ from flask import Flask, request, jsonify, render_template_string
 # 让父目录加入模块搜索路径
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from dyttindex.db import get_conn, search_movies, get_movie, get_download_links, count_movies
+from dyttindex.db import get_conn, get_meta, next_cursor, get_movie, get_download_links, update_movie, delete_movies
+from dyttindex.cache import cached_search_with_total, cached_facets, search_cache
+from dyttindex.colindex import columnar_search, columnar_index
+from dyttindex.fuzzy import fuzzy_search, refresh_title_grams
+from dyttindex.suggest import suggest, suggest_index, SUGGEST_TYPES
+from dyttindex.similar import get_similar
+from dyttindex.links import find_by_hash
+from dyttindex.episodes import get_episodes
+from dyttindex.maintain import maintain
+from dyttindex.migrations import DEFERRED_KEY
 from dyttindex.scraper import DyttScraper, init_db
+from dyttindex.people import get_filmography
+from dyttindex.fts import snippet_html
+from dyttindex.stats import get_stats
 from dyttindex import config
 
 app = Flask(__name__)
@@ -48,6 +60,7 @@ def _run_crawl(max_pages: int, max_items: int, sessionid: Optional[str] = None):
         crawl_state["messages"] = []
         total = _scraper.crawl_site(None, max_pages, max_items, progress_cb=_progress)
         crawl_state["total"] = total
+        _refresh_indexes()
         crawl_state["status"] = "done"
     except Exception as e:
         crawl_state["status"] = "error"
@@ -56,6 +69,72 @@ def _run_crawl(max_pages: int, max_items: int, sessionid: Optional[str] = None):
         _scraper = None
 
 
+# 数据库维护状态：手动触发或按 MAINTAIN_INTERVAL_HOURS 定时执行，抓取进行中时跳过
+maintain_state = {
+    "status": "idle",  # idle|running|done|error|skipped
+    "started_at": None,
+    "finished_at": None,
+    "report": None,
+    "message": None,
+}
+_maintain_lock = threading.Lock()
+
+
+def _run_maintain(full_vacuum: bool = False) -> bool:
+    if _crawl_thread is not None and _crawl_thread.is_alive():
+        maintain_state["status"] = "skipped"
+        maintain_state["message"] = "抓取进行中，跳过维护"
+        return False
+    if not _maintain_lock.acquire(blocking=False):
+        return False
+    try:
+        maintain_state.update(status="running", started_at=time.time(), finished_at=None, message=None)
+        conn = get_conn()
+        try:
+            maintain_state["report"] = maintain(conn, full_vacuum=full_vacuum)
+        finally:
+            conn.close()
+        maintain_state["status"] = "done"
+    except Exception as e:
+        maintain_state["status"] = "error"
+        maintain_state["message"] = str(e)
+    finally:
+        maintain_state["finished_at"] = time.time()
+        _maintain_lock.release()
+    return True
+
+
+def _maintain_scheduler(interval_hours: float):
+    while True:
+        time.sleep(interval_hours * 3600)
+        _run_maintain()
+
+
+def _refresh_indexes():
+    # 派生索引在写入侧或后台线程中追上变更流，检索请求只读
+    conn = get_conn()
+    try:
+        refresh_title_grams(conn)
+        if columnar_index.available and not columnar_index.loading:
+            columnar_index.refresh(conn)
+        suggest_index.refresh(conn)
+    finally:
+        conn.close()
+
+
+def _index_refresher(interval_seconds: float):
+    # 启动后先载入一次内存索引，之后网页编辑/删除与其他进程（命令行抓取、导入）写入的条目在此追上；
+    # 间隔不大于 0 时只载入一次
+    while True:
+        try:
+            _refresh_indexes()
+        except Exception as e:
+            print(f"刷新派生索引失败：{e}", file=sys.stderr)
+        if interval_seconds <= 0:
+            return
+        time.sleep(interval_seconds)
+
+
 @app.post("/api/crawl/start")
 def api_crawl_start():
     global _crawl_thread
@@ -157,7 +236,8 @@ def index():
             <div class="grid grid-2">
               <div>
                 <label>关键字</label>
-                <input id="q_title" placeholder="标题/简介/演员关键字" />
+                <input id="q_title" placeholder="标题/简介/演员关键字" list="suggest_list" autocomplete="off" />
+                <datalist id="suggest_list"></datalist>
               </div>
               <div>
                 <label>类别</label>
@@ -179,11 +259,11 @@ def index():
               </div>
               <div>
                 <label>导演</label>
-                <input id="q_director" placeholder="导演名包含" />
+                <input id="q_director" placeholder="导演姓名（中文名或外文名）" />
               </div>
               <div>
                 <label>演员</label>
-                <input id="q_actors" placeholder="演员名包含" />
+                <input id="q_actors" placeholder="演员姓名（中文名或外文名）" />
               </div>
               <div>
                 <label>评分来源</label>
@@ -205,9 +285,20 @@ def index():
                 </div>
               </div>
               <div>
-                <label>标签（逗号分隔）</label>
+                <label>标签（逗号分隔，全部包含）</label>
                 <input id="q_tags" placeholder="科幻, 喜剧, 动作" />
               </div>
+              <div>
+                <label>任一标签 / 排除标签</label>
+                <div class="actions">
+                  <input id="q_tags_any" placeholder="任一：动作, 冒险" />
+                  <input id="q_tags_not" placeholder="排除：恐怖" />
+                </div>
+              </div>
+              <div>
+                <label>剧集（至少到第 N 集）</label>
+                <input id="q_min_episode" type="number" min="1" placeholder="如 30" />
+              </div>
               <div>
                 <label>页码 / 每页条数</label>
                 <div class="actions">
@@ -219,6 +310,7 @@ def index():
                 <label>排序字段</label>
                 <select id="q_order_by">
                   <option value="updated_at">更新时间</option>
+                  <option value="relevance">相关度（关键字）</option>
                   <option value="year">年份</option>
                   <option value="rating">评分</option>
                   <option value="title">标题</option>
@@ -235,6 +327,8 @@ def index():
             </div>
             <div class="actions" style="margin-top:8px">
               <button id="btn_search" class="primary">检索</button>
+              <label class="muted"><input type="checkbox" id="q_fuzzy" style="width:auto" /> 容错匹配标题</label>
+              <label class="muted"><input type="checkbox" id="q_complete" style="width:auto" /> 仅完整剧集</label>
               <span class="muted" id="search_hint">输入条件后点击检索</span>
             </div>
           </div>
@@ -257,6 +351,11 @@ def index():
             </div>
           </div>
 
+          <div class="card">
+            <h3>分面统计</h3>
+            <div id="facets_box" class="muted">检索后显示当前条件下的类别/国别/年份/评分/标签分布，点击即追加过滤</div>
+          </div>
+
           <div class="card">
             <h3>抓取控制</h3>
             <div class="grid grid-2">
@@ -318,9 +417,14 @@ def index():
             <div style="margin-top:8px">
               <details>
                 <summary>下载链接（含剧集）</summary>
+                <div id="mgr_episodes" class="muted"></div>
                 <div id="mgr_dl"></div>
               </details>
             </div>
+            <div style="margin-top:8px">
+              <label>相似推荐</label>
+              <div id="mgr_similar" class="muted"></div>
+            </div>
           </div>
         </div>
       </div>
@@ -328,9 +432,18 @@ def index():
       <script>
       var current_id = null;
       var currentRow = null;
+      // keyset 翻页：pageCursors[n] 为获取第 n 页所用的游标（第 1 页为空）
+      var pageCursors = {};
+      var nextCursor = null;
       function el(id){ return document.getElementById(id); }
       function setText(id, v){ el(id).textContent = v || ''; }
 
+      function newSearch(){
+        pageCursors = {};
+        el('q_page').value = 1;
+        doSearch();
+      }
+
       function doSearch(){
         try{
           var p = new URLSearchParams();
@@ -339,30 +452,92 @@ def index():
           add('kind', el('q_kind').value);
           add('country', el('q_country').value);
           add('language', el('q_language').value);
-          add('director', el('q_director').value);
-          add('actors', el('q_actors').value);
+          // 部分名字即可命中（服务端在人员表上匹配）；director_name/actor_name 为精确匹配
+          add('director', el('q_director').value.trim());
+          add('actors', el('q_actors').value.trim());
           add('rating_source', el('q_rating_src').value);
           add('rating_min', el('q_rating_min').value);
           add('year_from', el('q_year_from').value);
           add('year_to', el('q_year_to').value);
-          var rawTags = (el('q_tags').value||'').split(',');
-          for(var i=0;i<rawTags.length;i++){
-            var t = rawTags[i].replace(/^[\s\u3000]+|[\s\u3000]+$/g, '');
-            if(t) p.append('tag', t);
+          function addTags(key, inputId){
+            var raw = (el(inputId).value||'').split(/[,，]/);
+            for(var i=0;i<raw.length;i++){
+              var t = raw[i].replace(/^[\s\u3000]+|[\s\u3000]+$/g, '');
+              if(t) p.append(key, t);
+            }
           }
+          addTags('tag', 'q_tags');
+          addTags('tag_any', 'q_tags_any');
+          addTags('tag_not', 'q_tags_not');
           var page = parseInt(el('q_page').value||'1', 10); if(!page||page<1) page=1;
           var pageSize = parseInt(el('q_page_size').value||'50', 10); if(!pageSize||pageSize<1) pageSize=50;
           add('page', page);
           add('page_size', pageSize);
+          add('cursor', pageCursors[page]);
           add('order_by', el('q_order_by').value);
           add('order_dir', el('q_order_dir').value);
+          if(el('q_fuzzy').checked) add('fuzzy', '1');
+          if(el('q_complete').checked) add('complete_only', '1');
+          add('min_episode', el('q_min_episode').value);
+          if(page===1) loadFacets(p);
           fetch('/api/search?'+p.toString())
             .then(function(r){ return r.json(); })
-            .then(function(j){ renderResults(j.results || [], j.total||0, j.page||page, j.page_size||pageSize); })
+            .then(function(j){ nextCursor = j.next_cursor || null; if(nextCursor) pageCursors[page+1] = nextCursor; renderResults(j.results || [], j.total||0, j.page||page, j.page_size||pageSize); })
             .catch(function(e){ console.error(e); alert('检索失败'); });
         }catch(e){ console.error(e); alert('检索异常'); }
       }
 
+      // 输入联想：停顿 120ms 后请求 /api/suggest，结果填入 datalist
+      var suggestTimer = null;
+      function loadSuggest(){
+        var q = el('q_title').value.trim();
+        if(!q){ el('suggest_list').innerHTML = ''; return; }
+        fetch('/api/suggest?k=10&q='+encodeURIComponent(q))
+          .then(function(r){ return r.json(); })
+          .then(function(j){
+            var box = el('suggest_list'); box.innerHTML = '';
+            (j.suggestions || []).forEach(function(s){
+              var o = document.createElement('option');
+              o.value = s.text; o.label = s.type; box.appendChild(o);
+            });
+          })
+          .catch(function(e){ console.error(e); });
+      }
+
+      var FACET_NAMES = { kind: '类别', country: '国别', year: '年份', rating: '评分', tag: '标签' };
+      function applyFacet(facet, value){
+        if(facet==='kind'){ el('q_kind').value = value; }
+        else if(facet==='country'){ el('q_country').value = value; }
+        else if(facet==='year'){ el('q_year_from').value = value; el('q_year_to').value = value; }
+        else if(facet==='rating'){ el('q_rating_min').value = value; }
+        else if(facet==='tag'){ var cur = el('q_tags').value.trim(); el('q_tags').value = cur ? (cur+', '+value) : value; }
+        newSearch();
+      }
+      function loadFacets(params){
+        var p = new URLSearchParams(params);
+        ['page','page_size','cursor','order_by','order_dir'].forEach(function(k){ p.delete(k); });
+        fetch('/api/facets?'+p.toString())
+          .then(function(r){ return r.json(); })
+          .then(function(j){
+            var box = el('facets_box'); box.innerHTML = ''; box.className = '';
+            var fs = j.facets || {};
+            Object.keys(FACET_NAMES).forEach(function(f){
+              var items = fs[f] || []; if(!items.length) return;
+              var div = document.createElement('div'); div.style.margin = '4px 0';
+              div.innerHTML = '<span class="muted">'+FACET_NAMES[f]+'：</span>';
+              items.slice(0, 20).forEach(function(it){
+                var a = document.createElement('span');
+                a.className = 'pill'; a.style.cursor = 'pointer'; a.style.margin = '2px';
+                a.textContent = (f==='rating' ? it.value+'+' : it.value)+' ('+(it.approx ? '≈' : '')+it.n+')';
+                a.onclick = function(){ applyFacet(f, it.value); };
+                div.appendChild(a);
+              });
+              box.appendChild(div);
+            });
+          })
+          .catch(function(e){ console.error(e); });
+      }
+
       function renderResults(list, total, page, pageSize){
         var tb = el('tbody');
         tb.innerHTML = '';
@@ -372,7 +547,7 @@ def index():
           var tr = document.createElement('tr');
           tr.innerHTML = ''+
             '<td>'+(row.id||'')+'</td>'+
-            '<td>'+(row.title||'')+'</td>'+
+            '<td>'+(row.title||'')+(row.snippet ? '<div class="muted">'+row.snippet+'</div>' : '')+(row.fuzzy_score!=null ? ' <span class="muted">('+row.fuzzy_score.toFixed(2)+')</span>' : '')+'</td>'+
             '<td>'+(row.kind||'')+'</td>'+
             '<td>'+(row.year||'')+'</td>'+
             '<td>'+(row.country||'')+'</td>'+
@@ -398,6 +573,24 @@ def index():
         currentRow = tr; if(tr) tr.classList.add('selected');
       }
 
+      function loadSimilar(id){
+        var box = el('mgr_similar'); box.innerHTML = '';
+        fetch('/api/movie/'+id+'/similar?limit=10')
+          .then(function(r){ return r.json(); })
+          .then(function(j){
+            var list = j.similar || [];
+            if(!list.length){ box.textContent = '暂无（运行 build-similar 生成）'; return; }
+            list.forEach(function(m){
+              var a = document.createElement('span');
+              a.className = 'pill'; a.style.cursor = 'pointer'; a.style.margin = '2px';
+              a.textContent = (m.title||'')+(m.year ? ' ('+m.year+')' : '');
+              a.onclick = function(){ loadDetail(m.id); };
+              box.appendChild(a);
+            });
+          })
+          .catch(function(e){ console.error(e); });
+      }
+
       function loadDetail(id){
         current_id = id;
         fetch('/api/movie/'+id)
@@ -414,6 +607,9 @@ def index():
             setText('mgr_aliases', m.alt_titles_text);
             el('mgr_tags').value = m.tags_text || '';
             el('mgr_desc').value = m.description || '';
+            loadSimilar(id);
+            var es = (j.episodes || {}).summary;
+            setText('mgr_episodes', es ? ('共 '+es.episode_count+' 集，最大第 '+es.max_episode+' 集'+(es.missing_count ? '，缺集：'+es.missing_ranges : '，无缺集')) : '');
             var box = el('mgr_dl'); box.innerHTML = '';
             var dls = j.downloads || [];
             if(!dls.length){ box.innerHTML = '<div class="muted">无下载链接</div>'; return; }
@@ -495,7 +691,9 @@ def index():
           .catch(function(e){ alert('停止失败: '+e.message); });
       };
 
-      el('btn_search').onclick = doSearch;
+      el('btn_search').onclick = newSearch;
+      el('q_title').addEventListener('input', function(){ clearTimeout(suggestTimer); suggestTimer = setTimeout(loadSuggest, 120); });
+      ['q_order_by','q_order_dir','q_page_size'].forEach(function(id){ el(id).onchange = function(){ pageCursors = {}; }; });
       pollStatus();
       </script>
     </body>
@@ -503,6 +701,31 @@ def index():
     """
     return render_template_string(html)
 
+def _search_filters() -> dict:
+    """从查询参数解析 search_movies 的过滤条件（/api/search 等接口共用）。"""
+    args = request.args
+    return {
+        "title": args.get("title") or None,
+        "kind": args.get("kind") or None,
+        "country": args.get("country") or None,
+        "tags": args.getlist("tag") or None,
+        "tags_any": args.getlist("tag_any") or None,
+        "tags_not": args.getlist("tag_not") or None,
+        "rating_min": float(args.get("rating_min")) if args.get("rating_min") else None,
+        "year_from": int(args.get("year_from")) if args.get("year_from") else None,
+        "year_to": int(args.get("year_to")) if args.get("year_to") else None,
+        "language": args.get("language") or None,
+        "director": args.get("director") or None,
+        "actors_substr": args.get("actors") or None,
+        "rating_source": args.get("rating_source") or None,
+        "director_name": args.get("director_name") or None,
+        "actor_name": args.get("actor_name") or None,
+        "keyword": args.get("keyword") or None,
+        "complete_only": (args.get("complete_only") or "").lower() in ("1", "true", "yes", "on") or None,
+        "min_episode": int(args.get("min_episode")) if args.get("min_episode") else None,
+    }
+
+
 @app.get("/api/search")
 def api_search():
     conn = get_conn()
@@ -516,54 +739,122 @@ def api_search():
     offset = (page - 1) * page_size
     order_by = request.args.get("order_by") or None
     order_dir = request.args.get("order_dir") or "desc"
-    # 总数
-    total = count_movies(
-        conn,
-        title=request.args.get("title") or None,
-        kind=request.args.get("kind") or None,
-        country=request.args.get("country") or None,
-        tags=request.args.getlist("tag") or None,
-        rating_min=float(request.args.get("rating_min")) if request.args.get("rating_min") else None,
-        year_from=int(request.args.get("year_from")) if request.args.get("year_from") else None,
-        year_to=int(request.args.get("year_to")) if request.args.get("year_to") else None,
-        language=request.args.get("language") or None,
-        director=request.args.get("director") or None,
-        actors_substr=request.args.get("actors") or None,
-        rating_source=request.args.get("rating_source") or None,
-        keyword=request.args.get("keyword") or None,
-    )
-    results = search_movies(
-        conn,
-        title=request.args.get("title") or None,
-        kind=request.args.get("kind") or None,
-        country=request.args.get("country") or None,
-        tags=request.args.getlist("tag") or None,
-        rating_min=float(request.args.get("rating_min")) if request.args.get("rating_min") else None,
-        year_from=int(request.args.get("year_from")) if request.args.get("year_from") else None,
-        year_to=int(request.args.get("year_to")) if request.args.get("year_to") else None,
-        language=request.args.get("language") or None,
-        director=request.args.get("director") or None,
-        actors_substr=request.args.get("actors") or None,
-        rating_source=request.args.get("rating_source") or None,
-        limit=page_size,
-        keyword=request.args.get("keyword") or None,
-        offset=offset,
-        order_by=order_by,
-        order_dir=order_dir,
-    )
+    # 提供 cursor 时按 keyset 翻页，深页与第一页代价相同
+    cursor = request.args.get("cursor") or None
+    filters = _search_filters()
+    if (request.args.get("fuzzy") or "").lower() in ("1", "true", "yes", "on"):
+        # 容错标题检索：按 title（或 keyword）的二元组候选 + 编辑距离精排，按相似度排序、偏移量翻页
+        query = filters.get("title") or filters.get("keyword")
+        if not query:
+            conn.close()
+            return jsonify({"ok": False, "message": "fuzzy 检索需要 title 或 keyword 参数"}), 400
+        rows, total = fuzzy_search(conn, query, limit=page_size, offset=offset, **filters)
+        conn.close()
+        return jsonify({"results": rows, "total": total, "page": page, "page_size": page_size, "next_cursor": None})
+    try:
+        # 仅含结构化条件时由列式索引算出本页 id；其余条件走 SQL（命中进程内缓存，写库后按写入代数失效）
+        res = columnar_search(conn, limit=page_size, offset=offset, order_by=order_by, order_dir=order_dir, cursor=cursor, **filters)
+        if res is not None:
+            rows, total = [dict(r) for r in res[0]], res[1]
+        else:
+            rows, total = cached_search_with_total(
+                conn,
+                limit=page_size,
+                offset=offset,
+                order_by=order_by,
+                order_dir=order_dir,
+                cursor=cursor,
+                **filters,
+            )
+    except ValueError as e:
+        conn.close()
+        return jsonify({"ok": False, "message": str(e)}), 400
     conn.close()
-    return jsonify({"results": [dict(r) for r in results], "total": total, "page": page, "page_size": page_size})
+    # 命中摘要转为转义后的 HTML（页面以 innerHTML 插入）；在副本上转换，缓存中的结果保持原样
+    rows = [dict(r, snippet=snippet_html(r["snippet"])) if r.get("snippet") else r for r in rows]
+    return jsonify({
+        "results": rows,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "next_cursor": next_cursor(rows, page_size, order_by, order_dir, offset=offset, cursor=cursor),
+    })
+
+@app.get("/api/facets")
+def api_facets():
+    conn = get_conn()
+    # 无过滤条件时直接读取 facet_counts；有条件时对命中集合分组计数
+    facets = cached_facets(conn, **_search_filters())
+    conn.close()
+    return jsonify({"ok": True, "facets": facets})
+
+@app.get("/api/stats")
+def api_stats():
+    conn = get_conn()
+    st = get_stats(conn, top_tags=int(request.args.get("top_tags", "10")))
+    conn.close()
+    return jsonify({"ok": True, "stats": st})
+
+@app.get("/api/suggest")
+def api_suggest():
+    q = (request.args.get("q") or "").strip()
+    kind = request.args.get("type") or None
+    if kind and kind not in SUGGEST_TYPES:
+        return jsonify({"ok": False, "message": f"未知联想类型: {kind}"}), 400
+    if not q:
+        return jsonify({"ok": True, "q": q, "suggestions": []})
+    k = max(1, min(int(request.args.get("k", "10")), 50))
+    # 内存前缀索引由后台线程载入并按变更流刷新；按键请求只做二分定位与区间内取前 k 名
+    items = suggest(q, k=k, kind=kind)
+    return jsonify({"ok": True, "q": q, "suggestions": items, "loading": not suggest_index.loaded})
+
+@app.get("/api/links/lookup")
+def api_links_lookup():
+    query = (request.args.get("hash") or "").strip()
+    if not query:
+        return jsonify({"ok": False, "message": "缺少 hash 参数"}), 400
+    conn = get_conn()
+    try:
+        # infohash / ed2k 哈希走 download_links 上的索引
+        rows = find_by_hash(conn, query, limit=max(1, min(int(request.args.get("limit", "100")), 500)))
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    finally:
+        conn.close()
+    return jsonify({"ok": True, "hash": query, "links": [dict(r) for r in rows]})
+
+@app.get("/api/person")
+def api_person():
+    name = (request.args.get("name") or "").strip()
+    if not name:
+        return jsonify({"ok": False, "message": "缺少 name 参数"}), 400
+    conn = get_conn()
+    rows = get_filmography(conn, name, role=request.args.get("role") or None)
+    conn.close()
+    return jsonify({"ok": True, "name": name, "movies": [dict(r) for r in rows]})
 
 @app.get("/api/movie/<int:movie_id>")
-def api_movie_get(movie_id: int):
+def api_movie(movie_id: int):
     conn = get_conn()
-    m = get_movie(conn, movie_id)
-    if not m:
+    row = get_movie(conn, movie_id)
+    if row is None:
         conn.close()
         return jsonify({"ok": False, "message": "未找到条目"}), 404
-    dls = get_download_links(conn, movie_id) or []
+    movie = {k: row[k] for k in row.keys() if k not in ("raw_html", "content_hash", "html_hash")}
+    downloads = [dict(r) for r in get_download_links(conn, movie_id)]
+    # 剧集按集分组，summary/best 来自触发器维护的 movie_episodes/episode_links
+    episodes = get_episodes(conn, movie_id)
+    conn.close()
+    return jsonify({"ok": True, "movie": movie, "downloads": downloads, "episodes": episodes})
+
+@app.get("/api/movie/<int:movie_id>/similar")
+def api_movie_similar(movie_id: int):
+    limit = max(1, min(int(request.args.get("limit", "10")), 50))
+    conn = get_conn()
+    # 读取 build-similar 预计算的近邻表，按 (movie_id, rank) 主键一次读取
+    rows = get_similar(conn, movie_id, limit=limit)
     conn.close()
-    return jsonify({"ok": True, "movie": dict(m), "downloads": [dict(d) for d in dls]})
+    return jsonify({"ok": True, "id": movie_id, "similar": [dict(r) for r in rows]})
 
 @app.put("/api/movie/<int:movie_id>")
 def api_movie_update(movie_id: int):
@@ -571,25 +862,37 @@ def api_movie_update(movie_id: int):
     tags_text = payload.get("tags_text")
     description = payload.get("description")
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE movies SET tags_text=?, description=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
-        (tags_text, description, movie_id),
-    )
-    conn.commit()
+    ok = update_movie(conn, movie_id, tags_text=tags_text, description=description)
     conn.close()
+    if not ok:
+        return jsonify({"ok": False, "message": "未找到条目"}), 404
     return jsonify({"ok": True})
 
 @app.delete("/api/movie/<int:movie_id>")
 def api_movie_delete(movie_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM download_links WHERE movie_id=?", (movie_id,))
-    cur.execute("DELETE FROM movies WHERE id=?", (movie_id,))
-    conn.commit()
+    delete_movies(conn, [movie_id])
     conn.close()
     return jsonify({"ok": True})
 
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    return jsonify({"ok": True, "search": search_cache.stats(), "columnar": columnar_index.stats(), "suggest": suggest_index.stats()})
+
+@app.post("/api/maintain")
+def api_maintain():
+    if _crawl_thread is not None and _crawl_thread.is_alive():
+        return jsonify({"ok": False, "message": "抓取进行中，请稍后再维护"}), 409
+    if maintain_state["status"] == "running":
+        return jsonify({"ok": False, "message": "维护任务已在运行"}), 409
+    full_vacuum = bool((request.get_json(silent=True) or {}).get("full_vacuum"))
+    threading.Thread(target=_run_maintain, args=(full_vacuum,), daemon=True).start()
+    return jsonify({"ok": True})
+
+@app.get("/api/maintain/status")
+def api_maintain_status():
+    return jsonify({"ok": True, **maintain_state})
+
 @app.get("/api/debug")
 def api_debug():
     import os
@@ -598,4 +901,16 @@ def api_debug():
 
 if __name__ == "__main__":
     import os
+    # 启动前确保数据库结构为最新版本
+    init_db(drop=False)
+    _conn = get_conn()
+    if get_meta(_conn, DEFERRED_KEY):
+        # 延迟索引的导入仍在运行：检索暂时走全表扫描，FTS/分面/统计在导入结束后重建
+        print("警告：import --defer-indexes 正在进行，二级索引与维护触发器尚未重建", file=sys.stderr)
+    _conn.close()
+    if config.MAINTAIN_INTERVAL_HOURS > 0:
+        threading.Thread(target=_maintain_scheduler, args=(config.MAINTAIN_INTERVAL_HOURS,), daemon=True).start()
+    # 列式索引在后台载入，载入完成前检索走 SQL，不阻塞首个请求
+    columnar_index.start_background_load(get_conn)
+    threading.Thread(target=_index_refresher, args=(config.INDEX_REFRESH_SECONDS,), daemon=True).start()
     app.run(host="127.0.0.1", port=int(os.environ.get("PORT", "5000")))
\ No newline at end of file